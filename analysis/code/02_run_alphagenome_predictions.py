@@ -113,19 +113,20 @@ def save_predictions(predictions, construct_name, output_dir):
     
     # Save summary statistics
     stats_path = output_dir / f"{construct_name}_stats.txt"
-    with open(stats_path, 'w') as f:
-        f.write(f"Construct: {construct_name}\n")
-        f.write(f"Cell type: K562 (EFO:0002067)\n")
-        f.write(f"Prediction timestamp: {datetime.now().isoformat()}\n")
-        f.write(f"\nPrediction array shape: {predictions.shape}\n")
-        f.write(f"Flattened shape: {predictions_flat.shape}\n")
-        f.write(f"Data type: {predictions.dtype}\n")
-        f.write(f"\nStatistics:\n")
-        f.write(f"  Min:    {np.min(predictions_flat):.6f}\n")
-        f.write(f"  Max:    {np.max(predictions_flat):.6f}\n")
-        f.write(f"  Mean:   {np.mean(predictions_flat):.6f}\n")
-        f.write(f"  Median: {np.median(predictions_flat):.6f}\n")
-        f.write(f"  Std:    {np.std(predictions_flat):.6f}\n")
+    stats_path.write_text(
+        f"Construct: {construct_name}\n"
+        f"Cell type: K562 (EFO:0002067)\n"
+        f"Prediction timestamp: {datetime.now().isoformat()}\n"
+        f"\nPrediction array shape: {predictions.shape}\n"
+        f"Flattened shape: {predictions_flat.shape}\n"
+        f"Data type: {predictions.dtype}\n"
+        f"\nStatistics:\n"
+        f"  Min:    {np.min(predictions_flat):.6f}\n"
+        f"  Max:    {np.max(predictions_flat):.6f}\n"
+        f"  Mean:   {np.mean(predictions_flat):.6f}\n"
+        f"  Median: {np.median(predictions_flat):.6f}\n"
+        f"  Std:    {np.std(predictions_flat):.6f}\n"
+    )
     print(f"✓ Saved statistics: {stats_path.name}")
     
     return npy_path
@@ -15,10 +15,7 @@ import json
 import random
 from pathlib import Path
 
-# Paths
-BASE_DIR = Path(__file__).parent
-SEQUENCES_DIR = BASE_DIR / "sequences"
-SEQUENCES_DIR.mkdir(exist_ok=True)
+import numpy as np
 
 # Paths
 BASE_DIR = Path(__file__).parent
@@ -38,6 +35,13 @@ DISTANCES = [1000, 5000, 10000, 25000, 50000, 100000, 200000, 500000]
 NUM_REPLICATES = 3
 REPLICATE_SEEDS = [42, 123, 987]  # Random seeds for reproducibility
 
+# 2-bit base encoding (A=0, C=1, G=2, T=3), 4 bases per byte
+BASE_CODES = np.full(256, 255, dtype=np.uint8)
+for _code, _base in enumerate(b"ACGT"):
+    BASE_CODES[_base] = _code
+CODE_BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+PACK_SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+
 
 def load_sequence(filepath):
     """Load DNA sequence from FASTA or text file."""
@@ -64,9 +68,59 @@ def shuffle_filler(filler_seq, seed):
     return ''.join(filler_list)
 
 
-def build_construct(enhancer_seq, promoter_seq, filler, distance_bp, replicate_seed=None):
+def pack_2bit(seq):
     """
-    Build a construct with enhancer at specified distance upstream of promoter.
+    Pack an ACGT sequence into 2 bits per base (4 bases per byte).
+    The last byte is padded with A if the length is not a multiple of 4.
+    """
+    if isinstance(seq, str):
+        seq = seq.encode()
+    codes = BASE_CODES[np.frombuffer(seq, dtype=np.uint8)]
+    if (codes == 255).any():
+        raise ValueError("2-bit packing requires an A/C/G/T-only sequence")
+    pad = -len(codes) % 4
+    if pad:
+        codes = np.concatenate([codes, np.zeros(pad, dtype=np.uint8)])
+    codes = codes.reshape(-1, 4)
+    return codes[:, 0] | (codes[:, 1] << 2) | (codes[:, 2] << 4) | (codes[:, 3] << 6)
+
+
+def unpack_2bit(packed, start, end):
+    """Decode bases [start, end) of a 2-bit packed buffer to ASCII bytes."""
+    first = start // 4
+    last = -(-end // 4)
+    codes = (packed[first:last, None] >> PACK_SHIFTS) & 3
+    offset = start - 4 * first
+    return CODE_BASES[codes.ravel()[offset:offset + end - start]].tobytes()
+
+
+def write_packed(packed, offset, seq):
+    """Overwrite bases starting at offset inside a 2-bit packed buffer."""
+    if isinstance(seq, str):
+        seq = seq.encode()
+    end = offset + len(seq)
+    first = offset // 4
+    last = -(-end // 4)
+    # Only the bytes touched by the insert are decoded and re-packed
+    window = bytearray(unpack_2bit(packed, 4 * first, 4 * last))
+    local = offset - 4 * first
+    window[local:local + len(seq)] = seq
+    packed[first:last] = pack_2bit(bytes(window))
+
+
+def pack_filler(filler):
+    """Tile filler to CONSTRUCT_LENGTH and pack it to 2 bits per base."""
+    # Ensure filler is at least construct length
+    if len(filler) < CONSTRUCT_LENGTH:
+        # Repeat filler if needed
+        repeats = (CONSTRUCT_LENGTH // len(filler)) + 1
+        filler = filler * repeats
+    return pack_2bit(filler[:CONSTRUCT_LENGTH])
+
+
+def make_builder(enhancer_len, promoter_len, distance_bp):
+    """
+    Return a construct builder specialized for one distance.
     
     Layout:
         [filler][enhancer][spacer][promoter][filler]
@@ -74,21 +128,10 @@ def build_construct(enhancer_seq, promoter_seq, filler, distance_bp, replicate_s
     The promoter is centered at PROMOTER_CENTER.
     The enhancer is placed distance_bp upstream.
     
-    Args:
-        replicate_seed: If provided, shuffle filler with this seed for technical replicate
+    All offsets depend only on the component lengths and distance, so they
+    are computed and validated once here and baked into the returned closure,
+    which is then reused for every replicate at this distance.
     """
-    # Shuffle filler for technical replicates
-    if replicate_seed is not None:
-        filler = shuffle_filler(filler, replicate_seed)
-    enhancer_len = len(enhancer_seq)
-    promoter_len = len(promoter_seq)
-    
-    # Ensure filler is at least construct length
-    if len(filler) < CONSTRUCT_LENGTH:
-        # Repeat filler if needed
-        repeats = (CONSTRUCT_LENGTH // len(filler)) + 1
-        filler = filler * repeats
-    
     # Promoter position (centered)
     promoter_start = PROMOTER_CENTER - promoter_len // 2
     promoter_end = promoter_start + promoter_len
@@ -103,22 +146,7 @@ def build_construct(enhancer_seq, promoter_seq, filler, distance_bp, replicate_s
     if promoter_end > CONSTRUCT_LENGTH:
         raise ValueError(f"Promoter would extend beyond construct: {promoter_end} > {CONSTRUCT_LENGTH}")
     
-    # Build construct by filling in regions
-    # Start with full filler, then replace enhancer and promoter regions
-    construct_array = bytearray(filler[:CONSTRUCT_LENGTH].encode())
-    
-    # Insert enhancer
-    construct_array[enhancer_start:enhancer_end] = enhancer_seq.encode()
-    
-    # Insert promoter
-    construct_array[promoter_start:promoter_end] = promoter_seq.encode()
-    
-    final_seq = construct_array.decode()
-    
-    if len(final_seq) != CONSTRUCT_LENGTH:
-        raise ValueError(f"Construct length {len(final_seq)} != {CONSTRUCT_LENGTH}")
-    
-    return final_seq, {
+    metadata = {
         'enhancer_start': enhancer_start,
         'enhancer_end': enhancer_end,
         'promoter_start': promoter_start,
@@ -127,6 +155,42 @@ def build_construct(enhancer_seq, promoter_seq, filler, distance_bp, replicate_s
         'enhancer_length': enhancer_len,
         'promoter_length': promoter_len
     }
+    
+    def build(enhancer_seq, promoter_seq, packed_filler):
+        """
+        Args:
+            packed_filler: Filler from pack_filler(), already shuffled for the replicate
+        """
+        if len(enhancer_seq) != enhancer_len or len(promoter_seq) != promoter_len:
+            raise ValueError("Enhancer/promoter lengths differ from those the builder was made for")
+        
+        # Build construct by filling in regions
+        # Start with full filler (2-bit packed), then replace enhancer and promoter regions
+        packed = packed_filler.copy()
+        
+        # Insert enhancer
+        write_packed(packed, enhancer_start, enhancer_seq)
+        
+        # Insert promoter
+        write_packed(packed, promoter_start, promoter_seq)
+        
+        if len(packed) * 4 != CONSTRUCT_LENGTH:
+            raise ValueError(f"Construct length {len(packed) * 4} != {CONSTRUCT_LENGTH}")
+        
+        return packed, dict(metadata)
+    
+    return build
+
+
+def build_construct(enhancer_seq, promoter_seq, filler, distance_bp):
+    """
+    Build a construct with enhancer at specified distance upstream of promoter.
+    
+    Args:
+        filler: Filler sequence, already shuffled for the technical replicate
+    """
+    builder = make_builder(len(enhancer_seq), len(promoter_seq), distance_bp)
+    return builder(enhancer_seq, promoter_seq, pack_filler(filler))
 
 
 def main():
@@ -135,6 +199,8 @@ def main():
     print("=" * 80)
     print()
     
+    SEQUENCES_DIR.mkdir(parents=True, exist_ok=True)
+    
     # Load components
     print("Loading components...")
     enhancer = load_sequence(ENHANCER_FILE)
@@ -146,6 +212,17 @@ def main():
     print(f"  Filler: {len(filler)} bp")
     print()
     
+    # Constructs are 2-bit packed, which only encodes A/C/G/T
+    components = {ENHANCER_FILE: enhancer, PROMOTER_FILE: promoter, FILLER_FILE: filler}
+    invalid = {path: sorted(set(seq) - set("ACGT")) for path, seq in components.items()}
+    invalid = {path: bases for path, bases in invalid.items() if bases}
+    if invalid:
+        for path, bases in invalid.items():
+            print(f"✗ ERROR: {path.name} contains non-ACGT bases ({', '.join(bases)}); "
+                  f"constructs are 2-bit packed and need A/C/G/T only")
+        print("No constructs built; existing FASTA and manifest left untouched")
+        return
+    
     # Build constructs with replicates
     manifest = {
         'experiment': 'distance_decay_replicates',
@@ -159,6 +236,13 @@ def main():
         'constructs': {}
     }
     
+    # Shuffled filler depends only on the seed, not the distance
+    print("Shuffling filler for each replicate seed...")
+    shuffled_fillers = {
+        seed: pack_filler(shuffle_filler(filler, seed)) for seed in REPLICATE_SEEDS
+    }
+    print()
+    
     total_constructs = len(DISTANCES) * NUM_REPLICATES
     print(f"Building {len(DISTANCES)} distances × {NUM_REPLICATES} replicates = {total_constructs} constructs...")
     print()
@@ -166,13 +250,22 @@ def main():
     for distance in DISTANCES:
         print(f"Distance {distance//1000}kb:")
         
+        try:
+            builder = make_builder(len(enhancer), len(promoter), distance)
+        except ValueError as e:
+            print(f"  ✗ ERROR: {e}")
+            print()
+            continue
+        
         for rep_idx, seed in enumerate(REPLICATE_SEEDS, 1):
             name = f"Distance_{distance//1000}kb_rep{rep_idx}"
             print(f"  {name} (seed={seed})...", end=" ")
             
             try:
-                seq, metadata = build_construct(enhancer, promoter, filler, distance, 
-                                               replicate_seed=seed)
+                packed, metadata = builder(enhancer, promoter, shuffled_fillers[seed])
+                
+                # Decode the packed construct only for FASTA emission
+                seq = unpack_2bit(packed, 0, CONSTRUCT_LENGTH).decode()
                 
                 # Save FASTA
                 fasta_path = SEQUENCES_DIR / f"{name}.fa"
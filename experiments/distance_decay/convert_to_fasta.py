@@ -9,7 +9,6 @@ Handles:
 """
 
 from pathlib import Path
-import re
 
 # Paths
 BASE_DIR = Path(__file__).parent
@@ -20,21 +19,30 @@ FILLER_DIR = PARENT_DIR / "filler"
 OUTPUT_DIR = BASE_DIR / "clean_sequences"
 OUTPUT_DIR.mkdir(exist_ok=True)
 
+# Upper-cases and (via delete=) strips whitespace in one bytes.translate pass
+WHITESPACE = b' \t\r\n\x0b\x0c'
+UPPERCASE_TABLE = bytes.maketrans(
+    b'abcdefghijklmnopqrstuvwxyz', b'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+
 
 def extract_sequence_from_xml(filepath):
     """Extract DNA sequence from XML/DAS format."""
-    with open(filepath) as f:
+    with open(filepath, 'rb') as f:
         content = f.read()
     
     # Find DNA content between <DNA> tags
-    dna_match = re.search(r'<DNA[^>]*>(.*?)</DNA>', content, re.DOTALL)
-    if dna_match:
-        dna_content = dna_match.group(1)
-        # Remove all whitespace and newlines
-        sequence = ''.join(dna_content.split())
-        return sequence.upper()
+    tag_start = content.find(b'<DNA')
+    if tag_start == -1:
+        return None
+    dna_start = content.find(b'>', tag_start)
+    dna_end = content.find(b'</DNA>', dna_start)
+    if dna_start == -1 or dna_end == -1:
+        return None
     
-    return None
+    # Remove all whitespace and upper-case in a single pass
+    sequence = content[dna_start + 1:dna_end].translate(UPPERCASE_TABLE, delete=WHITESPACE)
+    return sequence.decode('ascii')
 
 
 def load_fasta(filepath):
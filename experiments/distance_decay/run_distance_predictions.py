@@ -40,10 +40,7 @@ except ImportError:
 BASE_DIR = Path(__file__).parent
 SEQUENCES_DIR = BASE_DIR / "sequences"
 OUTPUT_DIR = BASE_DIR / "alphagenome_outputs"
-OUTPUT_DIR.mkdir(exist_ok=True)
-
 LOGS_DIR = BASE_DIR / "logs"
-LOGS_DIR.mkdir(exist_ok=True)
 
 # Cell type for K562
 CELL_TYPE = "EFO:0002067"  # K562 ontology term
@@ -128,6 +125,9 @@ def main():
     print("=" * 80)
     print()
     
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    
     # Load manifest
     manifest_path = BASE_DIR / "construct_manifest.json"
     if not manifest_path.exists():
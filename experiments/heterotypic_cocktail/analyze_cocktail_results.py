@@ -2,6 +2,7 @@
 """Analyze heterotypic enhancer cocktail predictions."""
 
 import json
+import sys
 from pathlib import Path
 from typing import Dict, List
 
@@ -10,6 +11,10 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 
+# Helpers shared across experiments live one level up, in experiments/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from track_plotting import downsample_track
+
 ROOT = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking")
 EXPERIMENT_ROOT = ROOT / "experiments" / "heterotypic_cocktail"
 OUTPUT_DIR = EXPERIMENT_ROOT / "alphagenome_outputs"
@@ -41,7 +46,8 @@ def load_predictions(construct: str) -> np.ndarray:
     arr = np.load(npy_path)
     if arr.ndim > 1:
         arr = arr.squeeze()
-    return arr
+    # Newer tracks are stored as float16; metrics are computed in float32
+    return arr.astype(np.float32, copy=False)
 
 
 def slice_window(arr: np.ndarray, start: int, end: int) -> np.ndarray:
@@ -84,14 +90,14 @@ def compute_metrics(preds: np.ndarray, features: List[Dict]) -> Dict:
     return metrics
 
 
-def plot_tracks(predictions: Dict[str, np.ndarray], manifest: List[Dict]) -> Path:
+def plot_tracks(manifest: List[Dict], tracks: Dict[str, tuple]) -> Path:
+    """Plot each construct's (x_kb, values) envelope from downsample_track."""
     constructs = [entry["construct"] for entry in manifest]
     fig, axes = plt.subplots(len(constructs), 1, figsize=(14, 12), sharex=True)
 
     for ax, entry in zip(axes, manifest):
-        preds = predictions[entry["construct"]]
-        x = np.arange(len(preds)) / 1_000
-        ax.plot(x, preds, color="black", linewidth=0.6)
+        x, values = tracks[entry["construct"]]
+        ax.plot(x, values, color="black", linewidth=0.6)
         for feat in entry["features"]:
             if feat.get("label") == "enhancer_module":
                 ax.axvspan(feat["start"] / 1_000, feat["end"] / 1_000, alpha=0.1, color="red")
@@ -111,9 +117,7 @@ def plot_tracks(predictions: Dict[str, np.ndarray], manifest: List[Dict]) -> Pat
     return out_path
 
 
-def plot_module_heatmap(df: pd.DataFrame) -> Path:
-    module_cols = [col for col in df.columns if col.startswith("module_mean_")]
-    heatmap_df = df.set_index("construct")[module_cols]
+def plot_module_heatmap(heatmap_df: pd.DataFrame) -> Path:
     fig, ax = plt.subplots(figsize=(8, 4))
     sns.heatmap(heatmap_df, cmap="viridis", annot=True, fmt=".4f", ax=ax)
     ax.set_title("Module mean accessibility")
@@ -126,20 +130,42 @@ def plot_module_heatmap(df: pd.DataFrame) -> Path:
 
 def main() -> None:
     manifest = load_manifest()
-    predictions = {entry["construct"]: load_predictions(entry["construct"]) for entry in manifest}
+
+    modules = list(dict.fromkeys(
+        feat["module"]
+        for entry in manifest
+        for feat in entry.get("features", [])
+        if feat.get("label") == "enhancer_module"
+    ))
+    col_idx = {module: idx for idx, module in enumerate(modules)}
+    heat = np.full((len(manifest), len(col_idx)), np.nan, dtype=np.float32)
 
     records = []
-    for entry in manifest:
-        metrics = compute_metrics(predictions[entry["construct"]], entry.get("features", []))
-        metrics.update({"construct": entry["construct"], "description": entry.get("description", "")})
+    # Each track is read once; only its display-resolution envelope is kept for plotting
+    tracks: Dict[str, tuple] = {}
+    for i, entry in enumerate(manifest):
+        preds = load_predictions(entry["construct"])
+        metrics = compute_metrics(preds, entry.get("features", []))
+        tracks[entry["construct"]] = downsample_track(preds)
+        for module, j in col_idx.items():
+            value = metrics.get(f"module_mean_{module}")
+            if value is not None:
+                heat[i, j] = value
+        metrics["construct"] = entry["construct"]
+        metrics["description"] = entry.get("description", "")
         records.append(metrics)
 
     df = pd.DataFrame(records)
     metrics_path = RESULTS_DIR / "cocktail_metrics.csv"
     df.to_csv(metrics_path, index=False)
 
-    track_path = plot_tracks(predictions, manifest)
-    heatmap_path = plot_module_heatmap(df)
+    track_path = plot_tracks(manifest, tracks)
+    heatmap_df = pd.DataFrame(
+        heat,
+        index=pd.Index([entry["construct"] for entry in manifest], name="construct"),
+        columns=[f"module_mean_{module}" for module in modules],
+    )
+    heatmap_path = plot_module_heatmap(heatmap_df)
 
     print(f"Metrics saved to {metrics_path}")
     print(f"Tracks saved to {track_path}")
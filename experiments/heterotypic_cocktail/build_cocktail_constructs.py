@@ -3,11 +3,13 @@
 
 from __future__ import annotations
 
+import functools
 import json
-import re
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 ROOT = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking")
 EXPERIMENT_ROOT = ROOT / "experiments" / "heterotypic_cocktail"
@@ -26,57 +28,84 @@ PROMOTER_POS = 500_000
 DOMAIN_START = 250_000
 
 
+# Byte -> complement lookup table; bytes other than ACGT map to themselves
+_COMPLEMENT_LUT = np.arange(256, dtype=np.uint8)
+_COMPLEMENT_LUT[np.frombuffer(b"ACGT", dtype=np.uint8)] = np.frombuffer(b"TGCA", dtype=np.uint8)
+
+
 @dataclass
 class Module:
     name: str
-    sequence: str
+    sequence: bytes
+    _reverse: bytes = field(init=False, repr=False)
 
-    def oriented(self, orientation: str) -> str:
+    def __post_init__(self) -> None:
+        self._reverse = reverse_complement(self.sequence)
+
+    def oriented(self, orientation: str) -> bytes:
         if orientation == "+":
             return self.sequence
         if orientation == "-":
-            return reverse_complement(self.sequence)
+            return self._reverse
         raise ValueError(f"Unknown orientation '{orientation}' for module {self.name}")
 
 
-def reverse_complement(seq: str) -> str:
-    table = str.maketrans("ACGT", "TGCA")
-    return seq.upper().translate(table)[::-1]
+def reverse_complement(seq: bytes) -> bytes:
+    # Gathering through the reversed view complements and reverses in one pass
+    arr = np.frombuffer(seq, dtype=np.uint8)
+    return _COMPLEMENT_LUT[arr[::-1]].tobytes()
+
 
+def _as_upper(seq: bytes) -> bytes:
+    # Sequence files are normally upper-case already; only copy when they are not
+    return seq if seq.isupper() else seq.upper()
 
-def parse_hs2(path: Path) -> str:
-    text = path.read_text()
-    match = re.search(r"<DNA[^>]*>(.*?)</DNA>", text, re.DOTALL)
-    if not match:
+
+def _parse_xml_dna(path: Path) -> Optional[bytes]:
+    data = path.read_bytes()
+    _, tag, rest = data.partition(b"<DNA")
+    _, open_end, rest = rest.partition(b">")
+    middle, close, _ = rest.partition(b"</DNA>")
+    if not (tag and open_end and close):
+        return None
+    return _as_upper(b"".join(middle.split())) or None
+
+
+@functools.lru_cache(maxsize=None)
+def parse_hs2(path: Path) -> bytes:
+    sequence = _parse_xml_dna(path)
+    if not sequence:
         raise ValueError("HS2 sequence not found in XML FASTA")
-    return "".join(match.group(1).split()).upper()
+    return sequence
 
 
-def parse_promoter(path: Path) -> str:
-    text = path.read_text()
-    match = re.search(r"<DNA[^>]*>(.*?)</DNA>", text, re.DOTALL)
-    if not match:
+@functools.lru_cache(maxsize=None)
+def parse_promoter(path: Path) -> bytes:
+    sequence = _parse_xml_dna(path)
+    if not sequence:
         raise ValueError("Promoter DNA not found in XML FASTA")
-    return "".join(match.group(1).split()).upper()
+    return sequence
 
 
-def load_filler(path: Path) -> str:
-    filler = path.read_text().strip().upper()
+@functools.lru_cache(maxsize=None)
+def load_filler(path: Path) -> bytes:
+    filler = _as_upper(path.read_bytes().strip())
     if not filler:
         raise ValueError("Filler sequence is empty")
     return filler
 
 
-def load_plain_sequence(path: Path) -> str:
-    with open(path, "r") as handle:
-        lines = [line.strip() for line in handle if not line.startswith(">")]
-    sequence = "".join(lines).upper()
+@functools.lru_cache(maxsize=None)
+def load_plain_sequence(path: Path) -> bytes:
+    with open(path, "rb") as handle:
+        lines = [line.strip() for line in handle if not line.startswith(b">")]
+    sequence = _as_upper(b"".join(lines))
     if not sequence:
         raise ValueError(f"Sequence empty in {path}")
     return sequence
 
 
-def build_module_definitions(hs2_sequence: str) -> Dict[str, Module]:
+def build_module_definitions(hs2_sequence: bytes) -> Dict[str, Module]:
     modules = {
         "HS2": Module("HS2", hs2_sequence),
         "GATA1": Module("GATA1", load_plain_sequence(GATA1_MODULE_PATH)),
@@ -105,67 +134,112 @@ class CocktailConfig:
 
 
 class SequenceBuilder:
-    def __init__(self, filler: str):
+    def __init__(self, filler: bytes, total_length: int, record_features: bool = True):
         self._filler = filler
+        self._record_features = record_features
         self._filler_idx = 0
-        self.parts: List[str] = []
+        self.total_length = total_length
+        self._buf = bytearray(total_length)
         self.cursor = 0
         self.features: List[Dict] = []
         self.events: List[Dict] = []
 
-    def _take_filler(self, length: int) -> str:
-        if length <= 0:
-            return ""
-        chunks: List[str] = []
-        remaining = length
-        while remaining > 0:
-            chunk_len = min(len(self._filler) - self._filler_idx, remaining)
-            chunks.append(self._filler[self._filler_idx:self._filler_idx + chunk_len])
-            self._filler_idx = (self._filler_idx + chunk_len) % len(self._filler)
-            remaining -= chunk_len
-        return "".join(chunks)
+    def _write_filler(self, dest: bytearray, start: int, length: int) -> None:
+        n = len(self._filler)
+        idx = self._filler_idx
+        end = start + length
+        if idx + length <= n:
+            dest[start:end] = self._filler[idx:idx + length]
+        else:
+            head = n - idx
+            wraps, tail = divmod(length - head, n)
+            body_end = start + head + wraps * n
+            dest[start:start + head] = self._filler[idx:]
+            if wraps:
+                dest[start + head:body_end] = self._filler * wraps
+            dest[body_end:end] = self._filler[:tail]
+        self._filler_idx = (idx + length) % n
+
+    def take_filler(self, length: int) -> bytearray:
+        out = bytearray(length)
+        if length > 0:
+            self._write_filler(out, 0, length)
+        return out
 
     def append_filler(self, length: int, label: Optional[str] = None, metadata: Optional[Dict] = None) -> None:
         if length <= 0:
             return
-        seq = self._take_filler(length)
-        self._append_sequence(seq, label=label, metadata=metadata)
+        start = self._advance(length)
+        self._write_filler(self._buf, start, length)
+        self._record_feature(start, self.cursor, label, metadata)
 
-    def append_module(self, module: Module, orientation: str, label: str, metadata: Dict) -> None:
-        seq = module.oriented(orientation)
+    @staticmethod
+    def module_segment(module: Module, orientation: str, label: str, metadata: Dict) -> Tuple[bytes, str, Dict]:
         meta = dict(metadata)
         meta.update({"module": module.name, "orientation": orientation})
+        return module.oriented(orientation), label, meta
+
+    def append_module(self, module: Module, orientation: str, label: str, metadata: Dict) -> None:
+        seq, label, meta = self.module_segment(module, orientation, label, metadata)
         self._append_sequence(seq, label=label, metadata=meta)
 
-    def append_sequence(self, seq: str, label: Optional[str] = None, metadata: Optional[Dict] = None) -> None:
+    def append_block(self, segments: List[Tuple[bytes, Optional[str], Optional[Dict]]]) -> None:
+        """Write consecutive (sequence, label, metadata) segments in a single buffer write."""
+        block = b"".join(seq for seq, _, _ in segments)
+        if not block:
+            return
+        start = self._advance(len(block))
+        self._buf[start:self.cursor] = block
+        offset = start
+        for seq, label, metadata in segments:
+            if seq:
+                self._record_feature(offset, offset + len(seq), label, metadata)
+                offset += len(seq)
+
+    def append_sequence(self, seq: bytes, label: Optional[str] = None, metadata: Optional[Dict] = None) -> None:
         self._append_sequence(seq, label, metadata)
 
-    def _append_sequence(self, seq: str, label: Optional[str], metadata: Optional[Dict]) -> None:
+    def _append_sequence(self, seq: bytes, label: Optional[str], metadata: Optional[Dict]) -> None:
         if not seq:
             return
+        start = self._advance(len(seq))
+        self._buf[start:self.cursor] = seq
+        self._record_feature(start, self.cursor, label, metadata)
+
+    def _advance(self, length: int) -> int:
         start = self.cursor
-        self.parts.append(seq)
-        self.cursor += len(seq)
-        if label:
-            feature = {"label": label, "start": start, "end": self.cursor}
-            if metadata:
-                feature.update(metadata)
-            self.features.append(feature)
+        end = start + length
+        if end > self.total_length:
+            raise ValueError(f"Construct exceeds target length ({end} > {self.total_length})")
+        self.cursor = end
+        return start
+
+    def _record_feature(self, start: int, end: int, label: Optional[str], metadata: Optional[Dict]) -> None:
+        if not self._record_features or not label:
+            return
+        feature = {"label": label, "start": start, "end": end}
+        if metadata:
+            feature.update(metadata)
+        self.features.append(feature)
 
     def record_event(self, name: str, metadata: Dict) -> None:
         event = {"event": name, "position": self.cursor}
         event.update(metadata)
         self.events.append(event)
 
-    def finish(self, total_length: int) -> str:
-        if self.cursor > total_length:
-            raise ValueError(f"Construct exceeds target length ({self.cursor} > {total_length})")
-        self.append_filler(total_length - self.cursor)
-        return "".join(self.parts)
+    def finish(self) -> bytearray:
+        self.append_filler(self.total_length - self.cursor)
+        return self._buf
 
 
-def build_construct(config: CocktailConfig, modules: Dict[str, Module], promoter: str, filler: str) -> Dict:
-    builder = SequenceBuilder(filler)
+def build_construct(
+    config: CocktailConfig,
+    modules: Dict[str, Module],
+    promoter: bytes,
+    filler: bytes,
+    record_features: bool = True,
+) -> Dict:
+    builder = SequenceBuilder(filler, CONSTRUCT_LENGTH, record_features=record_features)
     builder.append_filler(DOMAIN_START, label="upstream_filler")
 
     if config.ctcf_brackets:
@@ -173,6 +247,8 @@ def build_construct(config: CocktailConfig, modules: Dict[str, Module], promoter
         builder.record_event("ctcf_bracket_added", {"anchor": "left"})
 
     for repeat_idx in range(config.repeat_count):
+        # Assemble modules, intra-repeat spacers and separator, then write them as one block
+        segments = []
         for order_idx, module_name in enumerate(config.module_order):
             module = modules[module_name]
             orientation = config.orientation_pattern[order_idx]
@@ -180,14 +256,16 @@ def build_construct(config: CocktailConfig, modules: Dict[str, Module], promoter
                 "repeat_index": repeat_idx,
                 "order_index": order_idx,
             }
-            builder.append_module(module, orientation, "enhancer_module", metadata)
+            segments.append(builder.module_segment(module, orientation, "enhancer_module", metadata))
 
             if order_idx < len(config.module_order) - 1:
-                builder.append_filler(config.module_spacing, label="module_spacing")
+                segments.append((builder.take_filler(config.module_spacing), "module_spacing", None))
 
         if config.repeat_separator:
             separator_module = modules[config.repeat_separator]
-            builder.append_module(separator_module, config.repeat_separator_orientation, "repeat_separator", {"repeat_index": repeat_idx})
+            segments.append(builder.module_segment(separator_module, config.repeat_separator_orientation, "repeat_separator", {"repeat_index": repeat_idx}))
+
+        builder.append_block(segments)
 
         if repeat_idx < config.repeat_count - 1:
             builder.append_filler(config.repeat_spacing, label="repeat_spacing")
@@ -202,7 +280,7 @@ def build_construct(config: CocktailConfig, modules: Dict[str, Module], promoter
     builder.append_filler(PROMOTER_POS - builder.cursor, label="spacer_to_promoter")
     builder.append_sequence(promoter, label="promoter", metadata={"length": len(promoter)})
 
-    sequence = builder.finish(CONSTRUCT_LENGTH)
+    sequence = builder.finish()
 
     return {
         "sequence": sequence,
@@ -211,12 +289,11 @@ def build_construct(config: CocktailConfig, modules: Dict[str, Module], promoter
     }
 
 
-def save_construct(name: str, sequence: str) -> Path:
+def save_construct(name: str, sequence: bytearray) -> Path:
     CONSTRUCT_DIR.mkdir(parents=True, exist_ok=True)
     path = CONSTRUCT_DIR / f"{name}_construct.fa"
-    with open(path, "w") as handle:
-        handle.write(f">{name}_construct\n")
-        handle.write(sequence + "\n")
+    header = f">{name}_construct\n".encode("ascii")
+    path.write_bytes(b"".join((header, sequence, b"\n")))
     return path
 
 
@@ -296,7 +373,8 @@ def main() -> None:
 
     for config in COCKTAIL_CONFIGS:
         print(f"Building {config.name}...")
-        result = build_construct(config, modules, promoter, filler)
+        # Feature coordinates are embedded in the manifest, so always record them
+        result = build_construct(config, modules, promoter, filler, record_features=True)
         fasta_path = save_construct(config.name, result["sequence"])
         manifest.append(
             {
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 """Run AlphaGenome predictions for heterotypic enhancer cocktails."""
 
+import functools
 import json
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
 import numpy as np
 from dotenv import load_dotenv
@@ -27,6 +31,11 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 ONTOLOGY_TERM = "EFO:0002067"  # K562
+MAX_WORKERS = 4  # Concurrent in-flight API requests
+SAVE_TXT = bool(os.getenv("SAVE_TXT"))  # Also dump each track as text for manual inspection
+SAVE_DTYPE = np.float16  # On-disk dtype for tracks (half the bytes of float32; ~3 significant digits)
+
+_LOG_LOCK = threading.Lock()
 
 
 def load_manifest() -> list:
@@ -36,25 +45,65 @@ def load_manifest() -> list:
         return json.load(handle)
 
 
-def load_sequence(fasta_path: Path) -> str:
-    with open(fasta_path, "r") as handle:
-        lines = [line.strip() for line in handle if not line.startswith(">")]
-    return "".join(lines).upper()
+def load_sequence(fasta_path: Path) -> bytes:
+    with open(fasta_path, "rb") as handle:
+        lines = [line.strip() for line in handle if not line.startswith(b">")]
+    return b"".join(lines).upper()
+
+
+@functools.lru_cache(maxsize=None)
+def get_client(api_key: str):
+    return dna_client.create(api_key)
 
 
-def save_outputs(predictions: np.ndarray, construct: str) -> None:
+def save_outputs(predictions: np.ndarray, construct: str, write_txt: bool = SAVE_TXT) -> None:
     flat = predictions.reshape(-1)
-    np.save(OUTPUT_DIR / f"{construct}_dnase.npy", predictions)
-    np.savetxt(OUTPUT_DIR / f"{construct}_dnase.txt", flat, fmt="%.6f")
+    # Tracks outside the float16 range keep their original dtype; .npy records whichever was used
+    if np.abs(flat).max() <= np.finfo(SAVE_DTYPE).max:
+        stored = predictions.astype(SAVE_DTYPE)
+    else:
+        stored = predictions
+    np.save(OUTPUT_DIR / f"{construct}_dnase.npy", stored, allow_pickle=False)
+    if write_txt:
+        # Plain-text dump is only for manual inspection; analysis reads the .npy
+        np.savetxt(OUTPUT_DIR / f"{construct}_dnase.txt", flat, fmt="%.6f")
+    # Stats come from the full-precision predictions, not the stored copy
+    min_val, max_val, mean_val, std_val = np.array([flat.min(), flat.max(), flat.mean(), flat.std()])
     stats_path = OUTPUT_DIR / f"{construct}_stats.txt"
     with open(stats_path, "w") as handle:
         handle.write(f"Construct: {construct}\n")
         handle.write(f"Timestamp: {datetime.now().isoformat()}\n")
         handle.write(f"Shape: {predictions.shape}\n")
-        handle.write(f"Min: {flat.min():.6f}\n")
-        handle.write(f"Max: {flat.max():.6f}\n")
-        handle.write(f"Mean: {flat.mean():.6f}\n")
-        handle.write(f"Std: {flat.std():.6f}\n")
+        handle.write(f"Min: {min_val:.6f}\n")
+        handle.write(f"Max: {max_val:.6f}\n")
+        handle.write(f"Mean: {mean_val:.6f}\n")
+        handle.write(f"Std: {std_val:.6f}\n")
+
+
+def append_log(log_path: Path, message: str) -> None:
+    with _LOG_LOCK:
+        with open(log_path, "a") as handle:
+            handle.write(f"{datetime.now().isoformat()} | {message}\n")
+
+
+def predict_and_save(client, entry: dict, log_path: Path) -> Optional[Exception]:
+    name = entry["construct"]
+    fasta_path = EXPERIMENT_ROOT / entry["fasta"]
+    sequence = load_sequence(fasta_path)
+    try:
+        # The client takes a str sequence; decode the ASCII bytes once here
+        output = client.predict_sequence(
+            sequence=sequence.decode("ascii"),
+            requested_outputs=[dna_client.OutputType.DNASE],
+            ontology_terms=[ONTOLOGY_TERM],
+        )
+    except Exception as exc:
+        append_log(log_path, f"FAILED | {name} | {exc}")
+        return exc
+
+    save_outputs(output.dnase.values, name)
+    append_log(log_path, f"SUCCESS | {name}")
+    return None
 
 
 def main() -> None:
@@ -65,30 +114,22 @@ def main() -> None:
         sys.exit(1)
 
     manifest = load_manifest()
-    client = dna_client.create(api_key)
+    client = get_client(api_key)
     log_path = LOG_DIR / f"predictions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
 
-    for entry in manifest:
-        name = entry["construct"]
-        fasta_rel = entry["fasta"]
-        fasta_path = EXPERIMENT_ROOT / fasta_rel
-        print(f"Predicting {name}...")
-        sequence = load_sequence(fasta_path)
-        try:
-            output = client.predict_sequence(
-                sequence=sequence,
-                requested_outputs=[dna_client.OutputType.DNASE],
-                ontology_terms=[ONTOLOGY_TERM],
-            )
-        except Exception as exc:
-            print(f"Prediction failed for {name}: {exc}")
-            with open(log_path, "a") as handle:
-                handle.write(f"{datetime.now().isoformat()} | FAILED | {name} | {exc}\n")
-            continue
-
-        save_outputs(output.dnase.values, name)
-        with open(log_path, "a") as handle:
-            handle.write(f"{datetime.now().isoformat()} | SUCCESS | {name}\n")
+    # Predictions are network-bound, so overlap requests across a small thread pool
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {}
+        for entry in manifest:
+            print(f"Predicting {entry['construct']}...")
+            futures[executor.submit(predict_and_save, client, entry, log_path)] = entry["construct"]
+        for future in as_completed(futures):
+            name = futures[future]
+            exc = future.result()
+            if exc is not None:
+                print(f"Prediction failed for {name}: {exc}")
+            else:
+                print(f"  ✓ {name}")
 
     print("Prediction sweep finished.")
 
@@ -11,9 +11,12 @@ For each TF pair, computes:
 
 from __future__ import annotations
 
+import functools
 import json
+import re
+from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -33,6 +36,18 @@ IDEAL_GATES = {
     "NOT": np.array([1, 0, 1, 0]),  # B input inverts
     "XOR": np.array([0, 1, 1, 0]),
 }
+GATE_NAMES = list(IDEAL_GATES.keys())
+IDEAL_MATRIX = np.stack([IDEAL_GATES[g] for g in GATE_NAMES])  # (gates, conditions)
+
+# Additivity-ratio bin edges and the synergy class of each bin
+SYNERGY_BINS = np.array([0.9, 1.1])
+SYNERGY_CLASSES = np.array(["interference", "additive", "synergy"])
+
+# "key: value" lines of a stats file; comment lines never match
+_STAT_RE = re.compile(
+    r"^(\w[\w ]*):\s*([-+]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|nan|inf))\s*$",
+    re.M,
+)
 
 sns.set_style("whitegrid")
 plt.rcParams['figure.dpi'] = 300
@@ -44,149 +59,127 @@ def load_manifest() -> List[Dict]:
         return json.load(f)
 
 
-def load_prediction_stats(construct_name: str, cell_type: str) -> Dict:
-    """Load prediction statistics for a construct."""
+@functools.lru_cache(maxsize=None)
+def load_prediction_stats(construct_name: str, cell_type: str) -> Optional[Dict]:
+    """
+    Load prediction statistics for a construct.
+    Cached per (construct, cell_type); callers must not mutate the returned dict.
+    """
     stats_path = OUTPUT_DIR / f"{construct_name}_{cell_type}_stats.txt"
     
     if not stats_path.exists():
         return None
     
-    stats = {}
-    with open(stats_path, 'r') as f:
-        for line in f:
-            if ':' in line and not line.startswith('#'):
-                key, value = line.strip().split(':', 1)
-                try:
-                    stats[key.strip()] = float(value.strip())
-                except:
-                    pass
-    return stats
+    text = stats_path.read_text()
+    return {key.strip(): float(value) for key, value in _STAT_RE.findall(text)}
 
 
 def normalize_signals(signals: np.ndarray) -> np.ndarray:
     """
-    Normalize signals to [0, 1] range.
+    Normalize each row of an (N, 4) signal matrix to [0, 1] range.
     Sets baseline (00) to 0, max to 1.
     """
-    min_val = signals[0]  # 00 condition is baseline
-    max_val = np.max(signals)
+    min_val = signals[:, :1]  # 00 condition is baseline
+    span = signals.max(axis=1, keepdims=True) - min_val
+    flat = span[:, 0] < 1e-6  # Avoid division by zero
     
-    if max_val - min_val < 1e-6:  # Avoid division by zero
-        return np.zeros_like(signals)
-    
-    return (signals - min_val) / (max_val - min_val)
+    normalized = (signals - min_val) / np.where(flat[:, None], 1.0, span)
+    normalized[flat] = 0.0
+    return normalized
 
 
-def compute_logic_score(observed: np.ndarray, gate_type: str) -> float:
-    """
-    Compute how well observed pattern matches ideal gate.
-    Returns R² score (1.0 = perfect match, 0.0 = no correlation).
+def analyze_batch(signals: np.ndarray, ideals: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    ideal = IDEAL_GATES[gate_type]
-    
-    # Normalize observed to [0, 1]
-    observed_norm = normalize_signals(observed)
+    Score all TF pairs at once.
     
-    # Compute R² score
-    ss_res = np.sum((observed_norm - ideal) ** 2)
-    ss_tot = np.sum((observed_norm - np.mean(observed_norm)) ** 2)
+    signals: (N, 4) matrix of raw signals, columns ordered 00, 01, 10, 11
+    ideals: (G, 4) matrix of ideal gate patterns
     
-    if ss_tot < 1e-6:
-        return 0.0
+    Returns (logic_scores[N, G], additivity[N], bliss_excess[N]). Logic scores
+    are R² against each ideal gate (1.0 = perfect match, 0.0 = no correlation).
+    """
+    observed_norm = normalize_signals(signals)
+    
+    # R² of every pair against every gate
+    ss_tot = np.sum((observed_norm - observed_norm.mean(axis=1, keepdims=True)) ** 2, axis=1)
+    ss_res = np.sum((observed_norm[:, None, :] - ideals[None, :, :]) ** 2, axis=2)
+    degenerate = ss_tot < 1e-6
+    r2 = 1 - ss_res / np.where(degenerate, 1.0, ss_tot)[:, None]
+    logic_scores = np.where(degenerate[:, None], 0.0, np.maximum(0.0, r2))  # Clip to [0, 1]
+    
+    s00, s01, s10, s11 = signals.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Additivity ratio
+        expected_additive = s01 + s10
+        additivity = np.where(expected_additive > 0, s11 / expected_additive, np.nan)
+        
+        # Bliss independence (multiplicative model)
+        expected_bliss = np.where(s00 > 0, s01 * s10 / s00, s01 * s10)
+        bliss_excess = np.where((s01 > 0) & (s10 > 0), s11 - expected_bliss, np.nan)
     
-    r2 = 1 - (ss_res / ss_tot)
-    return max(0.0, r2)  # Clip to [0, 1]
+    return logic_scores, additivity, bliss_excess
 
 
-def compute_synergy_metrics(signals: Dict[str, float]) -> Dict:
+def classify_synergy(additivity: np.ndarray) -> np.ndarray:
     """
-    Compute various synergy/cooperativity metrics.
-    
-    signals: {"00": baseline, "01": B_only, "10": A_only, "11": both}
+    Classify pairs by additivity ratio: > 1.1 synergy, > 0.9 additive,
+    otherwise (including NaN) interference.
     """
-    s00, s01, s10, s11 = signals["00"], signals["01"], signals["10"], signals["11"]
-    
-    # Additivity ratio
-    expected_additive = s01 + s10
-    if expected_additive > 0:
-        additivity = s11 / expected_additive
-    else:
-        additivity = np.nan
-    
-    # Excess over maximum
-    max_single = max(s01, s10)
-    eom = s11 - max_single
-    
-    # Bliss independence (multiplicative model)
-    if s01 > 0 and s10 > 0:
-        expected_bliss = s01 * s10 / s00 if s00 > 0 else s01 * s10
-        bliss_excess = s11 - expected_bliss
-    else:
-        bliss_excess = np.nan
-    
-    # Synergy classification
-    if additivity > 1.1:
-        synergy_class = "synergy"
-    elif additivity > 0.9:
-        synergy_class = "additive"
-    else:
-        synergy_class = "interference"
-    
-    return {
-        "additivity_ratio": additivity,
-        "excess_over_max": eom,
-        "bliss_excess": bliss_excess,
-        "synergy_class": synergy_class,
-    }
+    class_idx = np.digitize(additivity, SYNERGY_BINS, right=True)
+    class_idx[np.isnan(additivity)] = 0
+    return SYNERGY_CLASSES[class_idx]
 
 
-def analyze_tf_pair(pair_data: List[Dict]) -> Dict:
+def load_pair_signals(pair_data: List[Dict]) -> Optional[Dict[str, float]]:
     """
-    Analyze a single TF pair across all 4 truth table conditions.
+    Load the max DNase signal (activity proxy) for each truth table condition.
     
-    pair_data: List of 4 construct entries (00, 01, 10, 11)
+    pair_data: List of 4 construct entries, ordered 00, 01, 10, 11
+    Returns None if any prediction is missing.
     """
-    # Sort by binary code to ensure correct order
-    pair_data = sorted(pair_data, key=lambda x: x["binary_code"])
-    
-    # Extract signals (using max DNase as proxy for activity)
     signals = {}
-    signal_array = np.zeros(4)
-    
-    for i, entry in enumerate(pair_data):
-        binary_code = entry["binary_code"]
+    for entry in pair_data:
         stats = load_prediction_stats(entry["construct"], entry["cell_type"])
         
         if stats is None:
             return None  # Missing data
         
-        signal = stats["max"]
-        signals[binary_code] = signal
-        signal_array[i] = signal
-    
-    # Compute logic scores for all gate types
-    logic_scores = {}
-    for gate_type in IDEAL_GATES.keys():
-        score = compute_logic_score(signal_array, gate_type)
-        logic_scores[gate_type] = score
+        signals[entry["binary_code"]] = stats["max"]
+    return signals
+
+
+def build_pair_result(
+    pair_data: List[Dict],
+    signals: Dict[str, float],
+    signal_array: np.ndarray,
+    normalized: np.ndarray,
+    scores: np.ndarray,
+    additivity: float,
+    bliss_excess: float,
+    synergy_class: str,
+) -> Dict:
+    """Assemble the per-pair result record from its row of batch outputs."""
+    logic_scores = dict(zip(GATE_NAMES, scores.tolist()))
     
     # Best-fit gate
     best_gate = max(logic_scores, key=logic_scores.get)
     best_score = logic_scores[best_gate]
     
     # Second-best for confidence
-    scores_sorted = sorted(logic_scores.items(), key=lambda x: x[1], reverse=True)
-    confidence = scores_sorted[0][1] - scores_sorted[1][1] if len(scores_sorted) > 1 else 1.0
+    scores_sorted = sorted(logic_scores.values(), reverse=True)
+    confidence = scores_sorted[0] - scores_sorted[1] if len(scores_sorted) > 1 else 1.0
     
     # Expected gate from experimental design
     expected_gate = pair_data[0]["gate_type"]
     correct_classification = (best_gate == expected_gate)
     
     # Synergy metrics
-    synergy = compute_synergy_metrics(signals)
-    
-    # Normalized signals
-    normalized = normalize_signals(signal_array)
+    synergy = {
+        "additivity_ratio": float(additivity),
+        "excess_over_max": float(signal_array[3] - max(signal_array[1], signal_array[2])),
+        "bliss_excess": float(bliss_excess),
+        "synergy_class": str(synergy_class),
+    }
     
     return {
         "tf_a": pair_data[0]["tf_a"],
@@ -209,36 +202,51 @@ def analyze_tf_pair(pair_data: List[Dict]) -> Dict:
 def analyze_all_pairs(manifest: List[Dict]) -> List[Dict]:
     """Analyze all TF pairs in manifest."""
     
-    # Group by (tf_a, tf_b, cell_type)
-    pairs = {}
+    # Group by (tf_a, tf_b, cell_type), slotting each entry by its binary code
+    pairs = defaultdict(lambda: [None] * 4)
     for entry in manifest:
         key = (entry["tf_a"], entry["tf_b"], entry["cell_type"])
-        if key not in pairs:
-            pairs[key] = []
-        pairs[key].append(entry)
+        pairs[key][int(entry["binary_code"], 2)] = entry
     
     print(f"\n{'='*80}")
     print(f"Analyzing {len(pairs)} TF pairs")
     print(f"{'='*80}\n")
     
-    results = []
+    # Gather signals for every complete pair, then score them in one batch
+    complete = []
     for key, pair_data in pairs.items():
         tf_a, tf_b, cell_type = key
         
-        if len(pair_data) != 4:
-            print(f"⚠️  {tf_a}×{tf_b} ({cell_type}): Missing conditions (found {len(pair_data)}/4)")
+        found = sum(entry is not None for entry in pair_data)
+        if found != 4:
+            print(f"⚠️  {tf_a}×{tf_b} ({cell_type}): Missing conditions (found {found}/4)")
             continue
         
-        print(f"Analyzing: {tf_a} × {tf_b} ({cell_type})")
-        
-        result = analyze_tf_pair(pair_data)
+        signals = load_pair_signals(pair_data)
         
-        if result is None:
-            print(f"  ✗ Missing prediction data")
+        if signals is None:
+            print(f"✗ {tf_a} × {tf_b} ({cell_type}): Missing prediction data")
             continue
         
+        complete.append((pair_data, signals))
+    
+    if not complete:
+        return []
+    
+    signal_matrix = np.array([[signals[code] for code in ("00", "01", "10", "11")] for _, signals in complete])
+    normalized = normalize_signals(signal_matrix)
+    logic_scores, additivity, bliss_excess = analyze_batch(signal_matrix, IDEAL_MATRIX)
+    synergy_classes = classify_synergy(additivity)
+    
+    results = []
+    for i, (pair_data, signals) in enumerate(complete):
+        result = build_pair_result(
+            pair_data, signals, signal_matrix[i], normalized[i],
+            logic_scores[i], additivity[i], bliss_excess[i], synergy_classes[i],
+        )
         results.append(result)
         
+        print(f"Analyzing: {result['tf_a']} × {result['tf_b']} ({result['cell_type']})")
         print(f"  Expected: {result['expected_gate']:8s} | Best fit: {result['best_gate']:8s} (score={result['best_score']:.3f})")
         print(f"  Signals: 00={result['signals_raw']['00']:.3f}, 01={result['signals_raw']['01']:.3f}, "
               f"10={result['signals_raw']['10']:.3f}, 11={result['signals_raw']['11']:.3f}")
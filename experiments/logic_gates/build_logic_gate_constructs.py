@@ -13,12 +13,18 @@ Each pair: 4 conditions [00, 01, 10, 11] = 52 constructs total
 
 from __future__ import annotations
 
+import functools
 import json
+import mmap
+import os
 import re
-from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, field
 from pathlib import Path
 from typing import Dict, List, Optional
 
+import numpy as np
+
 ROOT = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking")
 EXPERIMENT_ROOT = ROOT / "experiments" / "logic_gates"
 CONSTRUCT_DIR = EXPERIMENT_ROOT / "sequences"
@@ -34,19 +40,38 @@ CONSTRUCT_LENGTH = 1_048_576
 PROMOTER_POS = 500_000
 TF_A_POS = 250_000
 TF_SPACING = 5_000  # Optimal spacing from your prior experiment
+FASTA_LINE_WIDTH = 80
+
+_DNA_TAG_RE = re.compile(rb"<DNA[^>]*>(.*?)</DNA>", re.DOTALL)
+_WHITESPACE = b" \t\r\n\x0b\x0c"
+_UPPER_TABLE = bytes.maketrans(b"abcdefghijklmnopqrstuvwxyz", b"ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+# Byte -> upper-case complement lookup (lowercase input is folded to upper case)
+_RC_TABLE = bytearray(_UPPER_TABLE)
+for _base, _comp in zip(b"ACGTacgt", b"TGCATGCA"):
+    _RC_TABLE[_base] = _comp
+_RC_LUT = np.frombuffer(bytes(_RC_TABLE), dtype=np.uint8)
 
 
 @dataclass
 class Module:
     name: str
-    sequence: str
+    sequence: bytes
     description: str = ""
+    length: int = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.length = len(self.sequence)
+
+    @functools.cached_property
+    def rc(self) -> bytes:
+        return reverse_complement(self.sequence)
 
-    def oriented(self, orientation: str) -> str:
+    def oriented(self, orientation: str) -> bytes:
         if orientation == "+":
             return self.sequence
         if orientation == "-":
-            return reverse_complement(self.sequence)
+            return self.rc
         raise ValueError(f"Unknown orientation '{orientation}'")
 
 
@@ -61,104 +86,127 @@ class LogicGateDefinition:
     biological_rationale: str
 
 
-def reverse_complement(seq: str) -> str:
-    table = str.maketrans("ACGT", "TGCA")
-    return seq.upper().translate(table)[::-1]
+def reverse_complement(seq: bytes) -> bytes:
+    arr = np.frombuffer(seq, dtype=np.uint8)
+    return _RC_LUT[arr[::-1]].tobytes()
 
 
-def load_fasta_sequence(path: Path) -> str:
+def load_fasta_sequence(path: Path) -> bytes:
     """Load sequence from FASTA file."""
-    text = path.read_text()
-    
-    # Try XML format first (like HS2)
-    match = re.search(r"<DNA[^>]*>(.*?)</DNA>", text, re.DOTALL)
-    if match:
-        return "".join(match.group(1).split()).upper()
-    
-    # Plain FASTA format
-    lines = [line.strip() for line in text.split('\n') if not line.startswith('>')]
-    return "".join(lines).upper()
+    if path.stat().st_size == 0:
+        return b""
+    
+    # Scan the mapped file directly so only the sequence itself is copied
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Try XML format first (like HS2)
+        match = _DNA_TAG_RE.search(mm)
+        if match:
+            return match.group(1).translate(_UPPER_TABLE, _WHITESPACE)
+        
+        # Plain FASTA format: skip the header line, then strip newlines in one pass
+        start = 0
+        if mm[:1] == b'>':
+            start = mm.find(b'\n') + 1
+            if start == 0:
+                return b""
+        if mm.find(b'\n>', max(start - 1, 0)) == -1:
+            return mm[start:].translate(_UPPER_TABLE, _WHITESPACE)
+        
+        # Multi-record FASTA: concatenate every record's sequence lines
+        lines = [line for line in mm[:].splitlines() if not line.startswith(b'>')]
+    return b"".join(lines).translate(_UPPER_TABLE, _WHITESPACE)
 
 
-def load_filler(path: Path) -> str:
-    return path.read_text().strip().upper()
+def load_filler(path: Path) -> bytes:
+    return path.read_bytes().translate(_UPPER_TABLE).strip()
 
 
 class SequenceBuilder:
     """Build synthetic regulatory constructs with precise feature tracking."""
     
-    def __init__(self, filler: str):
+    def __init__(self, filler: bytes, total_length: int, buf: Optional[bytearray] = None):
         self._filler = filler
+        self._filler_view = memoryview(self._filler)
         self._filler_idx = 0
-        self.parts: List[str] = []
+        self.total_length = total_length
+        # Every byte is overwritten before finish(), so a caller-owned buffer can be reused
+        if buf is not None and len(buf) != total_length:
+            raise ValueError(f"Buffer length {len(buf)} != construct length {total_length}")
+        self.buf = buf if buf is not None else bytearray(total_length)
         self.cursor = 0
         self.features: List[Dict] = []
 
-    def _take_filler(self, length: int) -> str:
-        if length <= 0:
-            return ""
-        chunks = []
-        remaining = length
-        while remaining > 0:
-            chunk_len = min(len(self._filler) - self._filler_idx, remaining)
-            chunks.append(self._filler[self._filler_idx:self._filler_idx + chunk_len])
-            self._filler_idx = (self._filler_idx + chunk_len) % len(self._filler)
-            remaining -= chunk_len
-        return "".join(chunks)
-
     def append_filler(self, length: int, label: Optional[str] = None) -> None:
         if length <= 0:
             return
-        seq = self._take_filler(length)
-        self._append(seq, label)
+        start = self._reserve(length)
+        # Copy straight from the filler into the buffer, wrapping around as needed
+        # (attributes bound to locals once; the index is stored back after the loop)
+        buf, view = self.buf, self._filler_view
+        n = len(view)
+        idx = self._filler_idx
+        pos, end = start, self.cursor
+        while pos < end:
+            chunk_len = min(n - idx, end - pos)
+            buf[pos:pos + chunk_len] = view[idx:idx + chunk_len]
+            idx = (idx + chunk_len) % n
+            pos += chunk_len
+        self._filler_idx = idx
+        self._record_feature(start, label)
 
     def append_module(self, module: Optional[Module], orientation: str, label: str) -> None:
         if module is None:
             # Empty site (for 0 input in truth table)
-            self._append("", label, {"module": "EMPTY", "orientation": "n/a"})
+            self._append(b"", label, {"module": "EMPTY", "orientation": "n/a"})
             return
         seq = module.oriented(orientation)
         meta = {"module": module.name, "orientation": orientation}
         self._append(seq, label, meta)
 
-    def _append(self, seq: str, label: Optional[str], metadata: Optional[Dict] = None) -> None:
-        if not seq:
-            if label:  # Track empty sites
-                feature = {"label": label, "start": self.cursor, "end": self.cursor}
-                if metadata:
-                    feature.update(metadata)
-                self.features.append(feature)
-            return
+    def _append(self, seq: bytes, label: Optional[str], metadata: Optional[Dict] = None) -> None:
+        start = self._reserve(len(seq))
+        self.buf[start:self.cursor] = seq
+        # Empty sites are tracked as zero-length features
+        self._record_feature(start, label, metadata)
+
+    def _reserve(self, length: int) -> int:
         start = self.cursor
-        self.parts.append(seq)
-        self.cursor += len(seq)
+        end = start + length
+        if end > self.total_length:
+            raise ValueError(f"Construct exceeds target ({end} > {self.total_length})")
+        self.cursor = end
+        return start
+
+    def _record_feature(self, start: int, label: Optional[str], metadata: Optional[Dict] = None) -> None:
         if label:
             feature = {"label": label, "start": start, "end": self.cursor}
             if metadata:
                 feature.update(metadata)
             self.features.append(feature)
 
-    def finish(self, total_length: int) -> str:
-        if self.cursor > total_length:
-            raise ValueError(f"Construct exceeds target ({self.cursor} > {total_length})")
-        self.append_filler(total_length - self.cursor, "downstream_filler")
-        return "".join(self.parts)
+    def finish(self) -> bytearray:
+        self.append_filler(self.total_length - self.cursor, "downstream_filler")
+        return self.buf
 
 
 def build_logic_gate_construct(
     tf_a: Optional[Module],
     tf_b: Optional[Module],
     promoter: Module,
-    filler: str,
+    filler: bytes,
     tf_spacing: int = TF_SPACING,
+    buf: Optional[bytearray] = None,
 ) -> Dict:
     """
     Build logic gate construct with two TF sites and a promoter.
     
     Layout:
     [Filler] - [TF_A or Empty] - [Spacing] - [TF_B or Empty] - [Spacing] - [Promoter] - [Filler]
+    
+    If buf is given the construct is written into it (and overwrites the
+    previous contents) instead of a freshly allocated buffer.
     """
-    builder = SequenceBuilder(filler)
+    builder = SequenceBuilder(filler, CONSTRUCT_LENGTH, buf=buf)
     
     # Upstream filler to TF_A position
     builder.append_filler(TF_A_POS, "upstream_filler")
@@ -167,14 +215,14 @@ def build_logic_gate_construct(
     builder.append_module(tf_a, "+", "TF_A_site")
     
     # Spacing between TFs
-    tf_a_len = len(tf_a.sequence) if tf_a else 0
+    tf_a_len = tf_a.length if tf_a else 0
     builder.append_filler(tf_spacing - tf_a_len, "tf_spacer")
     
     # TF B site (or empty)
     builder.append_module(tf_b, "+", "TF_B_site")
     
     # Spacing to promoter (position - current position)
-    tf_b_len = len(tf_b.sequence) if tf_b else 0
+    tf_b_len = tf_b.length if tf_b else 0
     current_pos = TF_A_POS + tf_a_len + tf_spacing + tf_b_len
     promoter_spacing = PROMOTER_POS - current_pos
     builder.append_filler(promoter_spacing, "promoter_spacer")
@@ -183,11 +231,54 @@ def build_logic_gate_construct(
     builder.append_module(promoter, "+", "promoter")
     
     # Finish with filler
-    sequence = builder.finish(CONSTRUCT_LENGTH)
+    sequence = builder.finish()
     
     return {"sequence": sequence, "features": builder.features}
 
 
+def write_fasta(path: Path, name: str, seq: bytes, width: int = FASTA_LINE_WIDTH) -> None:
+    """Write a FASTA file wrapped at `width` bases per line."""
+    arr = np.frombuffer(seq, dtype=np.uint8)
+    full = len(arr) - len(arr) % width
+    rows = arr[:full].reshape(-1, width)
+    newlines = np.full((rows.shape[0], 1), ord("\n"), dtype=np.uint8)
+    with open(path, 'wb') as f:
+        f.write(f">{name}\n".encode("ascii"))
+        f.write(np.hstack([rows, newlines]).tobytes())
+        if full < len(arr):
+            f.write(bytes(seq[full:]) + b"\n")
+
+
+def copy_fasta_with_header(src: Path, dst: Path, name: str) -> None:
+    """Write an existing FASTA's sequence lines to dst under a new header."""
+    data = src.read_bytes()
+    body = data[data.index(b"\n") + 1:]
+    dst.write_bytes(f">{name}\n".encode("ascii") + body)
+
+
+# Per-worker state, set once by _init_worker so tasks only carry names and paths
+_WORKER_STATE: Dict = {}
+
+
+def _init_worker(modules: Dict[str, Module], filler: bytes) -> None:
+    _WORKER_STATE["modules"] = modules
+    _WORKER_STATE["filler"] = filler
+    _WORKER_STATE["buf"] = bytearray(CONSTRUCT_LENGTH)
+
+
+def _build_one(args: tuple) -> tuple:
+    """Build one construct in a worker process and write its FASTA."""
+    tf_a_name, tf_b_name, promoter_name, fasta_path, construct_name = args
+    modules = _WORKER_STATE["modules"]
+    tf_a = modules[tf_a_name] if tf_a_name else None
+    tf_b = modules[tf_b_name] if tf_b_name else None
+    result = build_logic_gate_construct(
+        tf_a, tf_b, modules[promoter_name], _WORKER_STATE["filler"], buf=_WORKER_STATE["buf"]
+    )
+    write_fasta(Path(fasta_path), construct_name, result["sequence"])
+    return len(result["sequence"]), result["features"]
+
+
 def define_logic_gates() -> List[LogicGateDefinition]:
     """Define all logic gate experiments."""
     
@@ -362,11 +453,34 @@ def load_modules() -> Dict[str, Module]:
     return modules
 
 
-def generate_constructs(gates: List[LogicGateDefinition], modules: Dict[str, Module], filler: str):
+def filter_available_gates(gates: List[LogicGateDefinition], modules: Dict[str, Module]) -> List[LogicGateDefinition]:
+    """Drop gates that reference modules which were not loaded."""
+    available = []
+    missing = set()
+    for gate_def in gates:
+        absent = [name for name in (gate_def.tf_a, gate_def.tf_b, gate_def.promoter) if name not in modules]
+        if absent:
+            print(f"✗ Skipping {gate_def.gate_type} gate {gate_def.tf_a} × {gate_def.tf_b}: missing {', '.join(absent)}")
+            missing.update(absent)
+        else:
+            available.append(gate_def)
+    
+    if missing:
+        print(f"  Defined but missing modules (add FASTAs to build them): {sorted(missing)}")
+        print(f"  Available modules: {sorted(modules.keys())}")
+    return available
+
+
+def generate_constructs(gates: List[LogicGateDefinition], modules: Dict[str, Module], filler: bytes):
     """Generate all constructs for logic gate experiments."""
     
     CONSTRUCT_DIR.mkdir(parents=True, exist_ok=True)
     
+    # Conditions with the same inputs produce identical sequences (e.g. every 00
+    # baseline), so build each unique layout once and copy its FASTA body after
+    tasks: Dict[tuple, tuple] = {}
+    copies = []
+    
     manifest = []
     total_constructs = 0
     
@@ -375,40 +489,41 @@ def generate_constructs(gates: List[LogicGateDefinition], modules: Dict[str, Mod
         print(f"Building {gate_def.gate_type} gate: {gate_def.tf_a} × {gate_def.tf_b}")
         print(f"{'='*80}")
         
-        # Get modules
-        try:
-            tf_a_module = modules.get(gate_def.tf_a)
-            tf_b_module = modules.get(gate_def.tf_b)
-            promoter_module = modules[gate_def.promoter]
-        except KeyError as e:
-            print(f"✗ Missing module: {e}")
-            print(f"  Available modules: {sorted(modules.keys())}")
-            continue
+        # Get modules (gates with missing modules were filtered out up front)
+        tf_a_module = modules[gate_def.tf_a]
+        tf_b_module = modules[gate_def.tf_b]
+        promoter_module = modules[gate_def.promoter]
+        
+        # 4 truth table conditions; the sequence does not depend on cell type,
+        # so each condition's build key is resolved once per gate
+        conditions = [
+            (None, None, "00", "Neither TF present (baseline)"),
+            (None, tf_b_module, "01", f"Only {gate_def.tf_b}"),
+            (tf_a_module, None, "10", f"Only {gate_def.tf_a}"),
+            (tf_a_module, tf_b_module, "11", "Both TFs present"),
+        ]
+        keyed_conditions = [
+            (
+                (tf_a.name if tf_a else None, tf_b.name if tf_b else None, promoter_module.name, TF_SPACING),
+                tf_a, tf_b, binary_code, description,
+            )
+            for tf_a, tf_b, binary_code, description in conditions
+        ]
         
-        # Generate 4 truth table conditions for each cell type
+        # Fan each condition out to one construct per cell type
         for cell_type in gate_def.cell_types:
-            conditions = [
-                (None, None, "00", "Neither TF present (baseline)"),
-                (None, tf_b_module, "01", f"Only {gate_def.tf_b}"),
-                (tf_a_module, None, "10", f"Only {gate_def.tf_a}"),
-                (tf_a_module, tf_b_module, "11", "Both TFs present"),
-            ]
-            
-            for tf_a, tf_b, binary_code, description in conditions:
+            for key, tf_a, tf_b, binary_code, description in keyed_conditions:
                 construct_name = f"LogicGate_{gate_def.gate_type}_{gate_def.tf_a}_{gate_def.tf_b}_{binary_code}_{cell_type}"
                 
-                # Build construct
-                result = build_logic_gate_construct(tf_a, tf_b, promoter_module, filler)
-                
-                # Save FASTA
                 fasta_path = CONSTRUCT_DIR / f"{construct_name}.fasta"
-                with open(fasta_path, 'w') as f:
-                    f.write(f">{construct_name}\n")
-                    seq = result["sequence"]
-                    for i in range(0, len(seq), 80):
-                        f.write(seq[i:i+80] + "\n")
                 
-                # Add to manifest
+                if key in tasks:
+                    # Identical construct already queued: copy its sequence once built
+                    copies.append((key, fasta_path, construct_name))
+                else:
+                    tasks[key] = (*key[:3], str(fasta_path), construct_name)
+                
+                # Add to manifest (length and features are filled in once built)
                 manifest_entry = {
                     "construct": construct_name,
                     "gate_type": gate_def.gate_type,
@@ -423,17 +538,36 @@ def generate_constructs(gates: List[LogicGateDefinition], modules: Dict[str, Mod
                     "biological_rationale": gate_def.biological_rationale,
                     "description": description,
                     "fasta_path": str(fasta_path),
-                    "length": len(result["sequence"]),
-                    "features": result["features"],
+                    "length": None,
+                    "features": None,
                 }
-                manifest.append(manifest_entry)
+                manifest.append((key, manifest_entry))
                 total_constructs += 1
                 
                 print(f"  ✓ {binary_code}: {description:<40} → {fasta_path.name}")
     
-    # Save manifest
+    # Unique constructs are independent, so build them across processes
+    with ProcessPoolExecutor(
+        max_workers=min(os.cpu_count() or 1, len(tasks) or 1),
+        initializer=_init_worker,
+        initargs=(modules, filler),
+    ) as pool:
+        built = dict(zip(tasks, pool.map(_build_one, tasks.values())))
+    
+    for key, fasta_path, construct_name in copies:
+        copy_fasta_with_header(Path(tasks[key][3]), fasta_path, construct_name)
+    
+    # Stream the manifest one compact entry per line; it stays a valid JSON array
+    gate_counts: Dict[str, int] = {}
     with open(MANIFEST_PATH, 'w') as f:
-        json.dump(manifest, f, indent=2)
+        f.write("[\n")
+        for i, (key, entry) in enumerate(manifest):
+            entry["length"], entry["features"] = built[key]
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(entry, separators=(",", ":")))
+            gate_counts[entry["gate_type"]] = gate_counts.get(entry["gate_type"], 0) + 1
+        f.write("\n]\n")
     
     print(f"\n{'='*80}")
     print(f"✓ Generated {total_constructs} constructs")
@@ -441,12 +575,6 @@ def generate_constructs(gates: List[LogicGateDefinition], modules: Dict[str, Mod
     print(f"✓ FASTA files saved to: {CONSTRUCT_DIR}")
     print(f"{'='*80}")
     
-    # Summary statistics
-    gate_counts = {}
-    for entry in manifest:
-        gate_type = entry["gate_type"]
-        gate_counts[gate_type] = gate_counts.get(gate_type, 0) + 1
-    
     print("\nConstruct breakdown:")
     for gate_type, count in sorted(gate_counts.items()):
         print(f"  {gate_type:8s}: {count} constructs")
@@ -469,6 +597,9 @@ def main():
     gates = define_logic_gates()
     print(f"\n✓ Defined {len(gates)} logic gate experiments")
     
+    gates = filter_available_gates(gates, modules)
+    print(f"✓ {len(gates)} gates have all modules available")
+    
     # Generate constructs
     generate_constructs(gates, modules, filler)
     
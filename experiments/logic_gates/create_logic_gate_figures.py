@@ -17,10 +17,17 @@ from pathlib import Path
 from typing import Dict, List
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg", force=True)  # Figures are only saved, never shown
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib.gridspec import GridSpec
 
+try:
+    import orjson
+except ImportError:  # Optional: faster JSON, stdlib json is the fallback
+    orjson = None
+
 EXPERIMENT_ROOT = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking/experiments/logic_gates")
 ANALYSIS_PATH = EXPERIMENT_ROOT / "logic_gate_analysis.json"
 RESULTS_DIR = EXPERIMENT_ROOT / "results"
@@ -33,36 +40,53 @@ IDEAL_GATES = {
     "NOT": np.array([1, 0, 1, 0]),
     "XOR": np.array([0, 1, 1, 0]),
 }
+# Same patterns stacked once, one row per gate
+GATE_INDEX = {gate: i for i, gate in enumerate(IDEAL_GATES)}
+IDEAL_MATRIX = np.stack(list(IDEAL_GATES.values())).astype(np.float32)
+SORTED_GATES = sorted(IDEAL_GATES)
 
 sns.set_style("whitegrid")
-plt.rcParams['figure.dpi'] = 300
 
 
 def load_results() -> List[Dict]:
     """Load analysis results."""
+    if orjson is not None:
+        return orjson.loads(ANALYSIS_PATH.read_bytes())
     with open(ANALYSIS_PATH, 'r') as f:
         return json.load(f)
 
 
+def _fast_heatmap(ax: plt.Axes, arr: np.ndarray, cmap: str = "YlOrRd", vmin: float = 0, vmax: float = 1):
+    """Annotated heatmap drawn as one image, without seaborn's per-call setup."""
+    # Data layer rasterized; ticks and annotations stay vector in PDF/SVG exports
+    ax.imshow(arr, cmap=cmap, vmin=vmin, vmax=vmax, aspect="equal", rasterized=True)
+    ax.grid(False)
+    
+    # Dark text on light cells and vice versa (same luminance rule as seaborn)
+    rgb = plt.get_cmap(cmap)(np.clip((arr - vmin) / (vmax - vmin), 0, 1))[..., :3]
+    linear = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    luminance = linear @ np.array([0.2126, 0.7152, 0.0722])
+    for i in range(arr.shape[0]):
+        for j in range(arr.shape[1]):
+            ax.text(
+                j, i, f"{arr[i, j]:.2f}",
+                ha="center", va="center",
+                color="black" if luminance[i, j] > 0.408 else "white",
+            )
+    
+    ax.set_xticks(np.arange(arr.shape[1]))
+    ax.set_yticks(np.arange(arr.shape[0]))
+
+
 def plot_truth_table_heatmap(result: Dict, ax: plt.Axes):
     """Plot truth table as 2x2 heatmap."""
     signals = result["signals_normalized"]
     
     # Reshape to 2x2 (TF_B × TF_A)
-    truth_table = np.array(signals).reshape(2, 2)
+    truth_table = np.asarray(signals, dtype=np.float32).reshape(2, 2)
     
     # Plot heatmap
-    sns.heatmap(
-        truth_table,
-        annot=True,
-        fmt=".2f",
-        cmap="YlOrRd",
-        vmin=0,
-        vmax=1,
-        cbar=False,
-        ax=ax,
-        square=True,
-    )
+    _fast_heatmap(ax, truth_table)
     
     # Labels
     ax.set_xlabel(f"{result['tf_a']}", fontsize=10)
@@ -111,21 +135,48 @@ def plot_logic_scores_bar(result: Dict, ax: plt.Axes):
     ax.legend(handles=legend_elements, fontsize=8, loc="upper right")
 
 
-def create_individual_pair_figure(result: Dict):
-    """Create comprehensive figure for a single TF pair."""
+class FigurePool:
+    """One Figure per layout, handed back with cleared axes instead of being rebuilt."""
+    
+    def __init__(self):
+        self._figures: Dict[tuple, tuple] = {}
+    
+    def get(self, key: tuple, build) -> tuple:
+        if key in self._figures:
+            fig, axes = self._figures[key]
+            for ax in axes:
+                ax.clear()
+            fig.suptitle("")
+        else:
+            fig, axes = build()
+            self._figures[key] = (fig, axes)
+        return fig, axes
+    
+    def close_all(self) -> None:
+        for fig, _ in self._figures.values():
+            plt.close(fig)
+        self._figures.clear()
+
+
+def create_pair_figure() -> tuple:
+    """Create the figure and axes shared by all per-pair figures."""
     fig = plt.figure(figsize=(12, 5))
     gs = GridSpec(1, 3, figure=fig, wspace=0.3)
+    axes = [fig.add_subplot(gs[0, i]) for i in range(3)]
+    return fig, axes
+
+
+def create_individual_pair_figure(result: Dict, fig: plt.Figure, axes: List[plt.Axes]):
+    """Create comprehensive figure for a single TF pair on (cleared) shared axes."""
+    ax1, ax2, ax3 = axes
     
     # Truth table heatmap
-    ax1 = fig.add_subplot(gs[0, 0])
     plot_truth_table_heatmap(result, ax1)
     
     # Logic scores
-    ax2 = fig.add_subplot(gs[0, 1])
     plot_logic_scores_bar(result, ax2)
     
     # Ideal vs observed comparison
-    ax3 = fig.add_subplot(gs[0, 2])
     plot_ideal_vs_observed(result, ax3)
     
     # Overall title
@@ -138,16 +189,15 @@ def create_individual_pair_figure(result: Dict):
     # Save
     filename = f"logic_gate_{result['tf_a']}_{result['tf_b']}_{result['cell_type']}.png"
     fig.savefig(FIGURES_DIR / filename, dpi=300, bbox_inches="tight")
-    plt.close(fig)
     
     return filename
 
 
 def plot_ideal_vs_observed(result: Dict, ax: plt.Axes):
     """Plot ideal vs observed patterns."""
-    observed = np.array(result["signals_normalized"])
+    observed = np.asarray(result["signals_normalized"], dtype=np.float32)
     expected_gate = result["expected_gate"]
-    ideal = IDEAL_GATES[expected_gate]
+    ideal = IDEAL_MATRIX[GATE_INDEX[expected_gate]]
     
     x = np.arange(4)
     width = 0.35
@@ -174,14 +224,19 @@ def plot_ideal_vs_observed(result: Dict, ax: plt.Axes):
     )
 
 
-def create_all_truth_tables_grid(results: List[Dict]):
+def create_all_truth_tables_grid(results: List[Dict], pool: FigurePool):
     """Create grid of all truth table heatmaps."""
     n = len(results)
     ncols = 4
     nrows = (n + ncols - 1) // ncols
     
-    fig, axes = plt.subplots(nrows, ncols, figsize=(16, 4 * nrows))
-    axes = axes.flatten() if n > 1 else [axes]
+    def build():
+        fig, axes = plt.subplots(nrows, ncols, figsize=(16, 4 * nrows), squeeze=False)
+        return fig, list(axes.flatten())
+    
+    fig, axes = pool.get(("truth_table_grid", nrows, ncols), build)
+    for ax in axes:
+        ax.axis("on")
     
     for i, result in enumerate(results):
         plot_truth_table_heatmap(result, axes[i])
@@ -192,23 +247,44 @@ def create_all_truth_tables_grid(results: List[Dict]):
     
     fig.suptitle("Logic Gate Truth Tables - All TF Pairs", fontsize=16, fontweight="bold", y=0.995)
     fig.savefig(FIGURES_DIR / "all_truth_tables.png", dpi=300, bbox_inches="tight")
-    plt.close(fig)
     
     print(f"  ✓ all_truth_tables.png")
 
 
-def create_confusion_matrix(results: List[Dict]):
+def prepare_figure_data(results: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Extract every per-pair field the figures need into NumPy arrays, once.
+    
+    Gate codes ("expected", "predicted") index SORTED_GATES; the "scores"
+    matrix has one column per gate in IDEAL_GATES order.
+    """
+    sorted_index = {gate: i for i, gate in enumerate(SORTED_GATES)}
+    expected_gate = np.array([r["expected_gate"] for r in results])
+    scores = np.array(
+        [[r["logic_scores"][g] for g in IDEAL_GATES] for r in results], dtype=float
+    ).reshape(-1, len(IDEAL_GATES))
+    return {
+        "expected_gate": expected_gate,
+        "expected": np.array([sorted_index[g] for g in expected_gate], dtype=np.intp),
+        "predicted": np.array([sorted_index[r["best_gate"]] for r in results], dtype=np.intp),
+        "correct": np.array([r["correct_classification"] for r in results], dtype=bool),
+        "scores": scores,
+        "expected_score": scores[np.arange(len(results)), [GATE_INDEX[g] for g in expected_gate]],
+        "best_score": np.array([r["best_score"] for r in results], dtype=float),
+        "additivity": np.array([r["synergy_metrics"]["additivity_ratio"] for r in results], dtype=float),
+        "eom": np.array([r["synergy_metrics"]["excess_over_max"] for r in results], dtype=float),
+        "synergy_class": np.array([r["synergy_metrics"]["synergy_class"] for r in results]),
+        "pairs": np.array([f"{r['tf_a']}×{r['tf_b']}" for r in results]),
+    }
+
+
+def create_confusion_matrix(results: List[Dict], data: Dict[str, np.ndarray]):
     """Create confusion matrix of expected vs predicted gate types."""
-    expected = [r["expected_gate"] for r in results]
-    predicted = [r["best_gate"] for r in results]
+    gate_types = SORTED_GATES
     
-    gate_types = sorted(IDEAL_GATES.keys())
-    confusion = np.zeros((len(gate_types), len(gate_types)), dtype=int)
-    
-    for exp, pred in zip(expected, predicted):
-        i = gate_types.index(exp)
-        j = gate_types.index(pred)
-        confusion[i, j] += 1
+    # Count every (expected, predicted) pair in one bincount over flat cell indices
+    n = len(gate_types)
+    confusion = np.bincount(data["expected"] * n + data["predicted"], minlength=n * n).reshape(n, n)
     
     fig, ax = plt.subplots(figsize=(8, 6))
     
@@ -241,23 +317,22 @@ def create_confusion_matrix(results: List[Dict]):
     print(f"  ✓ confusion_matrix.png")
 
 
-def create_synergy_scatter(results: List[Dict]):
+def create_synergy_scatter(results: List[Dict], data: Dict[str, np.ndarray]):
     """Create scatter plot of synergy metrics."""
     fig, axes = plt.subplots(1, 2, figsize=(14, 5))
     
-    # Extract data
-    expected_gates = [r["expected_gate"] for r in results]
-    additivity = [r["synergy_metrics"]["additivity_ratio"] for r in results]
-    eom = [r["synergy_metrics"]["excess_over_max"] for r in results]
-    best_scores = [r["best_score"] for r in results]
+    additivity = data["additivity"]
+    eom = data["eom"]
+    best_scores = data["best_score"]
     
     # Color by expected gate
     gate_colors = {"AND": "#2ecc71", "OR": "#3498db", "NOT": "#e74c3c", "XOR": "#9b59b6"}
-    colors = [gate_colors[g] for g in expected_gates]
+    colors = [gate_colors[g] for g in data["expected_gate"]]
     
     # Plot 1: Additivity vs Logic Score
     ax1 = axes[0]
     scatter1 = ax1.scatter(additivity, best_scores, c=colors, s=100, alpha=0.7, edgecolors="black", linewidth=1)
+    scatter1.set_rasterized(True)
     ax1.axvline(1.0, color="gray", linestyle="--", alpha=0.5, label="Additive (1.0)")
     ax1.axhline(0.5, color="gray", linestyle="--", alpha=0.5)
     ax1.set_xlabel("Additivity Ratio", fontsize=12)
@@ -268,6 +343,7 @@ def create_synergy_scatter(results: List[Dict]):
     # Plot 2: Excess over Max vs Logic Score
     ax2 = axes[1]
     scatter2 = ax2.scatter(eom, best_scores, c=colors, s=100, alpha=0.7, edgecolors="black", linewidth=1)
+    scatter2.set_rasterized(True)
     ax2.axvline(0, color="gray", linestyle="--", alpha=0.5, label="No excess")
     ax2.axhline(0.5, color="gray", linestyle="--", alpha=0.5)
     ax2.set_xlabel("Excess Over Maximum", fontsize=12)
@@ -289,10 +365,10 @@ def create_synergy_scatter(results: List[Dict]):
     print(f"  ✓ synergy_analysis.png")
 
 
-def create_logic_scores_comparison(results: List[Dict]):
+def create_logic_scores_comparison(results: List[Dict], data: Dict[str, np.ndarray]):
     """Create grouped bar chart comparing logic scores across all pairs."""
     # Organize data
-    pairs = [f"{r['tf_a']}×{r['tf_b']}" for r in results]
+    pairs = data["pairs"]
     gate_types = list(IDEAL_GATES.keys())
     
     fig, ax = plt.subplots(figsize=(16, 6))
@@ -300,16 +376,18 @@ def create_logic_scores_comparison(results: List[Dict]):
     x = np.arange(len(pairs))
     width = 0.2
     
+    # (N, G) score matrix, columns in IDEAL_GATES order
+    scores_mat = data["scores"]
+    expected_arr = data["expected_gate"]
+    
     for i, gate in enumerate(gate_types):
-        scores = [r["logic_scores"][gate] for r in results]
         offset = (i - 1.5) * width
-        bars = ax.bar(x + offset, scores, width, label=gate, alpha=0.8)
+        bars = ax.bar(x + offset, scores_mat[:, i], width, label=gate, alpha=0.8)
         
         # Highlight expected gates
-        for j, (score, result) in enumerate(zip(scores, results)):
-            if result["expected_gate"] == gate:
-                bars[j].set_edgecolor("red")
-                bars[j].set_linewidth(2)
+        for j in np.flatnonzero(expected_arr == gate):
+            bars[j].set_edgecolor("red")
+            bars[j].set_linewidth(2)
     
     ax.set_ylabel("Logic Score (R²)", fontsize=12)
     ax.set_xlabel("TF Pair", fontsize=12)
@@ -328,22 +406,24 @@ def create_logic_scores_comparison(results: List[Dict]):
     print(f"  ✓ logic_scores_comparison.png")
 
 
-def create_summary_dashboard(results: List[Dict]):
+def create_summary_dashboard(results: List[Dict], data: Dict[str, np.ndarray]):
     """Create comprehensive summary dashboard."""
     fig = plt.figure(figsize=(18, 10))
     gs = GridSpec(2, 3, figure=fig, hspace=0.3, wspace=0.3)
     
     # 1. Classification accuracy by gate type
     ax1 = fig.add_subplot(gs[0, 0])
-    gate_types = sorted(IDEAL_GATES.keys())
-    accuracies = []
-    for gate in gate_types:
-        gate_results = [r for r in results if r["expected_gate"] == gate]
-        if gate_results:
-            acc = sum(1 for r in gate_results if r["correct_classification"]) / len(gate_results)
-            accuracies.append(acc * 100)
-        else:
-            accuracies.append(0)
+    gate_types = SORTED_GATES
+    expected = data["expected"]
+    
+    # Per-gate counts, correct counts and expected-gate score sums in one pass each
+    n = len(gate_types)
+    counts = np.bincount(expected, minlength=n)
+    correct_counts = np.bincount(expected, weights=data["correct"], minlength=n)
+    score_sums = np.bincount(expected, weights=data["expected_score"], minlength=n)
+    safe_counts = np.maximum(counts, 1)
+    accuracies = np.where(counts > 0, correct_counts / safe_counts * 100, 0)
+    mean_scores = np.where(counts > 0, score_sums / safe_counts, 0)
     
     bars = ax1.bar(gate_types, accuracies, color=["#2ecc71", "#3498db", "#e74c3c", "#9b59b6"], alpha=0.7)
     ax1.axhline(50, color="gray", linestyle="--", alpha=0.5, label="Random (50%)")
@@ -354,11 +434,6 @@ def create_summary_dashboard(results: List[Dict]):
     
     # 2. Mean logic scores by gate type
     ax2 = fig.add_subplot(gs[0, 1])
-    mean_scores = []
-    for gate in gate_types:
-        scores = [r["logic_scores"][gate] for r in results if r["expected_gate"] == gate]
-        mean_scores.append(np.mean(scores) if scores else 0)
-    
     ax2.bar(gate_types, mean_scores, color=["#2ecc71", "#3498db", "#e74c3c", "#9b59b6"], alpha=0.7)
     ax2.axhline(0.5, color="gray", linestyle="--", alpha=0.5)
     ax2.set_ylabel("Mean Logic Score (R²)", fontsize=11)
@@ -368,8 +443,7 @@ def create_summary_dashboard(results: List[Dict]):
     # 3. Synergy distribution
     ax3 = fig.add_subplot(gs[0, 2])
     synergy_classes = ["synergy", "additive", "interference"]
-    synergy_counts = [sum(1 for r in results if r["synergy_metrics"]["synergy_class"] == sc) 
-                     for sc in synergy_classes]
+    synergy_counts = [int(np.count_nonzero(data["synergy_class"] == sc)) for sc in synergy_classes]
     colors_syn = ["#2ecc71", "#f39c12", "#e74c3c"]
     ax3.pie(synergy_counts, labels=synergy_classes, autopct="%1.1f%%", 
            colors=colors_syn, startangle=90)
@@ -379,9 +453,9 @@ def create_summary_dashboard(results: List[Dict]):
     example_gates = ["AND", "OR", "XOR"]
     for i, gate in enumerate(example_gates):
         ax = fig.add_subplot(gs[1, i])
-        gate_results = [r for r in results if r["expected_gate"] == gate]
-        if gate_results:
-            best_result = max(gate_results, key=lambda r: r["best_score"])
+        gate_idx = np.flatnonzero(data["expected_gate"] == gate)
+        if gate_idx.size:
+            best_result = results[gate_idx[np.argmax(data["best_score"][gate_idx])]]
             plot_truth_table_heatmap(best_result, ax)
         else:
             ax.text(0.5, 0.5, f"No {gate} examples", ha="center", va="center")
@@ -406,29 +480,36 @@ def main():
     results = load_results()
     print(f"\n✓ Loaded {len(results)} TF pair results\n")
     
+    # Shared per-pair arrays for the overview figures
+    data = prepare_figure_data(results)
+    
     print("Generating figures...")
     
     # 1. Individual pair figures
     print("\n1. Individual TF pair figures:")
+    pool = FigurePool()
     for result in results:
-        filename = create_individual_pair_figure(result)
+        fig, axes = pool.get(("pair",), create_pair_figure)
+        filename = create_individual_pair_figure(result, fig, axes)
         print(f"  ✓ {filename}")
     
     # 2. Grid of all truth tables
     print("\n2. Overview figures:")
-    create_all_truth_tables_grid(results)
+    create_all_truth_tables_grid(results, pool)
     
     # 3. Confusion matrix
-    create_confusion_matrix(results)
+    create_confusion_matrix(results, data)
     
     # 4. Synergy analysis
-    create_synergy_scatter(results)
+    create_synergy_scatter(results, data)
     
     # 5. Logic scores comparison
-    create_logic_scores_comparison(results)
+    create_logic_scores_comparison(results, data)
     
     # 6. Summary dashboard
-    create_summary_dashboard(results)
+    create_summary_dashboard(results, data)
+    
+    pool.close_all()
     
     print(f"\n{'='*80}")
     print(f"✓ All figures saved to: {FIGURES_DIR}")
@@ -5,21 +5,35 @@ Run AlphaGenome predictions on all logic gate constructs using the Python API.
 
 from __future__ import annotations
 
+import functools
+import hashlib
 import json
 import os
+import shutil
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import numpy as np
 from dotenv import load_dotenv
 
+# Helpers shared across experiments live one level up, in experiments/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rate_limit import TokenBucket
+from track_median import fast_median
+
+try:
+    import orjson
+except ImportError:  # Optional: faster JSON, stdlib json is the fallback
+    orjson = None
+
 try:
     from alphagenome.models import dna_client
 except ImportError:
     print("AlphaGenome package not available. Activate alphagenome-env before running.")
-    import sys
     sys.exit(1)
 
 # Load environment variables
@@ -31,6 +45,15 @@ MANIFEST_PATH = EXPERIMENT_ROOT / "logic_gate_manifest.json"
 OUTPUT_DIR = EXPERIMENT_ROOT / "alphagenome_outputs"
 LOGS_DIR = EXPERIMENT_ROOT / "logs"
 RESULTS_PATH = EXPERIMENT_ROOT / "prediction_results.json"
+# One JSON line per finished prediction, appended as it completes (survives a crashed run)
+RESULTS_LOG_PATH = EXPERIMENT_ROOT / "prediction_results.jsonl"
+# Predictions keyed by SHA256 of the sequence, shared by constructs with identical sequences
+PRED_CACHE_DIR = EXPERIMENT_ROOT / "pred_cache"
+MAX_WORKERS = 4  # Concurrent in-flight API requests
+API_QPS = 2.0  # Sustained API requests per second (the old 0.5 s pause); bursts up to MAX_WORKERS
+
+# Shared by the worker threads; every API call takes a token
+_LIMITER = TokenBucket(API_QPS, capacity=MAX_WORKERS)
 
 # Cell type mapping (EFO IDs)
 CELL_TYPES = {
@@ -51,31 +74,78 @@ if not API_KEY:
     raise ValueError("API key not configured")
 
 
+@functools.lru_cache(maxsize=None)
+def get_client(api_key: str):
+    # dna_client.create opens one gRPC channel (HTTP/2, multiplexed); every
+    # worker thread shares it so the TLS handshake happens once per run
+    return dna_client.create(api_key)
+
+
+def load_json(path: Path):
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def dump_json(path: Path, obj, indent: bool = True) -> None:
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indent else 0)
+        path.write_bytes(orjson.dumps(obj, option=option))
+        return
+    with open(path, 'w') as f:
+        json.dump(obj, f, indent=2 if indent else None)
+
+
+def json_line(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+    return (json.dumps(obj) + "\n").encode()
+
+
 def load_manifest() -> List[Dict]:
     """Load construct manifest."""
-    with open(MANIFEST_PATH, 'r') as f:
-        return json.load(f)
+    return load_json(MANIFEST_PATH)
 
 
+@functools.lru_cache(maxsize=None)
 def load_fasta(path: Path) -> str:
     """Load sequence from FASTA file."""
-    with open(path, 'r') as f:
-        lines = [line.strip() for line in f if not line.startswith('>')]
-    return "".join(lines).upper()
+    data = path.read_bytes()
+    lines = [line.strip() for line in data.splitlines() if not line.startswith(b'>')]
+    return b"".join(lines).upper().decode("ascii")
+
+
+def track_stats(values: np.ndarray) -> Dict[str, float]:
+    """max/mean/std/median of a track, reusing the mean for the std."""
+    mean = values.mean()
+    dev = values - mean
+    dev *= dev
+    return {
+        "max": float(values.max()),
+        "mean": float(mean),
+        "std": float(np.sqrt(dev.mean())),
+        "median": fast_median(values),
+    }
 
 
 def run_prediction(
     sequence: str,
     construct_name: str,
     cell_type: str,
-    client
+    client,
+    cell_type_id: Optional[str] = None,
+    verbose: bool = True,
 ) -> Dict:
     """Run AlphaGenome prediction for a single construct."""
-    print(f"  Predicting {construct_name} in {cell_type} (length: {len(sequence)} bp)...")
+    if verbose:
+        print(f"  Predicting {construct_name} in {cell_type} (length: {len(sequence)} bp)...")
     
     try:
         # Call AlphaGenome API
-        cell_type_id = CELL_TYPES[cell_type]
+        if cell_type_id is None:
+            cell_type_id = CELL_TYPES[cell_type]
+        _LIMITER.acquire()
         result = client.predict_sequence(
             sequence=sequence,
             requested_outputs=[dna_client.OutputType.DNASE],
@@ -92,14 +162,9 @@ def run_prediction(
         mean_predictions = np.mean(dnase_predictions, axis=1) if len(dnase_predictions.shape) > 1 else dnase_predictions
         
         # Basic stats
-        stats = {
-            "max": float(np.max(cell_predictions)),
-            "mean": float(np.mean(cell_predictions)),
-            "std": float(np.std(cell_predictions)),
-            "median": float(np.median(cell_predictions)),
-            "global_max": float(np.max(mean_predictions)),
-            "global_mean": float(np.mean(mean_predictions)),
-        }
+        stats = track_stats(cell_predictions)
+        stats["global_max"] = float(mean_predictions.max())
+        stats["global_mean"] = float(mean_predictions.mean())
         
         return {
             "success": True,
@@ -119,55 +184,175 @@ def run_prediction(
         }
 
 
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Hard-link src to dst (same filesystem), falling back to a copy."""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
 def save_predictions(
     construct_name: str,
     cell_type: str,
-    predictions: np.ndarray,
-    mean_predictions: np.ndarray,
+    archive: Path,
     stats: Dict
 ) -> None:
-    """Save predictions to disk."""
+    """
+    Save predictions to disk: the cached archive (cell-type track and mean
+    across all cell types) under the construct's name, plus stats.
+    """
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
     # Filename with cell type
     base_name = f"{construct_name}_{cell_type}"
     
-    # Save numpy array
-    npy_path = OUTPUT_DIR / f"{base_name}_dnase.npy"
-    np.save(npy_path, predictions)
+    # Constructs with identical sequences share the cached archive's bytes
+    link_or_copy(archive, OUTPUT_DIR / f"{base_name}_dnase.npz")
     
-    # Save mean across all cell types
-    npy_mean_path = OUTPUT_DIR / f"{base_name}_dnase_mean.npy"
-    np.save(npy_mean_path, mean_predictions)
+    # Save stats (read back by analyze_logic_gates.py)
+    stats_path = OUTPUT_DIR / f"{base_name}_stats.txt"
+    lines = [
+        "# AlphaGenome prediction statistics",
+        f"# Construct: {construct_name}",
+        f"# Cell type: {cell_type}",
+        "#",
+    ]
+    lines.extend(f"{key}: {value}" for key, value in stats.items())
+    stats_path.write_text("\n".join(lines) + "\n")
+
+
+def dump_inspection_txt(construct_name: str, cell_type: str, n_values: int = 100) -> Optional[Path]:
+    """Write the human-readable preview of a saved track (on demand, not during runs)."""
+    base_name = f"{construct_name}_{cell_type}"
+    npz_path = OUTPUT_DIR / f"{base_name}_dnase.npz"
+    if npz_path.exists():
+        with np.load(npz_path) as archive:
+            predictions = archive["predictions"]
+    elif (OUTPUT_DIR / f"{base_name}_dnase.npy").exists():
+        predictions = np.load(OUTPUT_DIR / f"{base_name}_dnase.npy")
+    else:
+        return None
     
-    # Save text format (first 100 values for inspection)
     txt_path = OUTPUT_DIR / f"{base_name}_dnase.txt"
-    with open(txt_path, 'w') as f:
-        f.write(f"# DNase predictions for {construct_name} in {cell_type}\n")
-        f.write(f"# Total bins: {len(predictions)}\n")
-        f.write(f"# First 100 values:\n")
-        for i, val in enumerate(predictions[:100]):
-            f.write(f"{i}\t{val:.6f}\n")
+    head = predictions[:n_values]
+    np.savetxt(
+        txt_path,
+        np.column_stack([np.arange(len(head)), head]),
+        fmt="%d\t%.6f",
+        header=f"DNase predictions for {construct_name} in {cell_type}\n"
+               f"Total bins: {len(predictions)}\n"
+               f"First {n_values} values:",
+    )
+    return txt_path
+
+
+def sequence_digest(sequence: str) -> str:
+    return hashlib.sha256(sequence.encode("ascii")).hexdigest()
+
+
+def load_cached_prediction(digest: str, cell_type: str) -> Optional[Dict]:
+    """Return the cached archive path and stats for this sequence and cell type, if any."""
+    prefix = f"{digest}_{cell_type}"
+    stats_path = PRED_CACHE_DIR / f"{prefix}_stats.json"
+    if not stats_path.exists():
+        return None
+    return {
+        "archive": PRED_CACHE_DIR / f"{prefix}_dnase.npz",
+        "stats": load_json(stats_path),
+    }
+
+
+def cache_prediction(digest: str, cell_type: str, result: Dict) -> Path:
+    """Write the archive once into the cache; outputs are links to it."""
+    PRED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    prefix = f"{digest}_{cell_type}"
+    archive = PRED_CACHE_DIR / f"{prefix}_dnase.npz"
+    np.savez(
+        archive,
+        predictions=result["predictions"],
+        mean_predictions=result["mean_predictions"],
+    )
+    # Stats last: their presence marks the cache entry as complete
+    dump_json(PRED_CACHE_DIR / f"{prefix}_stats.json", result["stats"], indent=False)
+    return archive
+
+
+def record_prediction(
+    entry: Dict,
+    result: Dict,
+    elapsed: float,
+    verbose: bool = True,
+) -> Dict:
+    """Save a finished prediction for one manifest entry and build its summary."""
+    construct_name = entry["construct"]
+    cell_type = entry["cell_type"]
     
-    # Save stats
-    stats_path = OUTPUT_DIR / f"{base_name}_stats.txt"
-    with open(stats_path, 'w') as f:
-        f.write(f"# AlphaGenome prediction statistics\n")
-        f.write(f"# Construct: {construct_name}\n")
-        f.write(f"# Cell type: {cell_type}\n")
-        f.write(f"#\n")
-        for key, value in stats.items():
-            f.write(f"{key}: {value}\n")
+    if result["success"]:
+        save_predictions(
+            construct_name,
+            cell_type,
+            result["archive"],
+            result["stats"]
+        )
+        
+        if verbose:
+            print(
+                f"  ✓ {construct_name} ({elapsed:.1f}s)\n"
+                f"    Stats: max={result['stats']['max']:.3f}, mean={result['stats']['mean']:.6f}"
+            )
+        
+        return {
+            "construct": construct_name,
+            "cell_type": cell_type,
+            "success": True,
+            "stats": result["stats"],
+            "elapsed_seconds": elapsed,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    print(f"  ✗ {construct_name} failed: {result.get('error', 'Unknown error')}")
+    return {
+        "construct": construct_name,
+        "cell_type": cell_type,
+        "success": False,
+        "error": result.get('error', 'Unknown error'),
+        "elapsed_seconds": elapsed,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def timed_prediction(
+    sequence: str,
+    construct_name: str,
+    cell_type: str,
+    client,
+    cell_type_id: Optional[str],
+    verbose: bool,
+) -> tuple:
+    pred_start = time.time()
+    result = run_prediction(sequence, construct_name, cell_type, client, cell_type_id, verbose)
+    return result, time.time() - pred_start
 
 
-def run_all_predictions(manifest: List[Dict], client):
+def run_all_predictions(manifest: List[Dict], client, verbose: bool = True):
     """Run predictions for all constructs in manifest."""
     
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
     
     total = len(manifest)
-    results = []
+    # Summaries are stored by manifest position so the results file keeps manifest order
+    results: List[Optional[Dict]] = [None] * total
+    # (digest, cell_type) -> (sequence, [manifest indices]); identical sequences share one API call
+    pending: Dict[tuple, tuple] = {}
+    # Each ontology ID is looked up once, not per construct
+    cell_type_ids = {cell_type: CELL_TYPES.get(cell_type) for cell_type in {e["cell_type"] for e in manifest}}
+    # Per-construct progress lines are collected and printed in one write (or dropped with verbose=False)
+    progress: List[str] = []
+    note = progress.append if verbose else (lambda line: None)
     
     print(f"\n{'='*80}")
     print(f"Running predictions for {total} constructs")
@@ -175,18 +360,22 @@ def run_all_predictions(manifest: List[Dict], client):
     
     start_time = datetime.now()
     
-    for i, entry in enumerate(manifest, 1):
+    # One directory listing instead of a stat per construct for the skip check
+    existing = set(os.listdir(OUTPUT_DIR))
+    
+    for i, entry in enumerate(manifest):
         construct_name = entry["construct"]
         fasta_path = Path(entry["fasta_path"])
         cell_type = entry["cell_type"]
         
-        print(f"[{i}/{total}] {construct_name}")
-        print(f"  Gate: {entry['gate_type']}, Condition: {entry['binary_code']}")
+        note(f"[{i + 1}/{total}] {construct_name}")
+        note(f"  Gate: {entry['gate_type']}, Condition: {entry['binary_code']}")
         
         # Check if already exists
-        output_npy = OUTPUT_DIR / f"{construct_name}_{cell_type}_dnase.npy"
-        if output_npy.exists():
-            print(f"  ⏭  Already exists, skipping")
+        # (.npy is the per-track layout written by earlier runs)
+        output_base = f"{construct_name}_{cell_type}_dnase"
+        if f"{output_base}.npz" in existing or f"{output_base}.npy" in existing:
+            note(f"  ⏭  Already exists, skipping")
             # Load existing stats for summary
             try:
                 stats_path = OUTPUT_DIR / f"{construct_name}_{cell_type}_stats.txt"
@@ -196,78 +385,90 @@ def run_all_predictions(manifest: List[Dict], client):
                         if ':' in line and not line.startswith('#'):
                             key, val = line.strip().split(':', 1)
                             stats[key.strip()] = float(val.strip())
-                results.append({
+                results[i] = {
                     "construct": construct_name,
                     "cell_type": cell_type,
                     "success": True,
                     "skipped": True,
                     "stats": stats
-                })
+                }
             except:
-                results.append({
+                results[i] = {
                     "construct": construct_name,
                     "cell_type": cell_type,
                     "success": True,
                     "skipped": True
-                })
+                }
             continue
         
         # Load sequence
         try:
             sequence = load_fasta(fasta_path)
         except Exception as e:
-            print(f"  ❌ Error loading FASTA: {e}")
-            results.append({
+            # Errors are shown even when progress is silenced
+            (note if verbose else print)(f"  ❌ Error loading FASTA {fasta_path}: {e}")
+            results[i] = {
                 "construct": construct_name,
                 "cell_type": cell_type,
                 "success": False,
                 "error": f"FASTA load error: {str(e)}"
-            })
+            }
             continue
         
-        # Run prediction
-        pred_start = time.time()
-        result = run_prediction(sequence, construct_name, cell_type, client)
-        elapsed = time.time() - pred_start
-        
-        if result["success"]:
-            # Save predictions
+        # Reuse the prediction of an identical sequence (e.g. shared baselines)
+        digest = sequence_digest(sequence)
+        cached = load_cached_prediction(digest, cell_type)
+        if cached is not None:
             save_predictions(
                 construct_name,
                 cell_type,
-                result["predictions"],
-                result["mean_predictions"],
-                result["stats"]
+                cached["archive"],
+                cached["stats"]
             )
-            
-            print(f"  ✓ Success ({elapsed:.1f}s)")
-            print(f"    Stats: max={result['stats']['max']:.3f}, mean={result['stats']['mean']:.6f}")
-            
-            results.append({
+            note(f"  ♻  Identical sequence already predicted, reused cached output")
+            results[i] = {
                 "construct": construct_name,
                 "cell_type": cell_type,
                 "success": True,
-                "stats": result["stats"],
-                "elapsed_seconds": elapsed,
-                "timestamp": datetime.now().isoformat()
-            })
+                "cached": True,
+                "stats": cached["stats"]
+            }
+            continue
+        
+        key = (digest, cell_type)
+        if key in pending:
+            note(f"  ♻  Identical sequence queued, will reuse its prediction")
+            pending[key][1].append(i)
         else:
-            print(f"  ✗ Failed: {result.get('error', 'Unknown error')}")
-            results.append({
-                "construct": construct_name,
-                "cell_type": cell_type,
-                "success": False,
-                "error": result.get('error', 'Unknown error'),
-                "elapsed_seconds": elapsed,
-                "timestamp": datetime.now().isoformat()
-            })
+            pending[key] = (sequence, [i])
+    
+    if progress:
+        print("\n".join(progress))
+    
+    # Network-bound: keep a bounded number of requests in flight
+    print(f"\nSubmitting {len(pending)} unique predictions ({MAX_WORKERS} concurrent)...")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, open(RESULTS_LOG_PATH, 'ab') as results_log:
+        futures = {}
+        for (digest, cell_type), (sequence, indices) in pending.items():
+            first = manifest[indices[0]]
+            future = executor.submit(
+                timed_prediction, sequence, first["construct"], cell_type, client, cell_type_ids[cell_type], verbose
+            )
+            futures[future] = (digest, cell_type, indices)
         
-        # Brief pause to avoid overwhelming API
-        time.sleep(0.5)
+        # Results are saved from this thread only, so disk writes need no locking
+        for future in as_completed(futures):
+            digest, cell_type, indices = futures[future]
+            result, elapsed = future.result()
+            if result["success"]:
+                result["archive"] = cache_prediction(digest, cell_type, result)
+            for i in indices:
+                results[i] = record_prediction(manifest[i], result, elapsed, verbose)
+                results_log.write(json_line(results[i]))
+            results_log.flush()
     
     # Save results summary
-    with open(RESULTS_PATH, 'w') as f:
-        json.dump(results, f, indent=2)
+    dump_json(RESULTS_PATH, results)
     
     # Summary
     print(f"\n{'='*80}")
@@ -281,6 +482,7 @@ def run_all_predictions(manifest: List[Dict], client):
     total_time = (datetime.now() - start_time).total_seconds()
     print(f"⏱  Total time: {total_time/60:.1f} minutes")
     print(f"✓ Results saved to: {RESULTS_PATH}")
+    print(f"✓ Per-prediction log: {RESULTS_LOG_PATH}")
     print(f"{'='*80}\n")
 
 
@@ -289,6 +491,8 @@ def main():
     
     parser = argparse.ArgumentParser(description="Run AlphaGenome predictions on logic gate constructs")
     parser.add_argument("--limit", type=int, help="Limit to first N constructs (for testing)")
+    parser.add_argument("--quiet", action="store_true", help="Only print summaries, not per-construct progress")
+    parser.add_argument("--dump-txt", action="store_true", help="Write text previews of saved predictions and exit")
     args = parser.parse_args()
     
     print("=" * 80)
@@ -303,12 +507,17 @@ def main():
         manifest = manifest[:args.limit]
         print(f"  → Limited to first {args.limit} constructs")
     
+    if args.dump_txt:
+        written = [dump_inspection_txt(entry["construct"], entry["cell_type"]) for entry in manifest]
+        print(f"\n✓ Wrote {sum(path is not None for path in written)} text previews to {OUTPUT_DIR}")
+        return
+    
     # Initialize AlphaGenome client
     print(f"\n✓ Initializing AlphaGenome client...")
-    client = dna_client.create(API_KEY)
+    client = get_client(API_KEY)
     
     # Run predictions
-    run_all_predictions(manifest, client)
+    run_all_predictions(manifest, client, verbose=not args.quiet)
     
     print("\n🎉 Done! Next step:")
     print("   python analyze_logic_gates.py")
@@ -7,20 +7,30 @@ Reads manifest, submits predictions, and organizes outputs.
 
 from __future__ import annotations
 
+import functools
+import hashlib
 import json
 import os
+import shutil
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 import numpy as np
 from dotenv import load_dotenv
 
+# Helpers shared across experiments live one level up, in experiments/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rate_limit import TokenBucket
+from track_median import fast_median
+
 try:
     from alphagenome.models import dna_client
 except ImportError:
     print("AlphaGenome package not available. Activate alphagenome-env before running.")
-    import sys
     sys.exit(1)
 
 # Load environment variables
@@ -32,6 +42,17 @@ MANIFEST_PATH = EXPERIMENT_ROOT / "logic_gate_manifest.json"
 OUTPUT_DIR = EXPERIMENT_ROOT / "alphagenome_outputs"
 LOGS_DIR = EXPERIMENT_ROOT / "logs"
 RESULTS_PATH = EXPERIMENT_ROOT / "prediction_results.json"
+MAX_WORKERS = 4  # Concurrent in-flight predictions
+API_QPS = 1.0  # Sustained API requests per second (the old 1 s pause); bursts up to MAX_WORKERS
+# Tracks keyed by sequence hash, cell type and track, shared across constructs and runs
+CACHE_DIR = OUTPUT_DIR / "cache"
+
+_TRACKS: Dict[str, np.ndarray] = {}
+_TRACKS_LOCK = threading.Lock()
+# One lock per cache key, so threads predicting the same sequence wait for the first
+_KEY_LOCKS: Dict[str, threading.Lock] = {}
+# Shared by the worker threads; only cache misses (actual API calls) take a token
+_LIMITER = TokenBucket(API_QPS, capacity=MAX_WORKERS)
 
 # Cell type mapping (EFO IDs)
 CELL_TYPES = {
@@ -58,83 +79,126 @@ def load_manifest() -> List[Dict]:
         return json.load(f)
 
 
+@functools.lru_cache(maxsize=None)
+def get_client(api_key: str):
+    # One in-process client (and gRPC channel) shared by every prediction
+    return dna_client.create(api_key)
+
+
+def load_fasta(path: Path) -> str:
+    """Load sequence from FASTA file."""
+    data = path.read_bytes()
+    lines = [line.strip() for line in data.splitlines() if not line.startswith(b'>')]
+    return b"".join(lines).upper().decode("ascii")
+
+
+def predict_track(sequence: str, cell_type: str, track: str = "dnase") -> tuple:
+    """
+    Return (predictions, cache_path) for a sequence, predicting only on a miss.
+    
+    Hits come from this run's memory first, then from CACHE_DIR on disk.
+    Concurrent calls for the same key are serialized, so a shared sequence
+    is predicted once and the others reuse its track.
+    """
+    key = f"{hashlib.sha256(sequence.encode('ascii')).hexdigest()}_{cell_type}_{track}"
+    cache_path = CACHE_DIR / f"{key}.npy"
+    
+    with _TRACKS_LOCK:
+        key_lock = _KEY_LOCKS.setdefault(key, threading.Lock())
+    
+    with key_lock:
+        with _TRACKS_LOCK:
+            cached = _TRACKS.get(key)
+        if cached is not None:
+            return cached, cache_path
+        
+        if cache_path.exists():
+            predictions = np.load(cache_path, mmap_mode="r")
+        else:
+            _LIMITER.acquire()
+            result = get_client(API_KEY).predict_sequence(
+                sequence=sequence,
+                requested_outputs=[dna_client.OutputType.DNASE],
+                ontology_terms=[CELL_TYPES[cell_type]]
+            )
+            values = result.dnase.values
+            predictions = values[:, 0] if values.ndim > 1 else values
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # Written under a temporary name and renamed into place, so a reader
+            # that sees cache_path never maps a half-written file
+            tmp_path = cache_path.with_name(f"{key}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                np.save(f, predictions)
+            os.replace(tmp_path, cache_path)
+        
+        with _TRACKS_LOCK:
+            _TRACKS[key] = predictions
+    return predictions, cache_path
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Hard-link src to dst (same filesystem), falling back to a copy."""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
 def run_alphagenome_prediction(
     fasta_path: Path,
     cell_type: str,
     output_prefix: str,
     track: str = "dnase"
 ) -> Dict:
-    """
-    Run AlphaGenome prediction on a single construct.
-    
-    NOTE: Adjust this function based on your AlphaGenome API!
-    This is a template - you'll need to modify for your specific setup.
-    """
-    
-    # Example command structure (MODIFY FOR YOUR SETUP):
-    # python predict.py --fasta input.fa --cell-type K562 --track dnase --output out.npy
-    
+    """Run AlphaGenome prediction on a single construct with the shared client."""
     output_npy = OUTPUT_DIR / f"{output_prefix}_{cell_type}_{track}.npy"
     output_txt = OUTPUT_DIR / f"{output_prefix}_{cell_type}_{track}.txt"
     output_stats = OUTPUT_DIR / f"{output_prefix}_{cell_type}_stats.txt"
     
-    cmd = [
-        "python", str(ALPHAGENOME_SCRIPT),
-        "--fasta", str(fasta_path),
-        "--cell-type", cell_type,
-        "--track", track,
-        "--output", str(output_npy),
-    ]
-    
     try:
-        print(f"  Running: {' '.join(cmd)}")
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=600  # 10 min timeout
-        )
-        
-        if result.returncode != 0:
-            print(f"  ✗ AlphaGenome failed: {result.stderr}")
-            return {"success": False, "error": result.stderr}
+        sequence = load_fasta(fasta_path)
         
-        # Load predictions and compute stats
-        predictions = np.load(output_npy)
+        # Track for the requested cell type (identical sequences are predicted once)
+        predictions, cache_path = predict_track(sequence, cell_type, track)
+        link_or_copy(cache_path, output_npy)
         
         stats = {
             "max": float(np.max(predictions)),
             "mean": float(np.mean(predictions)),
             "std": float(np.std(predictions)),
-            "median": float(np.median(predictions)),
+            "median": fast_median(predictions),
         }
         
-        # Save stats
-        with open(output_stats, 'w') as f:
-            f.write(f"# AlphaGenome prediction statistics\n")
-            f.write(f"# Construct: {output_prefix}\n")
-            f.write(f"# Cell type: {cell_type}\n")
-            f.write(f"# Track: {track}\n")
-            f.write(f"#\n")
-            for key, value in stats.items():
-                f.write(f"{key}: {value}\n")
+        # Save stats (one write)
+        output_stats.write_text(
+            f"# AlphaGenome prediction statistics\n"
+            f"# Construct: {output_prefix}\n"
+            f"# Cell type: {cell_type}\n"
+            f"# Track: {track}\n"
+            f"#\n"
+            + "".join(f"{key}: {value}\n" for key, value in stats.items())
+        )
         
         # Save human-readable predictions (first 100 values)
-        with open(output_txt, 'w') as f:
-            f.write(f"# First 100 prediction values\n")
-            for i, val in enumerate(predictions.flatten()[:100]):
-                f.write(f"{i}\t{val}\n")
+        head = predictions.ravel()[:100]
+        np.savetxt(output_txt, np.column_stack([np.arange(len(head)), head]),
+                   fmt="%d\t%.6g", header="First 100 prediction values")
         
         return {"success": True, "stats": stats, "output": str(output_npy)}
         
-    except subprocess.TimeoutExpired:
-        print(f"  ✗ Prediction timed out")
-        return {"success": False, "error": "Timeout"}
     except Exception as e:
         print(f"  ✗ Error: {e}")
         return {"success": False, "error": str(e)}
 
 
+def timed_prediction(fasta_path: Path, cell_type: str, output_prefix: str) -> tuple:
+    start_time = time.time()
+    result = run_alphagenome_prediction(fasta_path, cell_type, output_prefix)
+    return result, time.time() - start_time
+
+
 def run_all_predictions(manifest: List[Dict], dry_run: bool = False):
     """Run predictions for all constructs in manifest."""
     
@@ -142,49 +206,62 @@ def run_all_predictions(manifest: List[Dict], dry_run: bool = False):
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
     
     total = len(manifest)
-    results = []
     
     print(f"\n{'='*80}")
     print(f"Running predictions for {total} constructs")
     print(f"{'='*80}\n")
     
-    for i, entry in enumerate(manifest, 1):
+    # Results are stored by manifest position so the summary keeps manifest order
+    results: List[Optional[Dict]] = [None] * total
+    to_run = []
+    # One directory listing instead of a stat per construct for the skip check
+    existing = set(os.listdir(OUTPUT_DIR))
+    
+    for i, entry in enumerate(manifest):
         construct_name = entry["construct"]
         fasta_path = Path(entry["fasta_path"])
         cell_type = entry["cell_type"]
         
-        print(f"[{i}/{total}] {construct_name}")
+        print(f"[{i + 1}/{total}] {construct_name}")
         print(f"  Gate: {entry['gate_type']}, Condition: {entry['binary_code']}")
         
         if dry_run:
             print(f"  [DRY RUN] Would run: {fasta_path} → {cell_type}")
-            results.append({"construct": construct_name, "success": True, "dry_run": True})
+            results[i] = {"construct": construct_name, "success": True, "dry_run": True}
             continue
         
-        # Check if already exists
-        output_npy = OUTPUT_DIR / f"{construct_name}_{cell_type}_dnase.npy"
-        if output_npy.exists():
+        # Check if already exists (before submission, so skips don't take a worker)
+        if f"{construct_name}_{cell_type}_dnase.npy" in existing:
             print(f"  ⏭  Already exists, skipping")
-            results.append({"construct": construct_name, "success": True, "skipped": True})
+            results[i] = {"construct": construct_name, "success": True, "skipped": True}
             continue
         
-        # Run prediction
-        start_time = time.time()
-        result = run_alphagenome_prediction(fasta_path, cell_type, construct_name)
-        elapsed = time.time() - start_time
-        
-        result["construct"] = construct_name
-        result["elapsed_seconds"] = elapsed
-        results.append(result)
-        
-        if result["success"]:
-            print(f"  ✓ Success ({elapsed:.1f}s)")
-            print(f"    Stats: max={result['stats']['max']:.3f}, mean={result['stats']['mean']:.6f}")
-        else:
-            print(f"  ✗ Failed: {result.get('error', 'Unknown error')}")
+        to_run.append(i)
+    
+    # I/O-bound: keep a bounded number of predictions in flight instead of sleeping between them
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {}
+        for i in to_run:
+            entry = manifest[i]
+            future = executor.submit(
+                timed_prediction, Path(entry["fasta_path"]), entry["cell_type"], entry["construct"]
+            )
+            futures[future] = i
         
-        # Brief pause to avoid overwhelming API
-        time.sleep(1)
+        for future in as_completed(futures):
+            i = futures[future]
+            construct_name = manifest[i]["construct"]
+            result, elapsed = future.result()
+            
+            result["construct"] = construct_name
+            result["elapsed_seconds"] = elapsed
+            results[i] = result
+            
+            if result["success"]:
+                print(f"  ✓ {construct_name} ({elapsed:.1f}s)")
+                print(f"    Stats: max={result['stats']['max']:.3f}, mean={result['stats']['mean']:.6f}")
+            else:
+                print(f"  ✗ {construct_name} failed: {result.get('error', 'Unknown error')}")
     
     # Save results summary
     results_path = EXPERIMENT_ROOT / "prediction_results.json"
@@ -219,12 +296,10 @@ def main():
         manifest = manifest[:args.limit]
         print(f"  → Limited to first {args.limit} constructs")
     
-    # Check if AlphaGenome script exists
-    if not args.dry_run and not ALPHAGENOME_SCRIPT.exists():
-        print(f"\n⚠️  WARNING: AlphaGenome script not found at {ALPHAGENOME_SCRIPT}")
-        print(f"   Please update ALPHAGENOME_SCRIPT path in this file!")
-        print(f"   Running in dry-run mode...\n")
-        args.dry_run = True
+    # Create the client once, before any worker threads need it
+    if not args.dry_run:
+        print(f"\n✓ Initializing AlphaGenome client...")
+        get_client(API_KEY)
     
     # Run predictions
     run_all_predictions(manifest, dry_run=args.dry_run)
@@ -0,0 +1,212 @@
+"""
+Consolidated prediction store shared by the experiment prediction runners and
+analysis scripts, plus the FASTA reader the runners use.
+
+A store is one memmap of shape (rows, tracks, bins), one row per key in
+manifest order, next to a small CSV index listing the completed rows (key
+columns, row, bins, dtype, and the first track's stats). Runners resume from
+the index and readers only use the rows it lists. Keys are tuples of the key
+columns, or the bare value when there is a single key column.
+"""
+
+import csv
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from track_median import fast_median
+
+_HEADER_RE = re.compile(rb"(?m)^>.*(?:\n|$)")
+_WHITESPACE = b" \t\r\n\x0b\x0c"
+_UPPER_TABLE = bytes.maketrans(b"abcdefghijklmnopqrstuvwxyz", b"ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+STATS_COLUMNS = ["min", "max", "mean", "std", "median"]
+
+
+def read_fasta(path: Path) -> str:
+    """Sequence of a FASTA file: header lines dropped, whitespace stripped, upper-cased."""
+    data = Path(path).read_bytes()
+    if data.startswith(b">") and b"\n>" not in data:
+        # Single record: drop the header line, no per-line objects
+        newline = data.find(b"\n")
+        data = b"" if newline == -1 else data[newline + 1:]
+    else:
+        data = _HEADER_RE.sub(b"", data)
+    # Strip whitespace and upper-case in one translate
+    return data.translate(_UPPER_TABLE, _WHITESPACE).decode("ascii")
+
+
+def _index_key(entry: Dict[str, str], key_columns: Sequence[str]):
+    if len(key_columns) == 1:
+        return entry[key_columns[0]]
+    return tuple(entry[column] for column in key_columns)
+
+
+def _key_values(key) -> tuple:
+    return key if isinstance(key, tuple) else (key,)
+
+
+def track_summary(track: np.ndarray) -> Dict[str, float]:
+    """min/max/mean/std/median of one track, reduced in float64."""
+    flat = np.asarray(track).reshape(-1)
+    return {
+        "min": float(flat.min()),
+        "max": float(flat.max()),
+        "mean": float(flat.mean(dtype=np.float64)),
+        "std": float(flat.std(dtype=np.float64)),
+        "median": fast_median(flat),
+    }
+
+
+class PredictionStore:
+    """
+    Writer side of a store. Rows already listed in the index are reopened so
+    a run resumes where the last one stopped; a new store is created on the
+    first write, sized from that track. Stores written before the index had a
+    dtype (or stats) column are float32 and keep their original index header.
+
+    Stats are taken from the track as passed to write(), before it is cast to
+    the store dtype. A track outside the range of a narrow store dtype (e.g.
+    float16) does not abort the run: the whole store is widened to float32
+    once and the track is stored at full precision.
+    """
+
+    def __init__(self, path: Path, index_path: Path, keys: Sequence,
+                 key_columns: Sequence[str] = ("construct",), tracks: int = 1, dtype: str = "float32"):
+        self.path = Path(path)
+        self.index_path = Path(index_path)
+        self.key_columns = list(key_columns)
+        self.tracks = tracks
+        self.rows = {key: row for row, key in enumerate(dict.fromkeys(keys))}
+        self.done = set()
+        self.bins = None
+        self.dtype = np.dtype(dtype)
+        self.index_columns = self.key_columns + ["row", "bins", "dtype"] + STATS_COLUMNS
+        self.stats: Dict = {}
+        self.array = None
+
+        if self.index_path.exists():
+            with open(self.index_path, "r", newline="") as handle:
+                reader = csv.DictReader(handle)
+                self.index_columns = reader.fieldnames or self.index_columns
+                for entry in reader:
+                    key = _index_key(entry, self.key_columns)
+                    if self.rows.get(key) != int(entry["row"]):
+                        raise ValueError(
+                            f"{self.index_path} does not match the manifest at {key}; "
+                            "move the old prediction store aside"
+                        )
+                    self.done.add(key)
+                    if all(entry.get(column) for column in STATS_COLUMNS):
+                        self.stats[key] = {column: float(entry[column]) for column in STATS_COLUMNS}
+                    self.bins = int(entry["bins"])
+                    self.dtype = np.dtype(entry.get("dtype") or "float32")
+        if self.bins is not None:
+            self.array = np.memmap(self.path, dtype=self.dtype, mode="r+",
+                                   shape=(len(self.rows), self.tracks, self.bins))
+
+    def __contains__(self, key) -> bool:
+        return key in self.done
+
+    def write(self, key, *tracks: np.ndarray, stats: Optional[Dict[str, float]] = None) -> None:
+        """
+        Write one row (one array per track), flush it, then record it and the
+        first track's stats (computed here unless given) in the index.
+        """
+        flat = [np.asarray(track).reshape(-1) for track in tracks]
+        if len(flat) != self.tracks:
+            raise ValueError(f"{key}: {len(flat)} tracks, store holds {self.tracks}")
+        if self.array is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.bins = len(flat[0])
+            self.array = np.memmap(self.path, dtype=self.dtype, mode="w+",
+                                   shape=(len(self.rows), self.tracks, self.bins))
+            with open(self.index_path, "w", newline="") as handle:
+                csv.writer(handle).writerow(self.index_columns)
+        for track in flat:
+            if len(track) != self.bins:
+                raise ValueError(f"{key}: {len(track)} bins, store holds {self.bins}")
+            if self.dtype.itemsize < 4 and np.abs(track).max() > np.finfo(self.dtype).max:
+                print(f"{key}: values exceed the {self.dtype} range; widening the store to float32")
+                self.widen(np.float32)
+
+        self.stats[key] = stats if stats is not None else track_summary(flat[0])
+        row = self.rows[key]
+        self.array[row] = flat
+        self.array.flush()
+        if key not in self.done:
+            entry = dict(zip(self.key_columns, _key_values(key)), row=row, bins=self.bins,
+                         dtype=self.dtype.name, **self.stats[key])
+            with open(self.index_path, "a", newline="") as handle:
+                csv.DictWriter(handle, self.index_columns, extrasaction="ignore").writerow(entry)
+            self.done.add(key)
+
+    def copy(self, source, key) -> None:
+        """Store a completed row's tracks under another key (same sequence and cell type)."""
+        self.write(key, *self.array[self.rows[source]], stats=self.stats.get(source))
+
+    def widen(self, dtype) -> None:
+        """
+        Rewrite the store and its index in a wider dtype. Both are written under
+        temporary names and renamed into place, data first.
+        """
+        dtype = np.dtype(dtype)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        widened = np.memmap(tmp_path, dtype=dtype, mode="w+", shape=self.array.shape)
+        for row in range(len(widened)):
+            widened[row] = self.array[row]
+        widened.flush()
+
+        with open(self.index_path, "r", newline="") as handle:
+            entries = list(csv.DictReader(handle))
+        tmp_index = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_index, "w", newline="") as handle:
+            writer = csv.DictWriter(handle, self.index_columns)
+            writer.writeheader()
+            writer.writerows({**entry, "dtype": dtype.name} for entry in entries)
+
+        del self.array, widened
+        os.replace(tmp_path, self.path)
+        os.replace(tmp_index, self.index_path)
+        self.dtype = dtype
+        self.array = np.memmap(self.path, dtype=dtype, mode="r+", shape=(len(self.rows), self.tracks, self.bins))
+
+
+def write_stats_table(store: PredictionStore, path: Path) -> Path:
+    """
+    Stats of the first track of every stored row, one CSV row per key in
+    manifest order. Rows from indexes that predate the stats columns fall
+    back to stats of the stored copy.
+    """
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(store.key_columns + STATS_COLUMNS)
+        for key in store.rows:
+            if key not in store:
+                continue
+            stats = store.stats.get(key) or track_summary(store.array[store.rows[key], 0])
+            writer.writerow([*_key_values(key), *(stats[column] for column in STATS_COLUMNS)])
+    return path
+
+
+def open_prediction_store(path: Path, index_path: Path, key_columns: Sequence[str] = ("construct",),
+                          tracks: int = 1) -> Tuple[Optional[np.memmap], Dict]:
+    """
+    Read-only (rows, tracks, bins) view of a store with its key -> row index
+    of completed rows, or (None, {}) when nothing has been stored yet.
+    """
+    index_path = Path(index_path)
+    if not index_path.exists():
+        return None, {}
+    with open(index_path, "r", newline="") as handle:
+        entries = list(csv.DictReader(handle))
+    if not entries:
+        return None, {}
+    bins = int(entries[0]["bins"])
+    dtype = np.dtype(entries[0].get("dtype") or "float32")
+    n_rows = Path(path).stat().st_size // (tracks * bins * dtype.itemsize)
+    array = np.memmap(path, dtype=dtype, mode="r", shape=(n_rows, tracks, bins))
+    return array, {_index_key(entry, key_columns): int(entry["row"]) for entry in entries}
@@ -0,0 +1,29 @@
+"""Client-side rate limiting shared by the experiment prediction runners."""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() only blocks once a burst of
+    `capacity` requests has used up the tokens refilled at `rate` per second.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # A negative balance reserves the next tokens for waiters already queued
+            wait = max(0.0, 1 - self.tokens) / self.rate
+            self.tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
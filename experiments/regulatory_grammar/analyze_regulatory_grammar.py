@@ -11,41 +11,130 @@ Generates:
 
 from __future__ import annotations
 
+import functools
 import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import numpy as np
+import matplotlib
+matplotlib.use("Agg", force=True)  # Figures are only saved, never shown
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 
+# Helpers shared across experiments live one level up, in experiments/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from prediction_store import open_prediction_store
+from track_median import fast_median
+
+try:
+    import orjson
+except ImportError:  # Optional: faster JSON, stdlib json is the fallback
+    orjson = None
+
 # Paths
 EXPERIMENT_ROOT = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking/experiments/regulatory_grammar")
 MANIFEST_PATH = EXPERIMENT_ROOT / "construct_manifest.json"
 OUTPUT_DIR = EXPERIMENT_ROOT / "alphagenome_outputs"
 RESULTS_DIR = EXPERIMENT_ROOT / "results"
+PREDICTIONS_PATH = OUTPUT_DIR / "dnase_predictions.dat"
+PREDICTIONS_INDEX_PATH = OUTPUT_DIR / "dnase_predictions_index.csv"
+STATS_TABLE_PATH = EXPERIMENT_ROOT / "prediction_stats.csv"
 
-# Setup plotting
+# Setup plotting: figures are drawn at a low canvas DPI and saved at 300
 sns.set_style("whitegrid")
-plt.rcParams['figure.dpi'] = 300
+plt.rcParams['figure.dpi'] = 150
+SAVE_DPI = 300
+
+
+@functools.lru_cache(maxsize=None)
+def load_manifest() -> List[Dict]:
+    """Parse the construct manifest once per process."""
+    if orjson is not None:
+        return orjson.loads(MANIFEST_PATH.read_bytes())
+    with open(MANIFEST_PATH, 'r') as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=None)
+def load_stats_table() -> Dict[tuple, Dict]:
+    """Stats written by the prediction runner, keyed by (construct, cell_type)."""
+    if not STATS_TABLE_PATH.exists():
+        return {}
+    table = pd.read_csv(STATS_TABLE_PATH, index_col=["construct", "cell_type"])
+    return table.to_dict(orient="index")
+
 
+@functools.lru_cache(maxsize=None)
+def legacy_output_files() -> frozenset:
+    """Names in OUTPUT_DIR, listed once, for outputs of older per-construct runs."""
+    return frozenset(os.listdir(OUTPUT_DIR)) if OUTPUT_DIR.exists() else frozenset()
 
-def load_predictions(construct_name: str, cell_type: str = "K562") -> Dict:
-    """Load predictions and stats for a construct."""
+
+@functools.lru_cache(maxsize=None)
+def load_prediction_store():
+    """
+    Open the consolidated (rows, 2, bins) prediction memmap written by the
+    prediction runner, with its (construct, cell_type) -> row index.
+    """
+    return open_prediction_store(PREDICTIONS_PATH, PREDICTIONS_INDEX_PATH,
+                                 key_columns=("construct", "cell_type"), tracks=2)
+
+
+def load_predictions(construct_name: str, cell_type: str = "K562",
+                     stats_table: Optional[Dict[tuple, Dict]] = None) -> Dict:
+    """
+    Load predictions and stats for a construct.
+    
+    The analyses only read the stats, so a construct in stats_table (by
+    default the runner's stats table) is a single lookup and its track is
+    not touched. Otherwise the predictions are a row view of the consolidated
+    store with stats computed from it; outputs of older runs (one .npy and
+    stats.txt per construct) are still read when the construct is not in the
+    store.
+    """
+    if stats_table is None:
+        stats_table = load_stats_table()
+    stats = stats_table.get((construct_name, cell_type))
+    if stats is not None:
+        return {
+            "predictions": None,
+            "stats": stats,
+            "cell_type": cell_type,
+        }
+    
+    store, rows = load_prediction_store()
+    row = rows.get((construct_name, cell_type))
+    if row is not None:
+        predictions = store[row, 0]
+        stats = {
+            "max": float(predictions.max()),
+            "mean": float(predictions.mean()),
+            "std": float(predictions.std()),
+            "median": fast_median(predictions),
+        }
+        return {
+            "predictions": predictions,
+            "stats": stats,
+            "cell_type": cell_type,
+        }
+    
     base_name = f"{construct_name}_{cell_type}"
+    files = legacy_output_files()
     
-    # Load numpy array
-    npy_path = OUTPUT_DIR / f"{base_name}_dnase.npy"
-    if not npy_path.exists():
+    # The array marks a completed prediction
+    if f"{base_name}_dnase.npy" not in files:
         return None
-    
-    predictions = np.load(npy_path)
+    npy_path = OUTPUT_DIR / f"{base_name}_dnase.npy"
     
     # Load stats
     stats_path = OUTPUT_DIR / f"{base_name}_stats.txt"
     stats = {}
-    if stats_path.exists():
+    if stats_path.name in files:
         with open(stats_path, 'r') as f:
             for line in f:
                 if ':' in line and not line.startswith('#') and '=' not in line:
@@ -55,6 +144,8 @@ def load_predictions(construct_name: str, cell_type: str = "K562") -> Dict:
                     except:
                         pass
     
+    predictions = None if stats else np.load(npy_path, mmap_mode="r")
+    
     return {
         "predictions": predictions,
         "stats": stats,
@@ -62,7 +153,65 @@ def load_predictions(construct_name: str, cell_type: str = "K562") -> Dict:
     }
 
 
-def analyze_celltype_specificity(manifest: List[Dict]) -> pd.DataFrame:
+def batch_track_stats(tracks: List[np.ndarray]) -> List[Dict]:
+    """
+    max/mean/std/median for many tracks in one vectorized pass. Tracks are
+    concatenated into one flat buffer with CSR-style offsets, so ragged
+    lengths need no padding.
+    """
+    lengths = np.array([track.size for track in tracks])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    flat = np.concatenate([track.ravel() for track in tracks])
+    
+    maxes = np.maximum.reduceat(flat, offsets)
+    means = np.add.reduceat(flat, offsets, dtype=np.float64) / lengths
+    dev = flat - np.repeat(means, lengths)
+    dev *= dev
+    stds = np.sqrt(np.add.reduceat(dev, offsets) / lengths)
+    
+    return [
+        {
+            "max": float(maxes[k]),
+            "mean": float(means[k]),
+            "std": float(stds[k]),
+            "median": fast_median(flat[offsets[k]:offsets[k] + lengths[k]]),
+        }
+        for k in range(len(tracks))
+    ]
+
+
+def preload_stats(manifest: List[Dict]) -> Dict[tuple, Dict]:
+    """
+    The runner's stats table plus stats for every construct missing from it,
+    computed in one batch, so the analyses only do lookups. Constructs with a
+    stats.txt from older runs are left to load_predictions.
+    """
+    stats = dict(load_stats_table())
+    store, rows = load_prediction_store()
+    
+    keys, tracks = [], []
+    for construct in manifest:
+        # The cell-type experiment is analyzed per cell type, the others in K562
+        cell_type = construct["cell_type"] if construct["experiment"] == "cell_type_specificity" else "K562"
+        key = (construct["construct"], cell_type)
+        if key in stats or key in keys:
+            continue
+        if key in rows:
+            tracks.append(store[rows[key], 0])
+        else:
+            base_name = f"{construct['construct']}_{cell_type}"
+            files = legacy_output_files()
+            if f"{base_name}_dnase.npy" not in files or f"{base_name}_stats.txt" in files:
+                continue
+            tracks.append(np.load(OUTPUT_DIR / f"{base_name}_dnase.npy", mmap_mode="r"))
+        keys.append(key)
+    
+    if tracks:
+        stats.update(zip(keys, batch_track_stats(tracks)))
+    return stats
+
+
+def analyze_celltype_specificity(manifest: List[Dict], stats_table: Dict[tuple, Dict]) -> pd.DataFrame:
     """Analyze cell-type specificity experiments."""
     print("\n" + "=" * 80)
     print("ANALYSIS 1: Cell-Type Specificity")
@@ -76,7 +225,7 @@ def analyze_celltype_specificity(manifest: List[Dict]) -> pd.DataFrame:
     data = []
     for construct in celltype_constructs:
         name = construct["construct"]
-        result = load_predictions(name, construct["cell_type"])
+        result = load_predictions(name, construct["cell_type"], stats_table)
         
         if result:
             data.append({
@@ -90,22 +239,22 @@ def analyze_celltype_specificity(manifest: List[Dict]) -> pd.DataFrame:
     
     df = pd.DataFrame(data)
     
-    # Create pivot table for heatmap
+    # One groupby for both metrics; each heatmap is a pivot of its column
+    grouped = df.groupby(["promoter", "enhancer", "cell_type"])[["max_dnase", "mean_dnase"]].mean()
+    
+    # One figure is cleared and reused
+    fig = plt.figure(figsize=(10, 8))
     for metric in ["max_dnase", "mean_dnase"]:
-        pivot = df.pivot_table(
-            values=metric,
-            index=["promoter", "enhancer"],
-            columns="cell_type",
-            aggfunc="mean"
-        )
+        pivot = grouped[metric].unstack("cell_type")
         
         # Plot
-        fig, ax = plt.subplots(figsize=(10, 8))
+        ax = fig.add_subplot(111)
         sns.heatmap(pivot, annot=True, fmt=".4f", cmap="YlOrRd", ax=ax)
         ax.set_title(f"Cell-Type Specificity: {metric.replace('_', ' ').title()}")
-        plt.tight_layout()
-        plt.savefig(RESULTS_DIR / f"celltype_heatmap_{metric}.png")
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(RESULTS_DIR / f"celltype_heatmap_{metric}.png", dpi=SAVE_DPI)
+        fig.clf()
+    plt.close(fig)
     
     # Save table
     df.to_csv(RESULTS_DIR / "celltype_specificity_results.csv", index=False)
@@ -114,7 +263,7 @@ def analyze_celltype_specificity(manifest: List[Dict]) -> pd.DataFrame:
     return df
 
 
-def analyze_cooperativity(manifest: List[Dict]) -> pd.DataFrame:
+def analyze_cooperativity(manifest: List[Dict], stats_table: Dict[tuple, Dict]) -> pd.DataFrame:
     """Analyze pairwise cooperativity."""
     print("\n" + "=" * 80)
     print("ANALYSIS 2: Motif Cooperativity")
@@ -131,7 +280,7 @@ def analyze_cooperativity(manifest: List[Dict]) -> pd.DataFrame:
     # Load single enhancer signals
     single_signals = {}
     for enh_name, construct in singles.items():
-        result = load_predictions(construct["construct"])
+        result = load_predictions(construct["construct"], stats_table=stats_table)
         if result:
             single_signals[enh_name] = result["stats"].get("max", 0)
     
@@ -139,30 +288,37 @@ def analyze_cooperativity(manifest: List[Dict]) -> pd.DataFrame:
     for enh, signal in single_signals.items():
         print(f"  {enh}: {signal:.4f}")
     
-    # Calculate additivity scores
-    data = []
+    # Observed signal per pair; expected and additivity are computed column-wise
+    pair_rows = []
     for construct in pairs:
-        enh1 = construct["enhancer1"]
-        enh2 = construct["enhancer2"]
-        
-        result = load_predictions(construct["construct"])
-        if result and enh1 in single_signals and enh2 in single_signals:
-            observed = result["stats"].get("max", 0)
-            expected = single_signals[enh1] + single_signals[enh2]
-            additivity = observed / expected if expected > 0 else 0
-            
-            data.append({
-                "pair": f"{enh1}+{enh2}",
-                "enhancer1": enh1,
-                "enhancer2": enh2,
-                "observed": observed,
-                "expected": expected,
-                "additivity_score": additivity,
-                "interaction": "synergy" if additivity > 1.1 else ("interference" if additivity < 0.9 else "independent"),
+        result = load_predictions(construct["construct"], stats_table=stats_table)
+        if result:
+            pair_rows.append({
+                "pair": f"{construct['enhancer1']}+{construct['enhancer2']}",
+                "enhancer1": construct["enhancer1"],
+                "enhancer2": construct["enhancer2"],
+                "observed": result["stats"].get("max", 0),
                 "expected_interaction": construct.get("expected", "unknown"),
             })
-    
-    df = pd.DataFrame(data)
+    pairs_df = pd.DataFrame(pair_rows, columns=["pair", "enhancer1", "enhancer2", "observed", "expected_interaction"])
+    singles_df = pd.DataFrame(list(single_signals.items()), columns=["enh", "signal"])
+    
+    # Inner joins drop pairs whose singles are missing and keep pair order
+    df = (
+        pairs_df
+        .merge(singles_df.rename(columns={"enh": "enhancer1", "signal": "signal_1"}), on="enhancer1")
+        .merge(singles_df.rename(columns={"enh": "enhancer2", "signal": "signal_2"}), on="enhancer2")
+    )
+    expected = df["signal_1"] + df["signal_2"]
+    df["expected"] = expected
+    df["additivity_score"] = np.where(expected > 0, df["observed"] / expected.where(expected > 0, 1), 0)
+    df["interaction"] = np.select(
+        [df["additivity_score"] > 1.1, df["additivity_score"] < 0.9],
+        ["synergy", "interference"],
+        default="independent",
+    )
+    df = df[["pair", "enhancer1", "enhancer2", "observed", "expected",
+             "additivity_score", "interaction", "expected_interaction"]]
     
     # Plot
     fig, ax = plt.subplots(figsize=(12, 6))
@@ -174,9 +330,9 @@ def analyze_cooperativity(manifest: List[Dict]) -> pd.DataFrame:
     ax.set_xlabel("Additivity Score")
     ax.set_title("Motif Cooperativity: Observed / Expected Signal")
     ax.legend()
-    plt.tight_layout()
-    plt.savefig(RESULTS_DIR / "cooperativity_additivity_scores.png")
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(RESULTS_DIR / "cooperativity_additivity_scores.png", dpi=SAVE_DPI)
+    plt.close(fig)
     
     # Save table
     df.to_csv(RESULTS_DIR / "cooperativity_results.csv", index=False)
@@ -185,7 +341,7 @@ def analyze_cooperativity(manifest: List[Dict]) -> pd.DataFrame:
     return df
 
 
-def analyze_spacing(manifest: List[Dict]) -> pd.DataFrame:
+def analyze_spacing(manifest: List[Dict], stats_table: Dict[tuple, Dict]) -> pd.DataFrame:
     """Analyze short-range spacing effects."""
     print("\n" + "=" * 80)
     print("ANALYSIS 3: Short-Range Spacing")
@@ -200,7 +356,7 @@ def analyze_spacing(manifest: List[Dict]) -> pd.DataFrame:
     # Collect data
     data = []
     for construct in spacing_constructs:
-        result = load_predictions(construct["construct"])
+        result = load_predictions(construct["construct"], stats_table=stats_table)
         if result:
             data.append({
                 "spacing": construct["spacing"],
@@ -227,9 +383,9 @@ def analyze_spacing(manifest: List[Dict]) -> pd.DataFrame:
                    label=f'Optimal: {optimal_spacing} bp')
         ax.legend()
     
-    plt.tight_layout()
-    plt.savefig(RESULTS_DIR / "spacing_response_curves.png")
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(RESULTS_DIR / "spacing_response_curves.png", dpi=SAVE_DPI)
+    plt.close(fig)
     
     # Save table
     df.to_csv(RESULTS_DIR / "spacing_results.csv", index=False)
@@ -238,7 +394,7 @@ def analyze_spacing(manifest: List[Dict]) -> pd.DataFrame:
     return df
 
 
-def analyze_orientation(manifest: List[Dict]) -> pd.DataFrame:
+def analyze_orientation(manifest: List[Dict], stats_table: Dict[tuple, Dict]) -> pd.DataFrame:
     """Analyze orientation effects."""
     print("\n" + "=" * 80)
     print("ANALYSIS 4: Orientation Effects")
@@ -252,7 +408,7 @@ def analyze_orientation(manifest: List[Dict]) -> pd.DataFrame:
     # Collect data
     data = []
     for construct in orient_constructs:
-        result = load_predictions(construct["construct"])
+        result = load_predictions(construct["construct"], stats_table=stats_table)
         if result:
             data.append({
                 "pair": f"{construct['enhancer1']}+{construct['enhancer2']}",
@@ -281,9 +437,9 @@ def analyze_orientation(manifest: List[Dict]) -> pd.DataFrame:
         ax.set_title(f"Orientation Effects: {pair}")
         ax.grid(True, alpha=0.3, axis='y')
     
-    plt.tight_layout()
-    plt.savefig(RESULTS_DIR / "orientation_effects.png")
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(RESULTS_DIR / "orientation_effects.png", dpi=SAVE_DPI)
+    plt.close(fig)
     
     # Save table
     df.to_csv(RESULTS_DIR / "orientation_results.csv", index=False)
@@ -301,14 +457,18 @@ def main():
     RESULTS_DIR.mkdir(parents=True, exist_ok=True)
     
     # Load manifest
-    with open(MANIFEST_PATH, 'r') as f:
-        manifest = json.load(f)
-    
-    # Run analyses
-    celltype_df = analyze_celltype_specificity(manifest)
-    coop_df = analyze_cooperativity(manifest)
-    spacing_df = analyze_spacing(manifest)
-    orient_df = analyze_orientation(manifest)
+    manifest = load_manifest()
+    
+    # Fill in missing stats once in the parent and hand the table to each
+    # analysis, so the workers only do lookups
+    stats_table = preload_stats(manifest)
+    
+    # The analyses read disjoint constructs and write disjoint files, so each
+    # runs in its own process (with its own pyplot state)
+    analyses = (analyze_celltype_specificity, analyze_cooperativity, analyze_spacing, analyze_orientation)
+    with ProcessPoolExecutor(max_workers=len(analyses)) as executor:
+        futures = [executor.submit(analysis, manifest, stats_table) for analysis in analyses]
+        celltype_df, coop_df, spacing_df, orient_df = [future.result() for future in futures]
     
     # Summary report
     print("\n" + "=" * 80)
@@ -13,15 +13,23 @@ Total: 78 constructs
 
 from __future__ import annotations
 
+import functools
+import hashlib
 import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional
 
+import numpy as np
+
 ROOT = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking")
 EXPERIMENT_ROOT = ROOT / "experiments" / "regulatory_grammar"
 CONSTRUCT_DIR = EXPERIMENT_ROOT / "sequences"
+# One FASTA per distinct construct sequence, named by its content hash
+SEQUENCE_STORE_DIR = CONSTRUCT_DIR / "by_hash"
 MANIFEST_PATH = EXPERIMENT_ROOT / "construct_manifest.json"
 
 # Input sequences
@@ -33,107 +41,170 @@ FILLER_PATH = ROOT / "filler" / "1M_filler.txt"
 CONSTRUCT_LENGTH = 1_048_576
 PROMOTER_POS = 500_000
 ENHANCER_DOMAIN_START = 250_000
+FASTA_LINE_WIDTH = 80
+
+_DNA_TAG_RE = re.compile(rb"<DNA[^>]*>(.*?)</DNA>", re.DOTALL)
+_WHITESPACE = b" \t\r\n\x0b\x0c"
+_UPPER_TABLE = bytes.maketrans(b"abcdefghijklmnopqrstuvwxyz", b"ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+# Complement table that also upper-cases, so reverse_complement needs a single translate
+_RC_TABLE = bytearray(_UPPER_TABLE)
+for _base, _comp in zip(b"ACGTacgt", b"TGCATGCA"):
+    _RC_TABLE[_base] = _comp
+_RC_TABLE = bytes(_RC_TABLE)
+_RC_LUT = np.frombuffer(_RC_TABLE, dtype=np.uint8)
 
 
 @dataclass
 class Module:
     name: str
-    sequence: str
+    sequence: bytes
 
-    def oriented(self, orientation: str) -> str:
+    @functools.cached_property
+    def rc(self) -> bytes:
+        return reverse_complement(self.sequence)
+
+    def oriented(self, orientation: str) -> bytes:
         if orientation == "+":
             return self.sequence
         if orientation == "-":
-            return reverse_complement(self.sequence)
+            return self.rc
         raise ValueError(f"Unknown orientation '{orientation}'")
 
 
-def reverse_complement(seq: str) -> str:
-    table = str.maketrans("ACGT", "TGCA")
-    return seq.upper().translate(table)[::-1]
+def reverse_complement(seq: bytes) -> bytes:
+    # Gather through the reversed view: one pass, one output allocation
+    arr = np.frombuffer(seq, dtype=np.uint8)
+    return _RC_LUT[arr[::-1]].tobytes()
 
 
-def load_fasta_sequence(path: Path) -> str:
+def load_fasta_sequence(path: Path) -> bytes:
     """Load sequence from FASTA file (handles both plain and XML-style)."""
-    text = path.read_text()
+    data = path.read_bytes()
+    
+    # XML format (like HS2): only documents starting with '<' are scanned with the regex
+    if data.lstrip().startswith(b'<'):
+        match = _DNA_TAG_RE.search(data)
+        if match:
+            return match.group(1).translate(_UPPER_TABLE, _WHITESPACE)
     
-    # Try XML format first (like HS2)
-    match = re.search(r"<DNA[^>]*>(.*?)</DNA>", text, re.DOTALL)
-    if match:
-        return "".join(match.group(1).split()).upper()
+    # Plain FASTA format: drop the header, then strip newlines and upper-case in one translate
+    body = data
+    if body.startswith(b'>'):
+        newline = body.find(b'\n')
+        body = b"" if newline == -1 else body[newline + 1:]
+    if b'\n>' not in body and not body.startswith(b'>'):
+        return body.translate(_UPPER_TABLE, _WHITESPACE)
     
-    # Plain FASTA format
-    lines = [line.strip() for line in text.split('\n') if not line.startswith('>')]
-    return "".join(lines).upper()
+    # Multi-record FASTA: concatenate every record's sequence lines
+    lines = [line for line in data.split(b'\n') if not line.startswith(b'>')]
+    return b"".join(lines).translate(_UPPER_TABLE, _WHITESPACE)
 
 
-def load_filler(path: Path) -> str:
-    return path.read_text().strip().upper()
+def load_filler(path: Path) -> bytes:
+    filler = path.read_bytes().strip()
+    # Pre-normalized filler skips the upper-case copy; isupper() only scans
+    return filler if filler.isupper() else filler.translate(_UPPER_TABLE)
 
 
 class SequenceBuilder:
-    def __init__(self, filler: str):
+    def __init__(
+        self,
+        filler: bytes,
+        total_length: int,
+        upstream: bytes = b"",
+        buf: Optional[bytearray] = None
+    ):
         self._filler = filler
+        self._filler_view = memoryview(filler)
         self._filler_idx = 0
-        self.parts: List[str] = []
+        self.total_length = total_length
+        # Segments are written in place; nothing is joined at the end. Every byte is
+        # overwritten before finish(), so a caller-owned buffer can be reused
+        if buf is not None and len(buf) != total_length:
+            raise ValueError(f"Buffer length {len(buf)} != construct length {total_length}")
+        self.buf = buf if buf is not None else bytearray(total_length)
         self.cursor = 0
         self.features: List[Dict] = []
-
-    def _take_filler(self, length: int) -> str:
-        if length <= 0:
-            return ""
-        chunks = []
-        remaining = length
-        while remaining > 0:
-            chunk_len = min(len(self._filler) - self._filler_idx, remaining)
-            chunks.append(self._filler[self._filler_idx:self._filler_idx + chunk_len])
-            self._filler_idx = (self._filler_idx + chunk_len) % len(self._filler)
-            remaining -= chunk_len
-        return "".join(chunks)
+        if upstream:
+            # Leading filler precomputed by upstream_filler(): paste it instead of tiling again
+            self._append(upstream, "upstream_filler")
+            self._filler_idx = len(upstream) % len(filler)
 
     def append_filler(self, length: int, label: Optional[str] = None) -> None:
         if length <= 0:
             return
-        seq = self._take_filler(length)
-        self._append(seq, label)
+        start = self._reserve(length)
+        n = len(self._filler)
+        idx = self._filler_idx
+        self._filler_idx = (idx + length) % n
+        if idx + length <= n:
+            # Common case: one slice, no wrap-around
+            self.buf[start:self.cursor] = self._filler_view[idx:idx + length]
+        else:
+            # Wrap-around: tail, whole repeats, then head
+            pos = start + n - idx
+            self.buf[start:pos] = self._filler_view[idx:]
+            full, head = divmod(length - (n - idx), n)
+            for _ in range(full):
+                self.buf[pos:pos + n] = self._filler_view
+                pos += n
+            self.buf[pos:self.cursor] = self._filler_view[:head]
+        self._record_feature(start, label)
 
     def append_module(self, module: Module, orientation: str, label: str) -> None:
         seq = module.oriented(orientation)
         meta = {"module": module.name, "orientation": orientation}
         self._append(seq, label, meta)
 
-    def _append(self, seq: str, label: Optional[str], metadata: Optional[Dict] = None) -> None:
+    def _append(self, seq: bytes, label: Optional[str], metadata: Optional[Dict] = None) -> None:
         if not seq:
             return
+        start = self._reserve(len(seq))
+        self.buf[start:self.cursor] = seq
+        self._record_feature(start, label, metadata)
+
+    def _reserve(self, length: int) -> int:
         start = self.cursor
-        self.parts.append(seq)
-        self.cursor += len(seq)
+        end = start + length
+        if end > self.total_length:
+            raise ValueError(f"Construct exceeds target ({end} > {self.total_length})")
+        self.cursor = end
+        return start
+
+    def _record_feature(self, start: int, label: Optional[str], metadata: Optional[Dict] = None) -> None:
         if label:
             feature = {"label": label, "start": start, "end": self.cursor}
             if metadata:
                 feature.update(metadata)
             self.features.append(feature)
 
-    def finish(self, total_length: int) -> str:
-        if self.cursor > total_length:
-            raise ValueError(f"Construct exceeds target ({self.cursor} > {total_length})")
-        self.append_filler(total_length - self.cursor)
-        return "".join(self.parts)
+    def finish(self) -> bytearray:
+        self.append_filler(self.total_length - self.cursor)
+        return self.buf
+
+
+@functools.lru_cache(maxsize=None)
+def upstream_filler(filler: bytes) -> bytes:
+    """The ENHANCER_DOMAIN_START bp of filler that every construct starts with."""
+    builder = SequenceBuilder(filler, ENHANCER_DOMAIN_START)
+    builder.append_filler(ENHANCER_DOMAIN_START)
+    return bytes(builder.buf)
 
 
 def build_celltype_construct(
     promoter: Module,
     enhancer: Module,
-    filler: str,
-    spacing: int = 100_000
+    filler: bytes,
+    spacing: int = 100_000,
+    buf: Optional[bytearray] = None
 ) -> Dict:
     """Build promoter + single enhancer construct."""
-    builder = SequenceBuilder(filler)
-    builder.append_filler(ENHANCER_DOMAIN_START, "upstream_filler")
+    builder = SequenceBuilder(filler, CONSTRUCT_LENGTH, upstream_filler(filler), buf=buf)
     builder.append_module(enhancer, "+", "enhancer")
     builder.append_filler(spacing - len(enhancer.sequence), "spacer")
     builder.append_module(promoter, "+", "promoter")
-    sequence = builder.finish(CONSTRUCT_LENGTH)
+    sequence = builder.finish()
     return {"sequence": sequence, "features": builder.features}
 
 
@@ -141,13 +212,13 @@ def build_pairwise_construct(
     enhancer1: Module,
     enhancer2: Optional[Module],
     promoter: Module,
-    filler: str,
+    filler: bytes,
     spacing: int = 5_000,
-    separator: Optional[Module] = None
+    separator: Optional[Module] = None,
+    buf: Optional[bytearray] = None
 ) -> Dict:
     """Build construct with two enhancers (or one if enhancer2 is None)."""
-    builder = SequenceBuilder(filler)
-    builder.append_filler(ENHANCER_DOMAIN_START, "upstream_filler")
+    builder = SequenceBuilder(filler, CONSTRUCT_LENGTH, upstream_filler(filler), buf=buf)
     
     builder.append_module(enhancer1, "+", "enhancer1")
     
@@ -166,7 +237,7 @@ def build_pairwise_construct(
         builder.append_filler(PROMOTER_POS - builder.cursor, "spacer_to_promoter")
     
     builder.append_module(promoter, "+", "promoter")
-    sequence = builder.finish(CONSTRUCT_LENGTH)
+    sequence = builder.finish()
     return {"sequence": sequence, "features": builder.features}
 
 
@@ -174,25 +245,26 @@ def build_spacing_construct(
     enhancer1: Module,
     enhancer2: Module,
     promoter: Module,
-    filler: str,
-    spacing: int
+    filler: bytes,
+    spacing: int,
+    buf: Optional[bytearray] = None
 ) -> Dict:
     """Build construct with specific spacing between enhancers."""
-    return build_pairwise_construct(enhancer1, enhancer2, promoter, filler, spacing, None)
+    return build_pairwise_construct(enhancer1, enhancer2, promoter, filler, spacing, None, buf=buf)
 
 
 def build_orientation_construct(
     enhancer1: Module,
     enhancer2: Module,
     promoter: Module,
-    filler: str,
+    filler: bytes,
     orient1: str,
     orient2: str,
-    spacing: int = 5_000
+    spacing: int = 5_000,
+    buf: Optional[bytearray] = None
 ) -> Dict:
     """Build construct with specified orientations."""
-    builder = SequenceBuilder(filler)
-    builder.append_filler(ENHANCER_DOMAIN_START, "upstream_filler")
+    builder = SequenceBuilder(filler, CONSTRUCT_LENGTH, upstream_filler(filler), buf=buf)
     builder.append_module(enhancer1, orient1, "enhancer1")
     builder.append_filler(spacing, "inter_enhancer_spacing")
     builder.append_module(enhancer2, orient2, "enhancer2")
@@ -201,20 +273,104 @@ def build_orientation_construct(
     remaining = (PROMOTER_POS - ENHANCER_DOMAIN_START) - used
     builder.append_filler(remaining, "spacer_to_promoter")
     builder.append_module(promoter, "+", "promoter")
-    sequence = builder.finish(CONSTRUCT_LENGTH)
+    sequence = builder.finish()
     return {"sequence": sequence, "features": builder.features}
 
 
-def save_construct(name: str, sequence: str) -> Path:
-    CONSTRUCT_DIR.mkdir(parents=True, exist_ok=True)
-    path = CONSTRUCT_DIR / f"{name}.fa"
-    with open(path, 'w') as f:
-        f.write(f">{name}\n")
-        f.write(sequence + "\n")
-    return path
+def store_sequence(sequence: bytes, width: int = FASTA_LINE_WIDTH) -> tuple:
+    """
+    Write a construct sequence to the content-addressed store, wrapped at
+    `width` bases per line, and return (sequence_hash, path).
+    
+    Identical constructs (e.g. a cell-type construct tested in three cell
+    types) share one file, and a sequence already stored by an earlier run
+    is not rewritten.
+    """
+    sequence_hash = hashlib.blake2b(sequence, digest_size=16).hexdigest()
+    path = SEQUENCE_STORE_DIR / f"{sequence_hash}.fa"
+    if path.exists():
+        return sequence_hash, path
+    
+    SEQUENCE_STORE_DIR.mkdir(parents=True, exist_ok=True)
+    # Lay out header, wrapped lines and newlines in one preallocated buffer
+    header = f">{sequence_hash}\n".encode("ascii")
+    arr = np.frombuffer(sequence, dtype=np.uint8)
+    full = len(arr) - len(arr) % width
+    n_lines = full // width + (full < len(arr))
+    out = np.empty(len(header) + len(arr) + n_lines, dtype=np.uint8)
+    out[:len(header)] = np.frombuffer(header, dtype=np.uint8)
+    rows = out[len(header):len(header) + full + full // width].reshape(-1, width + 1)
+    rows[:, :width] = arr[:full].reshape(-1, width)
+    rows[:, width] = ord("\n")
+    if full < len(arr):
+        out[-(len(arr) - full) - 1:-1] = arr[full:]
+        out[-1] = ord("\n")
+    # Workers can store the same sequence concurrently: write privately (one write), then rename
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(out)
+    os.replace(tmp_path, path)
+    return sequence_hash, path
+
+
+# Per-worker state, set once by _init_worker so specs only carry names
+_WORKER_STATE: Dict = {}
+
+
+def _init_worker(modules: Dict[str, Module], promoters: Dict[str, Module], filler: bytes) -> None:
+    _WORKER_STATE["modules"] = modules
+    _WORKER_STATE["promoters"] = promoters
+    _WORKER_STATE["filler"] = filler
+    # One construct buffer per worker, overwritten by each build after its FASTA is written
+    _WORKER_STATE["buf"] = bytearray(CONSTRUCT_LENGTH)
+
+
+def _build_one(spec: tuple) -> Dict:
+    """
+    Build one construct in a worker process and write its FASTA.
+    
+    Only the manifest fields are returned; the megabase sequence never
+    leaves the worker.
+    """
+    name, kind, params = spec
+    modules = _WORKER_STATE["modules"]
+    promoters = _WORKER_STATE["promoters"]
+    filler = _WORKER_STATE["filler"]
+    buf = _WORKER_STATE["buf"]
+    
+    if kind == "celltype":
+        prom_name, enh_name = params
+        result = build_celltype_construct(promoters[prom_name], modules[enh_name], filler, buf=buf)
+    elif kind == "pairwise":
+        enh1, enh2, separator = params
+        result = build_pairwise_construct(
+            modules[enh1],
+            modules[enh2] if enh2 else None,
+            promoters["HBG1"],
+            filler,
+            separator=modules[separator] if separator else None,
+            buf=buf
+        )
+    elif kind == "spacing":
+        enh1, enh2, spacing = params
+        result = build_spacing_construct(modules[enh1], modules[enh2], promoters["HBG1"], filler, spacing, buf=buf)
+    elif kind == "orientation":
+        enh1, enh2, or1, or2 = params
+        result = build_orientation_construct(
+            modules[enh1], modules[enh2], promoters["HBG1"], filler, or1, or2, buf=buf
+        )
+    else:
+        raise ValueError(f"Unknown construct kind '{kind}'")
+    
+    sequence_hash, path = store_sequence(result["sequence"])
+    return {
+        "length": len(result["sequence"]),
+        "sequence_hash": sequence_hash,
+        "fasta": str(path.relative_to(EXPERIMENT_ROOT)),
+        "features": result["features"],
+    }
 
 
-def main():
+def main(verbose: bool = False):
     print("=" * 80)
     print("Building Regulatory Grammar Test Constructs")
     print("=" * 80)
@@ -243,7 +399,10 @@ def main():
     for name, prom in promoters.items():
         print(f"  ✓ {name} promoter: {len(prom.sequence)} bp")
     
+    # Constructs are queued as (name, kind, params) specs and built in worker processes;
+    # length, sequence hash, FASTA path and features are filled into the manifest once built
     manifest = []
+    specs = []
     
     # ========== PART 1: CELL-TYPE SPECIFICITY (27 constructs) ==========
     print("\n" + "=" * 80)
@@ -283,13 +442,9 @@ def main():
     
     for prom_name, enh_name, cell_type, label in celltype_combos:
         name = f"CellType_{prom_name}_{enh_name}_{cell_type}"
-        print(f"Building {name} ({label})...")
-        result = build_celltype_construct(
-            promoters[prom_name],
-            modules[enh_name],
-            filler
-        )
-        fasta_path = save_construct(name, result["sequence"])
+        if verbose:
+            print(f"Queueing {name} ({label})...")
+        specs.append((name, "celltype", (prom_name, enh_name)))
         manifest.append({
             "construct": name,
             "experiment": "cell_type_specificity",
@@ -297,12 +452,13 @@ def main():
             "enhancer": enh_name,
             "cell_type": cell_type,
             "expected": label,
-            "length": len(result["sequence"]),
-            "fasta": str(fasta_path.relative_to(EXPERIMENT_ROOT)),
-            "features": result["features"],
+            "length": None,
+            "sequence_hash": None,
+            "fasta": None,
+            "features": None,
         })
     
-    print(f"✓ Built {len(celltype_combos)} cell-type constructs")
+    print(f"✓ Queued {len(celltype_combos)} cell-type constructs")
     
     # ========== PART 2: PAIRWISE COOPERATIVITY (17 constructs) ==========
     print("\n" + "=" * 80)
@@ -313,23 +469,19 @@ def main():
     single_enhancers = ["HS2", "GATA1", "KLF1", "TAL1", "HNF4A"]
     for enh_name in single_enhancers:
         name = f"Single_{enh_name}"
-        print(f"Building {name}...")
-        result = build_pairwise_construct(
-            modules[enh_name],
-            None,
-            promoters["HBG1"],
-            filler
-        )
-        fasta_path = save_construct(name, result["sequence"])
+        if verbose:
+            print(f"Queueing {name}...")
+        specs.append((name, "pairwise", (enh_name, None, None)))
         manifest.append({
             "construct": name,
             "experiment": "pairwise_cooperativity",
             "enhancer1": enh_name,
             "enhancer2": None,
             "expected": "control",
-            "length": len(result["sequence"]),
-            "fasta": str(fasta_path.relative_to(EXPERIMENT_ROOT)),
-            "features": result["features"],
+            "length": None,
+            "sequence_hash": None,
+            "fasta": None,
+            "features": None,
         })
     
     # Pairs
@@ -348,23 +500,19 @@ def main():
     
     for enh1, enh2, expected in cooperativity_pairs:
         name = f"Pair_{enh1}_{enh2}"
-        print(f"Building {name} (expect {expected})...")
-        result = build_pairwise_construct(
-            modules[enh1],
-            modules[enh2],
-            promoters["HBG1"],
-            filler
-        )
-        fasta_path = save_construct(name, result["sequence"])
+        if verbose:
+            print(f"Queueing {name} (expect {expected})...")
+        specs.append((name, "pairwise", (enh1, enh2, None)))
         manifest.append({
             "construct": name,
             "experiment": "pairwise_cooperativity",
             "enhancer1": enh1,
             "enhancer2": enh2,
             "expected": expected,
-            "length": len(result["sequence"]),
-            "fasta": str(fasta_path.relative_to(EXPERIMENT_ROOT)),
-            "features": result["features"],
+            "length": None,
+            "sequence_hash": None,
+            "fasta": None,
+            "features": None,
         })
     
     # CTCF separator tests
@@ -375,15 +523,9 @@ def main():
     
     for enh1, enh2, label in ctcf_tests:
         name = f"CTCF_Sep_{enh1}_{enh2}"
-        print(f"Building {name}...")
-        result = build_pairwise_construct(
-            modules[enh1],
-            modules[enh2],
-            promoters["HBG1"],
-            filler,
-            separator=modules["CTCF"]
-        )
-        fasta_path = save_construct(name, result["sequence"])
+        if verbose:
+            print(f"Queueing {name}...")
+        specs.append((name, "pairwise", (enh1, enh2, "CTCF")))
         manifest.append({
             "construct": name,
             "experiment": "ctcf_separation",
@@ -391,12 +533,13 @@ def main():
             "enhancer2": enh2,
             "separator": "CTCF",
             "expected": label,
-            "length": len(result["sequence"]),
-            "fasta": str(fasta_path.relative_to(EXPERIMENT_ROOT)),
-            "features": result["features"],
+            "length": None,
+            "sequence_hash": None,
+            "fasta": None,
+            "features": None,
         })
     
-    print(f"✓ Built {len(single_enhancers) + len(cooperativity_pairs) + len(ctcf_tests)} cooperativity constructs")
+    print(f"✓ Queued {len(single_enhancers) + len(cooperativity_pairs) + len(ctcf_tests)} cooperativity constructs")
     
     # ========== PART 3: SHORT-RANGE SPACING (10 constructs) ==========
     print("\n" + "=" * 80)
@@ -407,27 +550,22 @@ def main():
     
     for spacing in spacings:
         name = f"Spacing_{spacing}bp_HS2_GATA1"
-        print(f"Building {name}...")
-        result = build_spacing_construct(
-            modules["HS2"],
-            modules["GATA1"],
-            promoters["HBG1"],
-            filler,
-            spacing
-        )
-        fasta_path = save_construct(name, result["sequence"])
+        if verbose:
+            print(f"Queueing {name}...")
+        specs.append((name, "spacing", ("HS2", "GATA1", spacing)))
         manifest.append({
             "construct": name,
             "experiment": "short_range_spacing",
             "enhancer1": "HS2",
             "enhancer2": "GATA1",
             "spacing": spacing,
-            "length": len(result["sequence"]),
-            "fasta": str(fasta_path.relative_to(EXPERIMENT_ROOT)),
-            "features": result["features"],
+            "length": None,
+            "sequence_hash": None,
+            "fasta": None,
+            "features": None,
         })
     
-    print(f"✓ Built {len(spacings)} spacing constructs")
+    print(f"✓ Queued {len(spacings)} spacing constructs")
     
     # ========== PART 4: ORIENTATION EFFECTS (16 constructs) ==========
     print("\n" + "=" * 80)
@@ -443,19 +581,17 @@ def main():
     
     orientations = [("+", "+"), ("+", "-"), ("-", "+"), ("-", "-")]
     
+    # Reverse complements are cached on each Module and pickled with it to the
+    # workers, so compute the distinct ones once here instead of once per worker
+    for enh_name in {name for enh1, enh2, _ in orientation_pairs for name in (enh1, enh2)}:
+        modules[enh_name].rc
+    
     for enh1, enh2, label in orientation_pairs:
         for or1, or2 in orientations:
             name = f"Orient_{enh1}{or1}_{enh2}{or2}"
-            print(f"Building {name}...")
-            result = build_orientation_construct(
-                modules[enh1],
-                modules[enh2],
-                promoters["HBG1"],
-                filler,
-                or1,
-                or2
-            )
-            fasta_path = save_construct(name, result["sequence"])
+            if verbose:
+                print(f"Queueing {name}...")
+            specs.append((name, "orientation", (enh1, enh2, or1, or2)))
             manifest.append({
                 "construct": name,
                 "experiment": "orientation_effects",
@@ -464,31 +600,55 @@ def main():
                 "orientation1": or1,
                 "orientation2": or2,
                 "expected": label,
-                "length": len(result["sequence"]),
-                "fasta": str(fasta_path.relative_to(EXPERIMENT_ROOT)),
-                "features": result["features"],
+                "length": None,
+                "sequence_hash": None,
+                "fasta": None,
+                "features": None,
             })
     
-    print(f"✓ Built {len(orientation_pairs) * len(orientations)} orientation constructs")
+    print(f"✓ Queued {len(orientation_pairs) * len(orientations)} orientation constructs")
     
-    # ========== SAVE MANIFEST ==========
+    # ========== BUILD AND SAVE MANIFEST ==========
+    # Constructs are independent, so build and write them across processes.
+    # Each manifest entry is streamed as one compact line as its result arrives;
+    # the file stays a valid JSON array.
     print("\n" + "=" * 80)
-    print(f"Saving manifest to {MANIFEST_PATH}...")
-    with open(MANIFEST_PATH, 'w') as f:
-        json.dump(manifest, f, indent=2)
+    print(f"Building {len(specs)} constructs...")
+    experiment_counts: Dict[str, int] = {}
+    with open(MANIFEST_PATH, 'w') as f, ProcessPoolExecutor(
+        max_workers=min(os.cpu_count() or 1, len(specs) or 1),
+        initializer=_init_worker,
+        initargs=(modules, promoters, filler),
+    ) as pool:
+        f.write("[\n")
+        for i, (entry, built) in enumerate(zip(manifest, pool.map(_build_one, specs, chunksize=4))):
+            entry.update(built)
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(entry, separators=(",", ":")))
+            experiment_counts[entry["experiment"]] = experiment_counts.get(entry["experiment"], 0) + 1
+        f.write("\n]\n")
+    print(f"✓ Built {len(specs)} constructs ({len({e['sequence_hash'] for e in manifest})} distinct sequences)")
+    print(f"✓ Manifest saved to {MANIFEST_PATH}")
     
     print("\n" + "=" * 80)
     print("SUMMARY")
     print("=" * 80)
     print(f"Total constructs built: {len(manifest)}")
-    print(f"  Cell-type specificity: {len([m for m in manifest if m['experiment'] == 'cell_type_specificity'])}")
-    print(f"  Pairwise cooperativity: {len([m for m in manifest if m['experiment'] == 'pairwise_cooperativity'])}")
-    print(f"  CTCF separation: {len([m for m in manifest if m['experiment'] == 'ctcf_separation'])}")
-    print(f"  Short-range spacing: {len([m for m in manifest if m['experiment'] == 'short_range_spacing'])}")
-    print(f"  Orientation effects: {len([m for m in manifest if m['experiment'] == 'orientation_effects'])}")
+    print(f"  Cell-type specificity: {experiment_counts.get('cell_type_specificity', 0)}")
+    print(f"  Pairwise cooperativity: {experiment_counts.get('pairwise_cooperativity', 0)}")
+    print(f"  CTCF separation: {experiment_counts.get('ctcf_separation', 0)}")
+    print(f"  Short-range spacing: {experiment_counts.get('short_range_spacing', 0)}")
+    print(f"  Orientation effects: {experiment_counts.get('orientation_effects', 0)}")
     print("\n✅ Ready for predictions!")
     print("=" * 80)
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build regulatory grammar test constructs")
+    parser.add_argument("--verbose", action="store_true", help="Print a line for every queued construct")
+    args = parser.parse_args()
+    
+    main(args.verbose)
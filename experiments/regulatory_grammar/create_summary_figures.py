@@ -3,18 +3,30 @@
 Create summary visualization comparing AlphaGenome predictions to biological expectations.
 """
 
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # File output only; no interactive backend needed
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import seaborn as sns
 from pathlib import Path
 
 # Setup
 RESULTS_DIR = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking/experiments/regulatory_grammar/results")
 sns.set_style("whitegrid")
-plt.rcParams['figure.dpi'] = 300
+# Figures are only written to disk, so resolution is set once at savefig time
+SAVE_DPI = 300
+INTERACTION_COLORS = {
+    "synergy": "#2ecc71",      # Green
+    "independent": "#95a5a6",   # Gray
+    "interference": "#e74c3c"   # Red
+}
 
 # Load cooperativity data
 df = pd.read_csv(RESULTS_DIR / "cooperativity_results.csv")
+# One color per pair, shared by the bar and scatter panels
+interaction_colors = df["interaction"].map(INTERACTION_COLORS).to_numpy()
 
 # Create comprehensive summary figure
 fig = plt.figure(figsize=(16, 10))
@@ -22,12 +34,7 @@ gs = fig.add_gridspec(3, 2, hspace=0.3, wspace=0.3)
 
 # 1. Additivity scores sorted
 ax1 = fig.add_subplot(gs[0, :])
-colors = df["interaction"].map({
-    "synergy": "#2ecc71",      # Green
-    "independent": "#95a5a6",   # Gray
-    "interference": "#e74c3c"   # Red
-})
-bars = ax1.bar(range(len(df)), df["additivity_score"], color=colors, alpha=0.8, edgecolor='black', linewidth=1.5)
+bars = ax1.bar(range(len(df)), df["additivity_score"], color=interaction_colors, alpha=0.8, edgecolor='black', linewidth=1.5)
 ax1.axhline(y=1.0, color='black', linestyle='--', linewidth=2, label='Perfect Additivity (1.0)')
 ax1.axhline(y=1.1, color='green', linestyle=':', linewidth=1.5, alpha=0.7, label='Synergy Threshold (1.1)')
 ax1.axhline(y=0.9, color='red', linestyle=':', linewidth=1.5, alpha=0.7, label='Interference Threshold (0.9)')
@@ -40,7 +47,7 @@ ax1.legend(loc='upper right', fontsize=10)
 ax1.grid(axis='y', alpha=0.3)
 
 # Add value labels on bars
-for i, (bar, row) in enumerate(zip(bars, df.itertuples())):
+for bar in bars:
     height = bar.get_height()
     label = f"{height:.2f}"
     ax1.text(bar.get_x() + bar.get_width()/2., height,
@@ -48,12 +55,7 @@ for i, (bar, row) in enumerate(zip(bars, df.itertuples())):
 
 # 2. Observed vs Expected scatter
 ax2 = fig.add_subplot(gs[1, 0])
-scatter_colors = df["interaction"].map({
-    "synergy": "#2ecc71",
-    "independent": "#95a5a6",
-    "interference": "#e74c3c"
-})
-ax2.scatter(df["expected"], df["observed"], c=scatter_colors, s=200, alpha=0.7, edgecolors='black', linewidth=1.5)
+ax2.scatter(df["expected"], df["observed"], c=interaction_colors, s=200, alpha=0.7, edgecolors='black', linewidth=1.5)
 max_val = max(df["expected"].max(), df["observed"].max()) * 1.1
 ax2.plot([0, max_val], [0, max_val], 'k--', linewidth=2, label='Perfect Additivity')
 ax2.set_xlabel("Expected (Sum of Singles)", fontsize=11, fontweight='bold')
@@ -62,12 +64,12 @@ ax2.set_title("Cooperativity: Observed vs Expected", fontsize=12, fontweight='bo
 ax2.legend(fontsize=9)
 ax2.grid(alpha=0.3)
 
-# Add labels for key points
-for _, row in df.iterrows():
-    if row['additivity_score'] > 1.1 or row['additivity_score'] < 0.7:
-        ax2.annotate(row['pair'], (row['expected'], row['observed']),
-                    fontsize=8, ha='right', va='bottom',
-                    bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.3))
+# Add labels for key points (filter first, then iterate only the highlighted pairs)
+highlight = df[(df["additivity_score"] > 1.1) | (df["additivity_score"] < 0.7)]
+for row in highlight.itertuples():
+    ax2.annotate(row.pair, (row.expected, row.observed),
+                fontsize=8, ha='right', va='bottom',
+                bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.3))
 
 # 3. Interaction type pie chart
 ax3 = fig.add_subplot(gs[1, 1])
@@ -94,10 +96,12 @@ ax4.scatter(x_pos, df_sorted["additivity_score"], s=200, label='AlphaGenome Pred
 ax4.scatter(x_pos, df_sorted["expected_numeric"], s=200, label='Biological Expectation',
            color='orange', alpha=0.7, edgecolors='black', linewidth=1.5, marker='s', zorder=3)
 
-# Connect with lines to show discrepancy
-for i, (idx, row) in enumerate(df_sorted.iterrows()):
-    ax4.plot([i, i], [row['additivity_score'], row['expected_numeric']], 
-            'k:', alpha=0.4, linewidth=1.5, zorder=1)
+# Connect with lines to show discrepancy (one collection instead of a line per pair)
+predicted = df_sorted["additivity_score"].to_numpy()
+expected_numeric = df_sorted["expected_numeric"].to_numpy()
+x = np.arange(len(df_sorted))
+segments = np.stack([np.column_stack([x, predicted]), np.column_stack([x, expected_numeric])], axis=1)
+ax4.add_collection(LineCollection(segments, colors='k', linestyles=':', alpha=0.4, linewidths=1.5, zorder=1))
 
 ax4.axhline(y=1.0, color='black', linestyle='--', linewidth=2, alpha=0.5, label='Additivity')
 ax4.axhline(y=1.1, color='green', linestyle=':', linewidth=1.5, alpha=0.3)
@@ -111,15 +115,15 @@ ax4.legend(fontsize=10, loc='upper left')
 ax4.grid(axis='y', alpha=0.3)
 
 # Highlight major mismatches
-for i, (idx, row) in enumerate(df_sorted.iterrows()):
-    diff = abs(row['additivity_score'] - row['expected_numeric'])
-    if diff > 0.3:  # Large mismatch
-        ax4.axvspan(i-0.4, i+0.4, alpha=0.15, color='red', zorder=0)
+mismatches = np.flatnonzero(np.abs(predicted - expected_numeric) > 0.3)  # Large mismatch
+for i in mismatches:
+    ax4.axvspan(i-0.4, i+0.4, alpha=0.15, color='red', zorder=0)
 
 plt.suptitle("Regulatory Grammar Analysis: AlphaGenome's Understanding of Transcriptional Cooperativity",
             fontsize=16, fontweight='bold', y=0.995)
 
-plt.savefig(RESULTS_DIR / "COMPREHENSIVE_SUMMARY.png", dpi=300, bbox_inches='tight')
+fig.savefig(RESULTS_DIR / "COMPREHENSIVE_SUMMARY.png", dpi=SAVE_DPI, bbox_inches='tight')
+plt.close(fig)
 print(f"✓ Saved comprehensive summary figure: {RESULTS_DIR / 'COMPREHENSIVE_SUMMARY.png'}")
 
 # Create spacing summary
@@ -164,7 +168,8 @@ plt.suptitle("Short-Range Spacing Analysis: HS2+GATA1 Distance Dependence",
             fontsize=14, fontweight='bold')
 
 plt.tight_layout()
-plt.savefig(RESULTS_DIR / "SPACING_SUMMARY.png", dpi=300, bbox_inches='tight')
+fig2.savefig(RESULTS_DIR / "SPACING_SUMMARY.png", dpi=SAVE_DPI, bbox_inches='tight')
+plt.close(fig2)
 print(f"✓ Saved spacing summary figure: {RESULTS_DIR / 'SPACING_SUMMARY.png'}")
 
 print("\n" + "="*80)
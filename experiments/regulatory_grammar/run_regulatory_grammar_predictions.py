@@ -7,21 +7,29 @@ Handles multiple cell types for cell-type specificity experiments.
 
 from __future__ import annotations
 
+import functools
+import hashlib
 import json
 import os
-import time
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import numpy as np
 from dotenv import load_dotenv
 
+# Helpers shared across experiments live one level up, in experiments/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from prediction_store import PredictionStore, read_fasta, write_stats_table
+from rate_limit import TokenBucket
+from track_median import fast_median
+
 try:
     from alphagenome.models import dna_client
 except ImportError:
     print("AlphaGenome package not available. Activate alphagenome-env before running.")
-    import sys
     sys.exit(1)
 
 # Load environment variables from .env file
@@ -34,6 +42,12 @@ MANIFEST_PATH = EXPERIMENT_ROOT / "construct_manifest.json"
 SEQUENCE_DIR = EXPERIMENT_ROOT / "sequences"
 OUTPUT_DIR = EXPERIMENT_ROOT / "alphagenome_outputs"
 LOG_DIR = EXPERIMENT_ROOT / "logs"
+PREDICTIONS_PATH = OUTPUT_DIR / "dnase_predictions.dat"
+PREDICTIONS_INDEX_PATH = OUTPUT_DIR / "dnase_predictions_index.csv"
+STATS_TABLE_PATH = EXPERIMENT_ROOT / "prediction_stats.csv"
+
+MAX_WORKERS = 4  # Concurrent in-flight API requests (--concurrency)
+API_QPS = 1.0  # Sustained request submissions per second (--qps); bursts up to MAX_WORKERS
 
 # Cell type mapping (EFO IDs)
 CELL_TYPES = {
@@ -56,11 +70,39 @@ if not API_KEY:
     raise ValueError("API key not configured")
 
 
+
+@functools.lru_cache(maxsize=None)
+def get_client(api_key: str):
+    # One gRPC channel (HTTP/2, multiplexed) shared by every worker thread
+    return dna_client.create(api_key)
+
+
+@functools.lru_cache(maxsize=None)
 def load_fasta(path: Path) -> str:
-    """Load sequence from FASTA file."""
-    with open(path, 'r') as f:
-        lines = [line.strip() for line in f if not line.startswith('>')]
-    return "".join(lines).upper()
+    """Load sequence from FASTA file (each file once; constructs can share one)."""
+    return read_fasta(path)
+
+
+def sequence_key(construct: Dict, sequence: str) -> str:
+    """Content hash of a construct's sequence, from the manifest when the builder recorded it."""
+    return construct.get("sequence_hash") or hashlib.blake2b(sequence.encode("ascii"), digest_size=16).hexdigest()
+
+
+def track_stats(values: np.ndarray) -> Dict[str, float]:
+    """
+    max/mean/std/median of one track. The mean is accumulated once in float64
+    and reused for the std (a single dot product of the deviations), instead of
+    np.std re-deriving it with its own extra sweeps and temporaries.
+    """
+    flat = values.ravel()
+    mean = flat.mean(dtype=np.float64)
+    dev = flat - mean
+    return {
+        "max": float(flat.max()),
+        "mean": float(mean),
+        "std": float(np.sqrt(np.dot(dev, dev) / flat.size)),
+        "median": fast_median(flat),
+    }
 
 
 def get_cell_types_for_construct(construct: Dict) -> List[str]:
@@ -75,8 +117,11 @@ def get_cell_types_for_construct(construct: Dict) -> List[str]:
         return ["K562"]
 
 
-def run_prediction(sequence: str, construct_name: str, cell_type: str, client) -> Dict:
+def run_prediction(sequence: str, construct_name: str, cell_type: str, client,
+                   limiter: Optional[TokenBucket] = None) -> Dict:
     """Run AlphaGenome prediction for a single construct and cell type."""
+    if limiter is not None:
+        limiter.acquire()
     print(f"  Predicting {construct_name} in {cell_type}...")
     
     try:
@@ -94,18 +139,19 @@ def run_prediction(sequence: str, construct_name: str, cell_type: str, client) -
         # Get predictions for specific cell type (should be first since we requested it)
         cell_predictions = dnase_predictions[:, 0] if len(dnase_predictions.shape) > 1 else dnase_predictions
         
-        # Also compute mean across all cell types for comparison
-        mean_predictions = np.mean(dnase_predictions, axis=1) if len(dnase_predictions.shape) > 1 else dnase_predictions
+        # Also compute mean across all cell types for comparison; with a single
+        # track (one ontology term requested) the mean is the track itself
+        single_track = dnase_predictions.ndim == 1 or dnase_predictions.shape[1] == 1
+        mean_predictions = cell_predictions if single_track else np.mean(dnase_predictions, axis=1)
         
         # Basic stats
-        stats = {
-            "max": float(np.max(cell_predictions)),
-            "mean": float(np.mean(cell_predictions)),
-            "std": float(np.std(cell_predictions)),
-            "median": float(np.median(cell_predictions)),
-            "global_max": float(np.max(mean_predictions)),
-            "global_mean": float(np.mean(mean_predictions)),
-        }
+        stats = track_stats(cell_predictions)
+        if single_track:
+            stats["global_max"] = stats["max"]
+            stats["global_mean"] = stats["mean"]
+        else:
+            stats["global_max"] = float(np.max(mean_predictions))
+            stats["global_mean"] = float(np.mean(mean_predictions))
         
         return {
             "success": True,
@@ -125,41 +171,16 @@ def run_prediction(sequence: str, construct_name: str, cell_type: str, client) -
         }
 
 
-def save_predictions(construct_name: str, cell_type: str, predictions: np.ndarray, 
-                     mean_predictions: np.ndarray, stats: Dict) -> None:
-    """Save predictions to disk."""
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # Filename with cell type
-    base_name = f"{construct_name}_{cell_type}"
-    
-    # Save numpy array
-    npy_path = OUTPUT_DIR / f"{base_name}_dnase.npy"
-    np.save(npy_path, predictions)
-    
-    # Save mean across all cell types
-    npy_mean_path = OUTPUT_DIR / f"{base_name}_dnase_mean.npy"
-    np.save(npy_mean_path, mean_predictions)
-    
-    # Save text format (first 100 values for inspection)
-    txt_path = OUTPUT_DIR / f"{base_name}_dnase.txt"
-    with open(txt_path, 'w') as f:
-        f.write(f"# DNase predictions for {construct_name} in {cell_type}\n")
-        f.write(f"# Total bins: {len(predictions)}\n")
-        f.write(f"# First 100 values:\n")
-        for i, val in enumerate(predictions[:100]):
-            f.write(f"{i}\t{val:.6f}\n")
-    
-    # Save stats
-    stats_path = OUTPUT_DIR / f"{base_name}_stats.txt"
-    with open(stats_path, 'w') as f:
-        f.write(f"Statistics for {construct_name} in {cell_type}\n")
-        f.write(f"{'=' * 60}\n")
-        for key, value in stats.items():
-            f.write(f"{key:20s}: {value:.6f}\n")
+def import_legacy(store: PredictionStore, key: tuple, legacy_files: set) -> bool:
+    """Move a prediction saved by older runs as per-construct .npy files into the store."""
+    base = f"{key[0]}_{key[1]}"
+    if not (f"{base}_dnase.npy" in legacy_files and f"{base}_dnase_mean.npy" in legacy_files):
+        return False
+    store.write(key, np.load(OUTPUT_DIR / f"{base}_dnase.npy"), np.load(OUTPUT_DIR / f"{base}_dnase_mean.npy"))
+    return True
 
 
-def main():
+def main(concurrency: int = MAX_WORKERS, qps: float = API_QPS):
     print("=" * 80)
     print("AlphaGenome Regulatory Grammar Predictions")
     print("=" * 80)
@@ -177,23 +198,43 @@ def main():
     
     # Initialize client
     print("\nInitializing AlphaGenome client...")
-    client = dna_client.create(API_KEY)
+    client = get_client(API_KEY)
+    
+    # Work list built once: (construct, FASTA path, cell types), shared by the store layout,
+    # the prediction count and the loop below
+    work = [
+        (c, EXPERIMENT_ROOT / c["fasta"], get_cell_types_for_construct(c)) for c in manifest
+    ]
+    
+    # One row per (construct, cell type) in the consolidated store: the
+    # cell-type track and the mean across cell types
+    store = PredictionStore(
+        PREDICTIONS_PATH, PREDICTIONS_INDEX_PATH,
+        [(c["construct"], cell_type) for c, _, cell_types in work for cell_type in cell_types],
+        key_columns=("construct", "cell_type"), tracks=2,
+    )
+    # Files left by older runs, listed once rather than stat'ed per construct
+    legacy_files = set(os.listdir(OUTPUT_DIR)) if OUTPUT_DIR.exists() else set()
     
     # Track results
-    results_summary = []
-    total_predictions = sum(len(get_cell_types_for_construct(c)) for c in manifest)
+    total_predictions = sum(len(cell_types) for _, _, cell_types in work)
     completed = 0
     failed = 0
     
     print(f"\nTotal predictions to run: {total_predictions}")
-    print(f"Estimated time: ~{total_predictions * 1.5:.0f} minutes")
+    print(f"Estimated time: ~{total_predictions * 1.5 / concurrency:.0f} minutes")
     print("=" * 80)
     
-    # Process each construct
-    for i, construct in enumerate(manifest, 1):
+    # Load sequences and collect the predictions still to run, in manifest order.
+    # Constructs with identical sequences (e.g. Pair_HS2_GATA1 and Spacing_5000bp_HS2_GATA1)
+    # are predicted once per cell type and the result is copied to the others.
+    jobs = []
+    by_content: Dict[tuple, tuple] = {}  # (sequence hash, cell type) -> first store key
+    duplicates: Dict[tuple, List[tuple]] = {}  # queued store key -> keys waiting on its result
+    copied = 0
+    for i, (construct, fasta_path, cell_types_to_run) in enumerate(work, 1):
         construct_name = construct["construct"]
         experiment = construct["experiment"]
-        fasta_path = EXPERIMENT_ROOT / construct["fasta"]
         
         print(f"\n[{i}/{len(manifest)}] {construct_name}")
         print(f"  Experiment: {experiment}")
@@ -207,55 +248,84 @@ def main():
             failed += 1
             continue
         
-        # Get cell types to test
-        cell_types_to_run = get_cell_types_for_construct(construct)
         print(f"  Cell types: {', '.join(cell_types_to_run)}")
         
-        # Run predictions for each cell type
+        content_key = sequence_key(construct, sequence)
         for cell_type in cell_types_to_run:
             # Check if already exists
-            output_file = OUTPUT_DIR / f"{construct_name}_{cell_type}_dnase.npy"
-            if output_file.exists():
+            key = (construct_name, cell_type)
+            source = by_content.setdefault((content_key, cell_type), key)
+            if key in store or import_legacy(store, key, legacy_files):
                 print(f"  ⚠️  {cell_type}: Already exists, skipping...")
                 completed += 1
                 continue
+            if source != key:
+                if source in store:
+                    store.copy(source, key)
+                    print(f"  ↳ {cell_type}: Same sequence as {source[0]}, copied")
+                    completed += 1
+                    copied += 1
+                else:
+                    print(f"  ↳ {cell_type}: Same sequence as {source[0]}, reusing its prediction")
+                    duplicates.setdefault(source, []).append(key)
+                continue
+            jobs.append((construct, cell_type, sequence))
+    
+    # Network-bound: keep a bounded number of requests in flight
+    constructs_by_name = {construct["construct"]: construct for construct in manifest}
+    print(f"\nSubmitting {len(jobs)} predictions ({concurrency} concurrent, {qps:g}/s)...")
+    limiter = TokenBucket(qps, capacity=concurrency)
+    summaries: Dict[tuple, Dict] = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(run_prediction, sequence, construct["construct"], cell_type, client, limiter): j
+            for j, (construct, cell_type, sequence) in enumerate(jobs)
+        }
+        
+        # Results are written from this thread only, so the store needs no locking
+        for future in as_completed(futures):
+            j = futures[future]
+            construct, cell_type, _ = jobs[j]
+            result = future.result()
             
-            # Run prediction
-            result = run_prediction(sequence, construct_name, cell_type, client)
-            
+            key = (construct["construct"], cell_type)
             if result["success"]:
-                # Save predictions
-                save_predictions(
-                    construct_name,
-                    cell_type,
-                    result["predictions"],
-                    result["mean_predictions"],
-                    result["stats"]
-                )
+                store.write(key, result["predictions"], result["mean_predictions"])
                 
                 # Record summary
-                results_summary.append({
-                    "construct": construct_name,
+                summaries[key] = {
+                    "construct": construct["construct"],
                     "cell_type": cell_type,
-                    "experiment": experiment,
+                    "experiment": construct["experiment"],
                     "stats": result["stats"],
                     "timestamp": datetime.now().isoformat(),
-                })
+                }
                 
                 completed += 1
-                print(f"    ✓ Max DNase: {result['stats']['max']:.4f}")
-                print(f"    ✓ Mean DNase: {result['stats']['mean']:.6f}")
+                print(f"    ✓ {construct['construct']} ({cell_type}) max DNase: {result['stats']['max']:.4f}, "
+                      f"mean DNase: {result['stats']['mean']:.6f}")
+                
+                # Identical constructs share this prediction
+                for duplicate in duplicates.get(key, []):
+                    store.copy(key, duplicate)
+                    summaries[duplicate] = {
+                        **summaries[key],
+                        "construct": duplicate[0],
+                        "experiment": constructs_by_name[duplicate[0]]["experiment"],
+                    }
+                    completed += 1
+                    copied += 1
             else:
-                failed += 1
-            
-            # Rate limiting
-            time.sleep(1)
+                failed += len(duplicates.get(key, [])) + 1
+    results_summary = [summaries[key] for key in store.rows if key in summaries]
     
     # Save results summary
     summary_path = EXPERIMENT_ROOT / "prediction_summary.json"
     with open(summary_path, 'w') as f:
         json.dump(results_summary, f, indent=2)
     
+    stats_table = write_stats_table(store, STATS_TABLE_PATH)
+    
     # Final report
     print("\n" + "=" * 80)
     print("PREDICTION SUMMARY")
@@ -263,12 +333,23 @@ def main():
     print(f"Total constructs: {len(manifest)}")
     print(f"Total predictions: {total_predictions}")
     print(f"Completed: {completed}")
+    print(f"  Reused from identical sequences: {copied}")
     print(f"Failed: {failed}")
     print(f"Success rate: {100 * completed / total_predictions:.1f}%")
     print(f"\nEnd time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Results saved to: {EXPERIMENT_ROOT}")
+    print(f"Stats table: {stats_table}")
     print("=" * 80)
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Run AlphaGenome predictions on regulatory grammar constructs")
+    parser.add_argument("--concurrency", type=int, default=MAX_WORKERS,
+                        help=f"Concurrent in-flight API requests (default: {MAX_WORKERS})")
+    parser.add_argument("--qps", type=float, default=API_QPS,
+                        help=f"Sustained API requests per second (default: {API_QPS:g})")
+    args = parser.parse_args()
+    
+    main(args.concurrency, args.qps)
@@ -7,14 +7,45 @@ by querying ENCODE cCREs (candidate cis-regulatory elements).
 
 Usage:
     python download_encode_enhancers.py --tf GATA1 --cell-type K562 --output enhancers/
+    python download_encode_enhancers.py --tf GATA1,KLF1,TAL1 --cell-type K562
 """
 
 import argparse
+import functools
 import requests
-import json
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
 
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
+
+ENCODE_URL = "https://www.encodeproject.org"
+# On-disk cache of ENCODE search responses (used when requests-cache is installed)
+ENCODE_CACHE_PATH = Path(__file__).resolve().parent / ".encode_cache"
+ENCODE_CACHE_EXPIRY = timedelta(days=7)
+MAX_WORKERS = 8  # Concurrent ENCODE searches when several TFs are requested
+
+
+@functools.lru_cache(maxsize=None)
+def get_session():
+    """
+    Keep-alive session for ENCODE requests, backed by a SQLite response cache
+    if available. Created on first use, so runs that never query ENCODE (e.g.
+    --template) do not create the cache file.
+    """
+    if requests_cache is not None:
+        session = requests_cache.CachedSession(
+            cache_name=str(ENCODE_CACHE_PATH), backend="sqlite", expire_after=ENCODE_CACHE_EXPIRY
+        )
+    else:
+        session = requests.Session()
+    session.headers["Accept"] = "application/json"
+    return session
+
 
 def query_encode_screen(tf_name, cell_type="K562", element_type="dELS"):
     """
@@ -59,17 +90,14 @@ def query_encode_screen(tf_name, cell_type="K562", element_type="dELS"):
     return []
 
 
-def download_chipseq_peaks(tf_name, cell_type="K562"):
+@functools.lru_cache(maxsize=None)
+def search_chipseq_experiments(tf_name, cell_type="K562"):
     """
-    Download ChIP-seq peaks from ENCODE
+    ENCODE search results for released TF ChIP-seq experiments
     
-    Returns URL to download BED file
+    Repeated calls in one process are answered from memory; across runs the
+    session's response cache (if requests-cache is installed) avoids the request.
     """
-    
-    # ENCODE portal API
-    base_url = "https://www.encodeproject.org"
-    search_url = f"{base_url}/search/"
-    
     params = {
         "type": "Experiment",
         "assay_title": "TF ChIP-seq",
@@ -78,12 +106,24 @@ def download_chipseq_peaks(tf_name, cell_type="K562"):
         "status": "released",
         "format": "json"
     }
+    response = get_session().get(f"{ENCODE_URL}/search/", params=params)
+    return response.json()
+
+
+def download_chipseq_peaks(tf_name, cell_type="K562"):
+    """
+    Download ChIP-seq peaks from ENCODE
+    
+    Returns URL to download BED file
+    """
+    
+    # ENCODE portal API
+    base_url = ENCODE_URL
     
     print(f"\nSearching ENCODE for {tf_name} ChIP-seq in {cell_type}...")
     
     try:
-        response = requests.get(search_url, params=params)
-        data = response.json()
+        data = search_chipseq_experiments(tf_name, cell_type)
         
         if '@graph' in data and len(data['@graph']) > 0:
             experiments = data['@graph']
@@ -224,7 +264,7 @@ def generate_bed_template(output_file="enhancer_coordinates_template.bed"):
 
 def main():
     parser = argparse.ArgumentParser(description="Download TF enhancer coordinates")
-    parser.add_argument("--tf", help="Transcription factor name")
+    parser.add_argument("--tf", help="Transcription factor name(s), comma-separated (e.g. GATA1,KLF1,TAL1)")
     parser.add_argument("--cell-type", default="K562", help="Cell type")
     parser.add_argument("--output", default="enhancers/", help="Output directory")
     parser.add_argument("--template", action="store_true", help="Generate template BED file")
@@ -299,8 +339,19 @@ def main():
     else:
         # Query for specific TF
         if args.tf:
-            download_chipseq_peaks(args.tf, args.cell_type)
-            query_encode_screen(args.tf, args.cell_type)
+            tf_names = [tf.strip() for tf in args.tf.split(",") if tf.strip()]
+            if len(tf_names) > 1:
+                # Fire the ENCODE searches concurrently on the shared session; the loop
+                # below then reports them in order from search_chipseq_experiments' cache
+                # (failed searches are simply retried and reported there). The session is
+                # opened first so the workers share one instead of racing to create it.
+                get_session()
+                with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(tf_names))) as executor:
+                    for tf_name in tf_names:
+                        executor.submit(search_chipseq_experiments, tf_name, args.cell_type)
+            for tf_name in tf_names:
+                download_chipseq_peaks(tf_name, args.cell_type)
+                query_encode_screen(tf_name, args.cell_type)
         else:
             print("Error: Provide --tf or use --template")
             print("Example: python download_encode_enhancers.py --template")
@@ -1,20 +1,33 @@
 #!/usr/bin/env python3
 """Analyze AlphaGenome structural-variant enhancer constructs."""
 
+import functools
 import json
+import sys
 from pathlib import Path
 from typing import Dict, List
 
+import matplotlib
+matplotlib.use("Agg")  # File output only; no interactive backend needed
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
 import seaborn as sns
 
+# Helpers shared across experiments live one level up, in experiments/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from prediction_store import open_prediction_store
+from track_plotting import downsample_track
+
 ROOT = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking")
 EXPERIMENT_ROOT = ROOT / "experiments" / "structural_variants"
 PREDICTION_DIR = EXPERIMENT_ROOT / "alphagenome_outputs"
 RESULTS_DIR = EXPERIMENT_ROOT / "results"
 MANIFEST_PATH = EXPERIMENT_ROOT / "construct_manifest.json"
+PREDICTIONS_PATH = PREDICTION_DIR / "dnase_predictions.dat"
+PREDICTIONS_INDEX_PATH = PREDICTION_DIR / "dnase_predictions_index.csv"
 
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -23,6 +36,9 @@ plt.rcParams.update({
     "figure.dpi": 150,
     "savefig.dpi": 300,
     "font.size": 10,
+    # Long track paths: simplify aggressively and let Agg render them in chunks
+    "path.simplify_threshold": 1.0,
+    "agg.path.chunksize": 10_000,
 })
 
 PROMOTER_WINDOW = 5_000
@@ -37,114 +53,190 @@ def load_manifest() -> List[Dict]:
     return manifest
 
 
+@functools.lru_cache(maxsize=None)
+def load_prediction_store():
+    """
+    Open the consolidated (rows, 1, bins) prediction memmap written by the
+    prediction runner, with its construct -> row index.
+    """
+    return open_prediction_store(PREDICTIONS_PATH, PREDICTIONS_INDEX_PATH)
+
+
 def load_predictions(construct: str) -> np.ndarray:
+    store, rows = load_prediction_store()
+    if construct in rows:
+        # float16 rows are widened once here so reductions and plots run in float32
+        return store[rows[construct], 0].astype(np.float32, copy=False)
+    # Older runs saved one .npy per construct; memory-mapped so pages are read on demand
     npy_path = PREDICTION_DIR / f"{construct}_dnase.npy"
-    data = np.load(npy_path)
+    data = np.load(npy_path, mmap_mode="r")
     if data.ndim > 1:
         data = data.squeeze()
     return data
 
 
-def clamp_interval(start: int, end: int, length: int) -> slice:
-    start = max(start, 0)
-    end = min(end, length)
-    return slice(start, end)
-
-
-def compute_metrics(preds: np.ndarray, features: List[Dict]) -> Dict:
-    length = len(preds)
-    enhancer_feats = [f for f in features if f.get("label") == "hs2_block"]
-    promoter_feat = next((f for f in features if f.get("label") == "promoter"), None)
-    anchor_feats = sorted(
-        (f for f in features if f.get("label") == "ctcf_anchor"),
-        key=lambda item: item["start"],
+def feature_table(manifest: List[Dict]) -> pd.DataFrame:
+    """
+    Every manifest feature as one row of a long table (track = manifest
+    position), with label as a categorical column.
+    """
+    rows = [{"track": k, **feat} for k, entry in enumerate(manifest) for feat in entry.get("features", [])]
+    table = pd.DataFrame(rows).reindex(
+        columns=["track", "label", "start", "end", "orientation", "copies"]
     )
-
-    metrics: Dict[str, float] = {}
-
-    if enhancer_feats:
-        enh = enhancer_feats[0]
-        region = preds[enh["start"]:enh["end"]]
-        metrics["enhancer_start"] = enh["start"]
-        metrics["enhancer_end"] = enh["end"]
-        metrics["enhancer_copies"] = enh.get("copies", np.nan)
-        metrics["enhancer_max"] = float(region.max())
-        metrics["enhancer_mean"] = float(region.mean())
-        metrics["enhancer_auc"] = float(np.trapz(region))
-    else:
-        metrics.update({
-            "enhancer_start": np.nan,
-            "enhancer_end": np.nan,
-            "enhancer_copies": 0,
-            "enhancer_max": np.nan,
-            "enhancer_mean": np.nan,
-            "enhancer_auc": np.nan,
-        })
-
-    if promoter_feat:
-        center = (promoter_feat["start"] + promoter_feat["end"]) // 2
-        window = clamp_interval(center - PROMOTER_WINDOW, center + PROMOTER_WINDOW, length)
-        metrics["promoter_start"] = promoter_feat["start"]
-        metrics["promoter_end"] = promoter_feat["end"]
-        metrics["promoter_mean"] = float(preds[window].mean())
-        metrics["promoter_max"] = float(preds[window].max())
-    else:
-        metrics.update({
-            "promoter_start": np.nan,
-            "promoter_end": np.nan,
-            "promoter_mean": np.nan,
-            "promoter_max": np.nan,
-        })
-
-    if len(anchor_feats) >= 2:
-        left, right = anchor_feats[0], anchor_feats[-1]
-        metrics["loop_span_start"] = left["start"]
-        metrics["loop_span_end"] = right["end"]
-        span = preds[left["start"]:right["end"]]
-        metrics["loop_span_mean"] = float(span.mean())
-    else:
-        metrics.update({
-            "loop_span_start": np.nan,
-            "loop_span_end": np.nan,
-            "loop_span_mean": np.nan,
-        })
-
-    for idx, anchor in enumerate(anchor_feats):
-        center = (anchor["start"] + anchor["end"]) // 2
-        window = clamp_interval(center - ANCHOR_WINDOW, center + ANCHOR_WINDOW, length)
-        metrics[f"anchor{idx+1}_mean"] = float(preds[window].mean())
-        metrics[f"anchor{idx+1}_max"] = float(preds[window].max())
-        metrics[f"anchor{idx+1}_orientation"] = anchor.get("orientation", "")
-
-    metrics["global_mean"] = float(preds.mean())
-    metrics["global_max"] = float(preds.max())
-    metrics["global_std"] = float(preds.std())
-
-    return metrics
+    table["label"] = table["label"].astype("category")
+    return table
+
+
+def clamp_windows(track: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                  lengths: np.ndarray, offsets: np.ndarray) -> tuple:
+    """Clamp per-track [start, end) windows to each track and shift them to flat coordinates."""
+    track = np.asarray(track, dtype=np.int64)
+    starts = np.maximum(np.asarray(starts, dtype=np.int64), 0)
+    ends = np.minimum(np.asarray(ends, dtype=np.int64), lengths[track])
+    return offsets[track] + starts, offsets[track] + ends
+
+
+def window_reductions(flat: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> tuple:
+    """
+    Aligned (maxes, means, sums) of flat[start:end] for every window, in
+    float64 from one reduceat call per reduction. flat must extend past the
+    last window end; empty windows come back as NaN.
+    """
+    empty = ends <= starts
+    # Empty windows (e.g. features past the track end) get a dummy in-range window
+    bounds = np.column_stack([np.where(empty, 0, starts), np.where(empty, 1, ends)]).ravel()
+    sums = np.add.reduceat(flat, bounds, dtype=np.float64)[::2]
+    maxes = np.maximum.reduceat(flat, bounds)[::2].astype(np.float64)
+    sums[empty] = np.nan
+    maxes[empty] = np.nan
+    return maxes, sums / np.maximum(ends - starts, 1), sums
+
+
+def compute_metrics(tracks: List[np.ndarray], features: pd.DataFrame) -> pd.DataFrame:
+    """
+    Metrics for many constructs at once, one row per track. Tracks are
+    concatenated into one flat buffer with CSR-style offsets; feature windows
+    are built column-wise from the long feature table (see feature_table) and
+    every window sum/maximum comes from a single reduceat pass.
+    """
+    n_tracks = len(tracks)
+    lengths = np.array([track.size for track in tracks])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    # One spare element so a window ending at the last bin is still a valid reduceat index
+    flat = np.empty(lengths.sum() + 1, dtype=np.result_type(*tracks))
+    for offset, track in zip(offsets, tracks):
+        flat[offset:offset + track.size] = track.ravel()
+    flat[-1] = 0
+
+    # First enhancer block and promoter per track; anchors ordered by start within each track
+    enhancers = features[features["label"] == "hs2_block"].drop_duplicates("track").set_index("track")
+    promoters = features[features["label"] == "promoter"].drop_duplicates("track").set_index("track")
+    anchors = features[features["label"] == "ctcf_anchor"].sort_values(["track", "start"], kind="stable")
+    anchor_number = anchors.groupby("track").cumcount().to_numpy()
+    anchor_counts = anchors.groupby("track").size()
+    looped = anchor_counts.index[anchor_counts >= 2]
+    loop_left = anchors.drop_duplicates("track").set_index("track").loc[looped]
+    loop_right = anchors.drop_duplicates("track", keep="last").set_index("track").loc[looped]
+
+    promoter_centers = (promoters["start"] + promoters["end"]).to_numpy() // 2
+    anchor_centers = (anchors["start"] + anchors["end"]).to_numpy() // 2
+    windows = {
+        "enhancer": (enhancers.index, enhancers["start"], enhancers["end"]),
+        "promoter": (promoters.index, promoter_centers - PROMOTER_WINDOW, promoter_centers + PROMOTER_WINDOW),
+        "loop_span": (looped, loop_left["start"], loop_right["end"]),
+        "anchor": (anchors["track"], anchor_centers - ANCHOR_WINDOW, anchor_centers + ANCHOR_WINDOW),
+        "global": (np.arange(n_tracks), np.zeros(n_tracks), lengths),
+    }
+
+    # Every window of every construct in a single reduction pass, split back per window kind
+    bounds = {key: clamp_windows(*window, lengths, offsets) for key, window in windows.items()}
+    starts = np.concatenate([start for start, _ in bounds.values()])
+    ends = np.concatenate([end for _, end in bounds.values()])
+    maxes, means, sums = window_reductions(flat, starts, ends)
+    splits = np.cumsum([len(start) for start, _ in bounds.values()])[:-1]
+    maxes, means, sums = (dict(zip(bounds, np.split(values, splits))) for values in (maxes, means, sums))
+
+    # Trapezoid area with unit spacing: sum minus half of each endpoint
+    # (empty windows already have NaN sums; their indices only need to stay in range)
+    first, end = bounds["enhancer"]
+    first = np.minimum(first, flat.size - 1)
+    edges = flat[first].astype(np.float64) + flat[np.clip(end - 1, first, flat.size - 1)]
+    enhancer_auc = sums["enhancer"] - 0.5 * edges
+
+    # Whole-track std from deviations around the global means
+    dev = flat[:-1] - np.repeat(means["global"], lengths)
+    dev *= dev
+    global_std = np.sqrt(np.add.reduceat(dev, offsets) / lengths)
+
+    index = pd.RangeIndex(n_tracks)
+
+    def per_track(values, track_index) -> pd.Series:
+        # Aligned to every track; tracks without the feature get NaN
+        return pd.Series(values, index=track_index).reindex(index)
+
+    columns = {
+        "enhancer_start": enhancers["start"].reindex(index),
+        "enhancer_end": enhancers["end"].reindex(index),
+        "enhancer_copies": pd.to_numeric(enhancers["copies"], downcast="integer").reindex(index, fill_value=0),
+        "enhancer_max": per_track(maxes["enhancer"], enhancers.index),
+        "enhancer_mean": per_track(means["enhancer"], enhancers.index),
+        "enhancer_auc": per_track(enhancer_auc, enhancers.index),
+        "promoter_start": promoters["start"].reindex(index),
+        "promoter_end": promoters["end"].reindex(index),
+        "promoter_mean": per_track(means["promoter"], promoters.index),
+        "promoter_max": per_track(maxes["promoter"], promoters.index),
+        "loop_span_start": loop_left["start"].reindex(index),
+        "loop_span_end": loop_right["end"].reindex(index),
+        "loop_span_mean": per_track(means["loop_span"], looped),
+    }
+    anchor_tracks = anchors["track"].to_numpy()
+    orientations = anchors["orientation"].fillna("").to_numpy()
+    for number in range(int(anchor_counts.max()) if len(anchor_counts) else 0):
+        nth = anchor_number == number
+        columns[f"anchor{number+1}_mean"] = per_track(means["anchor"][nth], anchor_tracks[nth])
+        columns[f"anchor{number+1}_max"] = per_track(maxes["anchor"][nth], anchor_tracks[nth])
+        columns[f"anchor{number+1}_orientation"] = per_track(orientations[nth], anchor_tracks[nth])
+    columns["global_mean"] = means["global"]
+    columns["global_max"] = maxes["global"]
+    columns["global_std"] = global_std
+
+    return pd.DataFrame(columns, index=index)
 
 
 def add_feature_spans(ax, features: List[Dict]) -> None:
+    # One broken_barh collection per legend entry instead of an axvspan per feature
+    spans: Dict[tuple, List[tuple]] = {}
     for feat in features:
         start = feat["start"] / 1_000
         end = feat["end"] / 1_000
         label = feat.get("label")
         if label == "hs2_block":
-            ax.axvspan(start, end, color="red", alpha=0.15, label="Enhancer block")
+            style = ("Enhancer block", "red", 0.15)
         elif label == "promoter":
-            ax.axvspan(start, end, color="blue", alpha=0.15, label="Promoter")
+            style = ("Promoter", "blue", 0.15)
         elif label == "ctcf_anchor":
-            ax.axvspan(start, end, color="orange", alpha=0.1, label=f"CTCF ({feat.get('orientation','')})")
+            style = (f"CTCF ({feat.get('orientation','')})", "orange", 0.1)
+        else:
+            continue
+        spans.setdefault(style, []).append((start, end - start))
+    for (label, color, alpha), xranges in spans.items():
+        # Full axis height like axvspan: x in data units, y in axes units
+        ax.broken_barh(xranges, (0, 1), transform=ax.get_xaxis_transform(),
+                       color=color, alpha=alpha, label=label)
 
 
 def plot_tracks(predictions: Dict[str, np.ndarray], manifest: List[Dict]) -> Path:
     constructs = [entry["construct"] for entry in manifest]
-    fig, axes = plt.subplots(len(constructs), 1, figsize=(14, 10), sharex=True)
+    # Bare Figure on an Agg canvas: no pyplot figure manager or registry
+    fig = Figure(figsize=(14, 10))
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(len(constructs), 1, sharex=True)
 
     for ax, entry in zip(axes, manifest):
         name = entry["construct"]
-        preds = predictions[name]
-        x = np.arange(len(preds)) / 1_000  # kb
-        ax.plot(x, preds, color="black", linewidth=0.7)
+        x, preds = downsample_track(predictions[name])  # x in kb
+        ax.plot(x, preds, color="black", linewidth=0.7, rasterized=True)
         add_feature_spans(ax, entry.get("features", []))
         ax.set_ylabel("DNase")
         ax.set_title(name, loc="left", fontsize=9)
@@ -154,26 +246,26 @@ def plot_tracks(predictions: Dict[str, np.ndarray], manifest: List[Dict]) -> Pat
     handles, labels = axes[0].get_legend_handles_labels()
     if handles:
         axes[0].legend(handles, labels, fontsize=7, loc="upper right")
-    plt.tight_layout()
+    fig.tight_layout()
     out_path = RESULTS_DIR / "structural_variant_tracks.png"
-    plt.savefig(out_path, bbox_inches="tight")
-    plt.close(fig)
+    fig.savefig(out_path, bbox_inches="tight")
     return out_path
 
 
 def plot_metric_bars(df: pd.DataFrame) -> Path:
     fig, axes = plt.subplots(1, 3, figsize=(14, 4))
-    sns.barplot(data=df, x="construct", y="enhancer_max", ax=axes[0], color="#b2182b")
+    # One value per construct: no bootstrapped error bars to compute
+    sns.barplot(data=df, x="construct", y="enhancer_max", ax=axes[0], color="#b2182b", errorbar=None)
     axes[0].set_title("Enhancer Max")
     axes[0].set_xlabel("")
     axes[0].tick_params(axis="x", rotation=30)
 
-    sns.barplot(data=df, x="construct", y="promoter_mean", ax=axes[1], color="#2166ac")
+    sns.barplot(data=df, x="construct", y="promoter_mean", ax=axes[1], color="#2166ac", errorbar=None)
     axes[1].set_title("Promoter Mean (±5 kb)")
     axes[1].set_xlabel("")
     axes[1].tick_params(axis="x", rotation=30)
 
-    sns.barplot(data=df, x="construct", y="loop_span_mean", ax=axes[2], color="#4daf4a")
+    sns.barplot(data=df, x="construct", y="loop_span_mean", ax=axes[2], color="#4daf4a", errorbar=None)
     axes[2].set_title("Loop Span Mean")
     axes[2].set_xlabel("")
     axes[2].tick_params(axis="x", rotation=30)
@@ -191,22 +283,19 @@ def plot_metric_bars(df: pd.DataFrame) -> Path:
 
 def main() -> None:
     manifest = load_manifest()
-    predictions = {entry["construct"]: load_predictions(entry["construct"]) for entry in manifest}
+    # Manifest as a table once; features as one long table with a categorical label
+    constructs = pd.DataFrame(manifest).reindex(columns=["construct", "description"])
+    predictions = {name: load_predictions(name) for name in constructs["construct"]}
+
+    df = compute_metrics([predictions[name] for name in constructs["construct"]], feature_table(manifest))
+    df["construct"] = constructs["construct"]
+    df["description"] = constructs["description"].fillna("")
 
-    records = []
-    for entry in manifest:
-        name = entry["construct"]
-        metrics = compute_metrics(predictions[name], entry.get("features", []))
-        metrics.update({
-            "construct": name,
-            "description": entry.get("description", ""),
-        })
-        records.append(metrics)
-
-    df = pd.DataFrame(records)
     df_path = RESULTS_DIR / "structural_variant_metrics.csv"
     df.sort_values("construct").to_csv(df_path, index=False)
 
+    # Both figures render in-process: a worker would have to pickle every full-length
+    # track, and plot_tracks only draws the downsampled ones
     track_path = plot_tracks(predictions, manifest)
     metric_path = plot_metric_bars(df)
 
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 """Build structural-variant enhancer constructs for AlphaGenome tests."""
 
+import argparse
+import hashlib
 import json
-import re
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
 
 ROOT = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking")
 EXPERIMENT_ROOT = ROOT / "experiments" / "structural_variants"
@@ -23,42 +29,69 @@ ANCHOR_RIGHT_POS = 450_000
 RELOCATED_ENHANCER_POS = 800_000
 ENHANCER_COPIES = 10
 
-CTCF_MOTIF = "CCGCGTGGTGGCAGGAGC"  # High-affinity CTCF consensus (forward)
+CTCF_MOTIF = b"CCGCGTGGTGGCAGGAGC"  # High-affinity CTCF consensus (forward)
 CTCF_LEN = len(CTCF_MOTIF)
 
+# Built once at import; case is preserved, so soft-masked input complements correctly too
+_RC_TABLE = bytes.maketrans(b"ACGTacgt", b"TGCAtgca")
+_WHITESPACE = b" \t\r\n\x0b\x0c"
+
 
-def reverse_complement(sequence: str) -> str:
-    table = str.maketrans("ACGT", "TGCA")
-    return sequence.translate(table)[::-1]
+def reverse_complement(sequence: bytes) -> bytes:
+    return sequence.translate(_RC_TABLE)[::-1]
 
 
 CTCF_MOTIF_RC = reverse_complement(CTCF_MOTIF)
 
 
-def parse_xml_fasta(path: Path) -> str:
+def parse_xml_fasta(path: Path) -> bytes:
     """Extract DNA sequence from DAS-style XML FASTA file."""
-    content = path.read_text()
-    match = re.search(r"<DNA[^>]*>(.*?)</DNA>", content, re.DOTALL)
-    if not match:
+    content = path.read_bytes()
+    # Plain index scans for the first <DNA ...>...</DNA> block, no regex
+    tag = content.find(b"<DNA")
+    start = content.find(b">", tag) + 1 if tag != -1 else 0
+    end = content.find(b"</DNA>", start) if start else -1
+    if end == -1:
         raise ValueError(f"No <DNA> block found in {path}")
-    return "".join(match.group(1).split()).upper()
+    return content[start:end].translate(None, _WHITESPACE).upper()
 
 
-def load_filler(path: Path) -> str:
-    filler = path.read_text().strip().upper()
+def load_filler(path: Path) -> bytes:
+    filler = path.read_bytes().strip()
+    # Pre-normalized filler skips the upper-case copy; isupper() only scans
+    if not filler.isupper():
+        filler = filler.upper()
     if not filler:
         raise ValueError("Filler sequence is empty")
     return filler
 
 
 class SequenceBuilder:
-    """Incrementally assemble a construct while tracking annotations."""
-
-    def __init__(self, filler: str):
-        self._parts: List[str] = []
-        self._cursor = 0
+    """
+    Incrementally assemble a construct while tracking annotations.
+
+    Filler continues where the previous filler segment stopped, skipping over
+    inserted motifs and blocks, so gap contents depend on everything placed
+    before them; a single position-indexed filler pass would change the
+    sequences of existing constructs.
+    """
+
+    # Fixed attribute set: slot access instead of an instance __dict__ on every append
+    __slots__ = (
+        "_filler", "_filler_view", "_filler_arr", "_filler_idx",
+        "total_length", "_buf", "_buf_arr", "_cursor", "features", "events",
+    )
+
+    def __init__(self, filler: bytes, total_length: int):
         self._filler = filler
+        self._filler_view = memoryview(filler)
+        self._filler_arr = np.frombuffer(filler, dtype=np.uint8)
         self._filler_idx = 0
+        self.total_length = total_length
+        # Segments are written in place into one preallocated buffer; nothing is joined at the end
+        self._buf = bytearray(total_length)
+        self._buf_arr = np.frombuffer(self._buf, dtype=np.uint8)  # writable view for bulk filler copies
+        self._cursor = 0
         self.features: List[Dict] = []
         self.events: List[Dict] = []
 
@@ -66,34 +99,46 @@ class SequenceBuilder:
     def position(self) -> int:
         return self._cursor
 
-    def _take_filler(self, length: int) -> str:
-        if length <= 0:
-            return ""
-        chunks: List[str] = []
-        remaining = length
-        while remaining > 0:
-            chunk_len = min(len(self._filler) - self._filler_idx, remaining)
-            chunks.append(self._filler[self._filler_idx:self._filler_idx + chunk_len])
-            self._filler_idx = (self._filler_idx + chunk_len) % len(self._filler)
-            remaining -= chunk_len
-        return "".join(chunks)
-
-    def append_sequence(self, sequence: str, label: str = None, metadata: Dict = None) -> None:
-        if not sequence:
-            return
+    def _reserve(self, length: int) -> int:
         start = self._cursor
-        self._parts.append(sequence)
-        self._cursor += len(sequence)
+        end = start + length
+        if end > self.total_length:
+            raise ValueError(f"Construct exceeds target length ({end} > {self.total_length})")
+        self._cursor = end
+        return start
+
+    def _record_feature(self, start: int, label: Optional[str], metadata: Optional[Dict] = None) -> None:
         if label:
             feature = {"label": label, "start": start, "end": self._cursor}
             if metadata:
                 feature.update(metadata)
             self.features.append(feature)
 
+    def append_sequence(self, sequence: bytes, label: str = None, metadata: Dict = None) -> None:
+        if not sequence:
+            return
+        start = self._reserve(len(sequence))
+        self._buf[start:self._cursor] = sequence
+        self._record_feature(start, label, metadata)
+
     def append_filler(self, length: int, label: str = None, metadata: Dict = None) -> None:
         if length <= 0:
             return
-        self.append_sequence(self._take_filler(length), label=label, metadata=metadata)
+        start = self._reserve(length)
+        n = len(self._filler)
+        idx = self._filler_idx
+        self._filler_idx = (idx + length) % n
+        if idx + length <= n:
+            # Common case: one slice, no wrap-around
+            self._buf[start:self._cursor] = self._filler_view[idx:idx + length]
+        else:
+            # Wrap-around: tail, then every whole repeat in one broadcast copy, then head
+            pos = start + n - idx
+            self._buf[start:pos] = self._filler_view[idx:]
+            full, head = divmod(length - (n - idx), n)
+            self._buf_arr[pos:pos + full * n].reshape(full, n)[:] = self._filler_arr
+            self._buf[pos + full * n:self._cursor] = self._filler_view[:head]
+        self._record_feature(start, label, metadata)
 
     def append_to(self, target_position: int) -> None:
         if target_position < self._cursor:
@@ -104,11 +149,14 @@ class SequenceBuilder:
         motif = CTCF_MOTIF if orientation == "forward" else CTCF_MOTIF_RC
         self.append_sequence(motif, label="ctcf_anchor", metadata={"anchor": anchor_label, "orientation": orientation})
 
-    def append_enhancer_block(self, enhancer: str, copies: int, block_label: str) -> None:
-        block = enhancer * copies
-        self.append_sequence(block, label=block_label, metadata={"copies": copies, "unit_length": len(enhancer)})
+    def append_enhancer_block(self, enhancer: bytes, copies: int, block_label: str) -> None:
+        # All copies in one broadcast write into the buffer rather than via enhancer * copies
+        start = self._reserve(len(enhancer) * copies)
+        block = self._buf_arr[start:self._cursor].reshape(copies, len(enhancer))
+        block[:] = np.frombuffer(enhancer, dtype=np.uint8)
+        self._record_feature(start, block_label, {"copies": copies, "unit_length": len(enhancer)})
 
-    def append_promoter(self, promoter: str) -> None:
+    def append_promoter(self, promoter: bytes) -> None:
         self.append_sequence(promoter, label="promoter", metadata={"length": len(promoter)})
 
     def record_event(self, name: str, metadata: Dict) -> None:
@@ -116,11 +164,9 @@ class SequenceBuilder:
         event.update(metadata)
         self.events.append(event)
 
-    def finish(self, total_length: int) -> str:
-        if self._cursor > total_length:
-            raise ValueError(f"Construct exceeds target length ({self._cursor} > {total_length})")
-        self.append_filler(total_length - self._cursor)
-        return "".join(self._parts)
+    def finish(self) -> bytearray:
+        self.append_filler(self.total_length - self._cursor)
+        return self._buf
 
 
 def build_loop_intact(builder: SequenceBuilder, enhancer: str, promoter: str) -> None:
@@ -179,7 +225,7 @@ def build_loop_relocated(builder: SequenceBuilder, enhancer: str, promoter: str)
     builder.record_event("enhancer_relocated", {"to": RELOCATED_ENHANCER_POS, "copies": ENHANCER_COPIES})
 
 
-VariantBuilder = Callable[[SequenceBuilder, str, str], None]
+VariantBuilder = Callable[[SequenceBuilder, bytes, bytes], None]
 
 VARIANTS: List[Dict] = [
     {
@@ -205,40 +251,101 @@ VARIANTS: List[Dict] = [
 ]
 
 
-def save_fasta(name: str, sequence: str, directory: Path) -> Path:
+def fasta_path_for(name: str, directory: Path) -> Path:
+    return directory / f"{name}_construct.fa"
+
+
+def fasta_header(name: str, digest: str) -> bytes:
+    # The input digest rides along as a FASTA description, after the sequence ID
+    return f">{name}_construct inputs={digest}\n".encode("ascii")
+
+
+def input_digests(enhancer: bytes, promoter: bytes, filler: bytes) -> Dict[str, str]:
+    """
+    Per-variant content hash of everything a construct is built from: the
+    enhancer, promoter and filler sequences, this script (layouts and
+    positions), and the variant name.
+    """
+    shared = hashlib.blake2b(digest_size=16)
+    for part in (enhancer, promoter, filler, Path(__file__).read_bytes()):
+        shared.update(len(part).to_bytes(8, "little"))
+        shared.update(part)
+    digests = {}
+    for variant in VARIANTS:
+        h = shared.copy()
+        h.update(variant["name"].encode("utf-8"))
+        digests[variant["name"]] = h.hexdigest()
+    return digests
+
+
+def load_previous_manifest() -> Dict[str, Dict]:
+    if not MANIFEST_PATH.exists():
+        return {}
+    with open(MANIFEST_PATH, "r") as handle:
+        return {entry["construct"]: entry for entry in json.load(handle)}
+
+
+def is_up_to_date(name: str, digest: str) -> bool:
+    """True when the FASTA on disk was written from the same inputs (checked via its header line)."""
+    fasta_path = fasta_path_for(name, CONSTRUCT_DIR)
+    if not fasta_path.exists():
+        return False
+    with open(fasta_path, "rb") as handle:
+        return handle.readline() == fasta_header(name, digest)
+
+
+def save_fasta(name: str, sequence: bytes, directory: Path, digest: str) -> Path:
     directory.mkdir(parents=True, exist_ok=True)
-    fasta_path = directory / f"{name}_construct.fa"
-    with open(fasta_path, "w") as handle:
-        handle.write(f">{name}_construct\n")
-        handle.write(sequence + "\n")
+    fasta_path = fasta_path_for(name, directory)
+    with open(fasta_path, "wb") as handle:
+        handle.write(fasta_header(name, digest))
+        handle.write(sequence)
+        handle.write(b"\n")
     return fasta_path
 
 
-def main() -> None:
+def _build_one(variant: Dict, enhancer: bytes, promoter: bytes, filler: bytes) -> Tuple[str, bytes, List[Dict], List[Dict]]:
+    """Build one variant in a worker process; files are written by the parent."""
+    builder = SequenceBuilder(filler, CONSTRUCT_LENGTH)
+    variant_builder: VariantBuilder = variant["builder"]
+    variant_builder(builder, enhancer, promoter)
+    return variant["name"], builder.finish(), builder.features, builder.events
+
+
+def main(force: bool = False) -> None:
     enhancer = parse_xml_fasta(ENHANCER_FILE)
     promoter = parse_xml_fasta(PROMOTER_FILE)
     filler = load_filler(FILLER_FILE)
-
-    manifest: List[Dict] = []
-
-    for variant in VARIANTS:
-        print(f"Building {variant['name']}...")
-        builder = SequenceBuilder(filler)
-        variant_builder: VariantBuilder = variant["builder"]
-        variant_builder(builder, enhancer, promoter)
-        sequence = builder.finish(CONSTRUCT_LENGTH)
-        fasta_path = save_fasta(variant["name"], sequence, CONSTRUCT_DIR)
-        entry = {
-            "construct": variant["name"],
-            "description": variant["description"],
-            "length": len(sequence),
-            "fasta": str(fasta_path.relative_to(EXPERIMENT_ROOT)),
-            "features": builder.features,
-            "events": builder.events,
-        }
-        manifest.append(entry)
-        print(f"  ✓ Saved {fasta_path.name} ({len(sequence):,} bp)")
-
+    digests = input_digests(enhancer, promoter, filler)
+
+    # Constructs whose FASTA already matches their inputs keep their manifest entry
+    entries: Dict[str, Dict] = {}
+    if not force:
+        previous = load_previous_manifest()
+        for variant in VARIANTS:
+            name = variant["name"]
+            if name in previous and is_up_to_date(name, digests[name]):
+                entries[name] = {**previous[name], "description": variant["description"]}
+                print(f"  ✓ {fasta_path_for(name, CONSTRUCT_DIR).name} is up to date")
+    stale = [variant for variant in VARIANTS if variant["name"] not in entries]
+
+    print(f"Building {len(stale)} variants...")
+    # Variants share only immutable inputs, so each one builds in its own process
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(stale) or 1)) as pool:
+        results = pool.map(_build_one, stale, repeat(enhancer), repeat(promoter), repeat(filler))
+        for variant, (name, sequence, features, events) in zip(stale, results):
+            fasta_path = save_fasta(name, sequence, CONSTRUCT_DIR, digests[name])
+            entries[name] = {
+                "construct": name,
+                "description": variant["description"],
+                "length": len(sequence),
+                "fasta": str(fasta_path.relative_to(EXPERIMENT_ROOT)),
+                "features": features,
+                "events": events,
+            }
+            print(f"  ✓ Saved {fasta_path.name} ({len(sequence):,} bp)")
+
+    manifest = [entries[variant["name"]] for variant in VARIANTS]
     with open(MANIFEST_PATH, "w") as handle:
         json.dump(manifest, handle, indent=2)
     print(f"\nManifest written to {MANIFEST_PATH.relative_to(EXPERIMENT_ROOT)}")
@@ -246,4 +353,9 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build structural-variant constructs")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild every construct even if its FASTA matches the current inputs")
+    args = parser.parse_args()
+
+    main(args.force)
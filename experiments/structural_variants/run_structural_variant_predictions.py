@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 """Run AlphaGenome predictions for structural-variant constructs."""
 
+import functools
 import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
 import numpy as np
 from dotenv import load_dotenv
 
+# Helpers shared across experiments live one level up, in experiments/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from prediction_store import PredictionStore, read_fasta, write_stats_table
+from rate_limit import TokenBucket
+
 try:
     from alphagenome.models import dna_client
 except ImportError:
@@ -22,12 +30,23 @@ CONSTRUCT_DIR = EXPERIMENT_ROOT / "sequences"
 OUTPUT_DIR = EXPERIMENT_ROOT / "alphagenome_outputs"
 LOG_DIR = EXPERIMENT_ROOT / "logs"
 MANIFEST_PATH = EXPERIMENT_ROOT / "construct_manifest.json"
+PREDICTIONS_PATH = OUTPUT_DIR / "dnase_predictions.dat"
+PREDICTIONS_INDEX_PATH = OUTPUT_DIR / "dnase_predictions_index.csv"
+STATS_TABLE_PATH = EXPERIMENT_ROOT / "prediction_stats.csv"
+# On-disk dtype for new stores (half the bytes of float32; ~3 significant digits);
+# the store is widened to float32 if a track falls outside its range
+STORE_DTYPE = "float16"
 
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 ONTOLOGY_TERM = "EFO:0002067"  # K562
 
+MAX_WORKERS = 4  # Concurrent in-flight API requests (--concurrency)
+API_QPS = 1.0  # Sustained request submissions per second (--qps); bursts up to MAX_WORKERS
+MAX_ATTEMPTS = 3  # Tries per construct before it is logged as FAILED
+RETRY_BACKOFF = 2.0  # Seconds before the first retry; doubles on each further attempt
+
 
 def load_manifest() -> list:
     if MANIFEST_PATH.exists():
@@ -47,27 +66,37 @@ def load_manifest() -> list:
 
 
 def load_fasta_sequence(path: Path) -> str:
-    with open(path, "r") as handle:
-        lines = [line.strip() for line in handle if not line.startswith(">")]
-    return "".join(lines).upper()
-
-
-def save_outputs(predictions: np.ndarray, construct_name: str) -> None:
-    flat = predictions.reshape(-1)
-    np.save(OUTPUT_DIR / f"{construct_name}_dnase.npy", predictions)
-    np.savetxt(OUTPUT_DIR / f"{construct_name}_dnase.txt", flat, fmt="%.6f")
-    stats_path = OUTPUT_DIR / f"{construct_name}_stats.txt"
-    with open(stats_path, "w") as handle:
-        handle.write(f"Construct: {construct_name}\n")
-        handle.write(f"Timestamp: {datetime.now().isoformat()}\n")
-        handle.write(f"Array shape: {predictions.shape}\n")
-        handle.write(f"Min: {np.min(flat):.6f}\n")
-        handle.write(f"Max: {np.max(flat):.6f}\n")
-        handle.write(f"Mean: {np.mean(flat):.6f}\n")
-        handle.write(f"Std: {np.std(flat):.6f}\n")
-
-
-def main() -> None:
+    """Load a construct sequence, re-reading the file only after it has been modified."""
+    return _load_fasta_sequence(str(path), path.stat().st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=16)
+def _load_fasta_sequence(path: str, mtime_ns: int) -> str:
+    return read_fasta(Path(path))
+
+
+def predict_dnase(client, fasta_path: Path, limiter: TokenBucket) -> np.ndarray:
+    """Load one construct and predict its DNase track (runs in a worker thread)."""
+    sequence = load_fasta_sequence(fasta_path)
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire()
+        try:
+            output = client.predict_sequence(
+                sequence=sequence,
+                requested_outputs=[dna_client.OutputType.DNASE],
+                ontology_terms=[ONTOLOGY_TERM],
+            )
+        except Exception as exc:
+            if attempt + 1 == MAX_ATTEMPTS:
+                raise
+            delay = RETRY_BACKOFF * 2 ** attempt
+            print(f"Retrying {fasta_path.name} in {delay:g}s after error: {exc}")
+            time.sleep(delay)
+            continue
+        return output.dnase.values
+
+
+def main(concurrency: int = MAX_WORKERS, qps: float = API_QPS) -> None:
     load_dotenv()
     api_key = os.getenv("ALPHA_GENOME_API_KEY") or os.getenv("ALPHA_GENOME_KEY")
     if not api_key:
@@ -80,8 +109,11 @@ def main() -> None:
         sys.exit(1)
 
     client = dna_client.create(api_key)
+    store = PredictionStore(PREDICTIONS_PATH, PREDICTIONS_INDEX_PATH,
+                            [entry["construct"] for entry in manifest], dtype=STORE_DTYPE)
     log_file = LOG_DIR / f"predictions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
 
+    jobs = []
     for entry in manifest:
         name = entry["construct"]
         fasta_rel = entry.get("fasta")
@@ -89,28 +121,53 @@ def main() -> None:
         if not fasta_path.exists():
             print(f"Skipping {name}: FASTA not found ({fasta_path})")
             continue
-
-        print(f"Predicting {name} ({fasta_path.name})")
-        sequence = load_fasta_sequence(fasta_path)
-        try:
-            output = client.predict_sequence(
-                sequence=sequence,
-                requested_outputs=[dna_client.OutputType.DNASE],
-                ontology_terms=[ONTOLOGY_TERM],
-            )
-        except Exception as exc:
-            print(f"Prediction failed for {name}: {exc}")
+        jobs.append((name, fasta_path))
+
+    # Network-bound: keep a bounded number of requests in flight
+    print(f"Submitting {len(jobs)} predictions ({concurrency} concurrent, {qps:g}/s)")
+    limiter = TokenBucket(qps, capacity=concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {}
+        for name, fasta_path in jobs:
+            print(f"Predicting {name} ({fasta_path.name})")
+            futures[executor.submit(predict_dnase, client, fasta_path, limiter)] = name
+
+        # Outputs and the log are written from this thread as each prediction completes
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                dnase = future.result()
+            except Exception as exc:
+                print(f"Prediction failed for {name}: {exc}")
+                with open(log_file, "a") as handle:
+                    handle.write(f"{datetime.now().isoformat()} | FAILED | {name} | {exc}\n")
+                continue
+
+            try:
+                store.write(name, dnase)
+            except ValueError as exc:
+                # e.g. a track whose bin count differs from the store's
+                print(f"Could not store {name}: {exc}")
+                with open(log_file, "a") as handle:
+                    handle.write(f"{datetime.now().isoformat()} | FAILED | {name} | {exc}\n")
+                continue
             with open(log_file, "a") as handle:
-                handle.write(f"{datetime.now().isoformat()} | FAILED | {name} | {exc}\n")
-            continue
-
-        dnase = output.dnase.values
-        save_outputs(dnase, name)
-        with open(log_file, "a") as handle:
-            handle.write(f"{datetime.now().isoformat()} | SUCCESS | {name}\n")
+                handle.write(f"{datetime.now().isoformat()} | SUCCESS | {name}\n")
 
+    stats_path = write_stats_table(store, STATS_TABLE_PATH)
+    print(f"Predictions saved to: {PREDICTIONS_PATH}")
+    print(f"Stats table saved to: {stats_path}")
     print("Prediction sweep finished.")
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run AlphaGenome predictions for structural-variant constructs")
+    parser.add_argument("--concurrency", type=int, default=MAX_WORKERS,
+                        help=f"Concurrent in-flight API requests (default: {MAX_WORKERS})")
+    parser.add_argument("--qps", type=float, default=API_QPS,
+                        help=f"Sustained API requests per second (default: {API_QPS:g})")
+    args = parser.parse_args()
+
+    main(args.concurrency, args.qps)
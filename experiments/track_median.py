@@ -0,0 +1,17 @@
+"""Median helper shared by the experiment prediction and analysis scripts."""
+
+import numpy as np
+
+
+def fast_median(values: np.ndarray) -> float:
+    """
+    Exact median from a single O(n) partition around the middle element;
+    np.median partitions around two pivots, which is several times slower.
+    Like np.median, empty input or any NaN gives NaN.
+    """
+    flat = np.asarray(values).ravel()
+    if flat.size == 0 or np.isnan(flat).any():
+        return float("nan")
+    k = flat.size // 2
+    part = np.partition(flat, k)
+    return float(part[k] if flat.size % 2 else (part[:k].max() + part[k]) / 2)
@@ -0,0 +1,22 @@
+"""Plot helpers shared by the experiment analysis scripts."""
+
+import numpy as np
+
+TRACK_PLOT_POINTS = 2_000  # Track curves are drawn as a min/max envelope of about this many points
+
+
+def downsample_track(preds: np.ndarray, max_points: int = TRACK_PLOT_POINTS) -> tuple:
+    """
+    (x_kb, values) with at most ~max_points points: the minimum and maximum of
+    each block of bins, interleaved, so the drawn envelope keeps both peaks
+    and troughs at display resolution.
+    """
+    stride = max(1, 2 * len(preds) // max_points)
+    if stride == 1:
+        return np.arange(len(preds)) / 1_000, preds
+    starts = np.arange(0, len(preds), stride)
+    values = np.column_stack([
+        np.minimum.reduceat(preds, starts),
+        np.maximum.reduceat(preds, starts),
+    ]).ravel()
+    return np.repeat(starts, 2) / 1_000, values
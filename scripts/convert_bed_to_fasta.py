@@ -4,6 +4,9 @@ Convert BED files to FASTA format by fetching sequences from UCSC Genome Browser
 
 This script reads BED files containing genomic coordinates and retrieves the
 corresponding DNA sequences using the UCSC REST API, then writes them to FASTA format.
+If py2bit is installed and a local <genome>.2bit file is present in TWOBIT_DIR
+(e.g. https://hgdownload.soe.ucsc.edu/goldenPath/hg38/bigZips/hg38.2bit), regions
+are sliced from it instead, with no network requests or rate-limit delays.
 
 Usage:
     python convert_bed_to_fasta.py
@@ -14,20 +17,37 @@ corresponding .fa files with the sequences.
 
 from __future__ import annotations
 
+import csv
+import functools
+import gzip
+import http.client
 import time
 from pathlib import Path
 from typing import List, Tuple, Optional
-import urllib.request
-import urllib.error
 import json
 
+import pandas as pd
+
+try:
+    import py2bit
+except ImportError:
+    py2bit = None
+
 # Paths
 ROOT = Path("/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/AlphaGenome_EnhancerStacking")
 ENHANCER_DIR = ROOT / "sequences" / "enhancers"
 OUTPUT_DIR = ROOT / "sequences" / "enhancers"
 
 # UCSC API endpoint
-UCSC_API = "https://api.genome.ucsc.edu/getData/sequence"
+UCSC_HOST = "api.genome.ucsc.edu"
+UCSC_API = "/getData/sequence"
+UCSC_REQUEST_DELAY = 0.5  # Seconds between REST requests - be nice to UCSC servers
+
+# Local 2bit genomes (used when py2bit is installed)
+TWOBIT_DIR = Path.home() / ".cache" / "ucsc"
+
+BED_COLUMNS = ["chrom", "start", "end", "name"]
+BED_MAX_COLUMNS = 12  # BED12
 
 # RefSeq to UCSC chromosome mapping
 REFSEQ_TO_UCSC = {
@@ -58,28 +78,61 @@ REFSEQ_TO_UCSC = {
 }
 
 
-def parse_bed_line(line: str) -> Optional[Tuple[str, int, int, str]]:
-    """Parse a single BED line and return (chrom, start, end, name)."""
-    parts = line.strip().split('\t')
-    if len(parts) < 3:
-        return None
+def read_bed(bed_path: Path) -> pd.DataFrame:
+    """
+    Read the chrom/start/end/name columns of a BED file with pandas' C tokenizer.
     
-    chrom = parts[0]
+    Comment, track and malformed lines are dropped; rows without a name are
+    named after their coordinates (chrom:start-end).
+    """
     try:
-        start = int(parts[1])
-        end = int(parts[2])
-    except ValueError:
-        return None
+        # Naming all BED12 columns lets rows of any width up to 12 parse, with
+        # missing columns read as ""; track/browser lines land in chrom and
+        # fail the coordinate check below
+        bed = pd.read_csv(
+            bed_path, sep="\t", header=None, comment="#", dtype=str,
+            names=range(BED_MAX_COLUMNS), quoting=csv.QUOTE_NONE, keep_default_na=False,
+        )
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=BED_COLUMNS)
+    bed = bed.iloc[:, :len(BED_COLUMNS)].set_axis(BED_COLUMNS, axis=1)
     
-    # Get feature name if available, otherwise use coordinates
-    name = parts[3] if len(parts) > 3 else f"{chrom}:{start}-{end}"
+    start = pd.to_numeric(bed["start"], errors="coerce")
+    end = pd.to_numeric(bed["end"], errors="coerce")
+    valid = (start % 1 == 0) & (end % 1 == 0)  # False for missing or non-integer coordinates
+    bed = bed.assign(chrom=bed["chrom"].str.strip(), start=start, end=end)[valid]
+    bed = bed.astype({"start": "int64", "end": "int64"})
     
-    return (chrom, start, end, name)
+    name = bed["name"].str.strip()
+    coords = bed["chrom"] + ":" + bed["start"].astype(str) + "-" + bed["end"].astype(str)
+    return bed.assign(name=name.where(name != "", coords)).reset_index(drop=True)
+
+
+# One kept-alive HTTPS connection to UCSC, opened on first use
+_UCSC_CONNECTION: Optional[http.client.HTTPSConnection] = None
 
 
-def refseq_to_ucsc_chrom(refseq: str) -> Optional[str]:
-    """Convert RefSeq accession to UCSC chromosome name."""
-    return REFSEQ_TO_UCSC.get(refseq)
+def ucsc_get(path: str) -> bytes:
+    """GET a UCSC REST path over the shared connection, reconnecting once if it was dropped."""
+    global _UCSC_CONNECTION
+    for attempt in range(2):
+        if _UCSC_CONNECTION is None:
+            _UCSC_CONNECTION = http.client.HTTPSConnection(UCSC_HOST, timeout=10)
+        try:
+            _UCSC_CONNECTION.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            response = _UCSC_CONNECTION.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            _UCSC_CONNECTION.close()
+            _UCSC_CONNECTION = None
+            if attempt:
+                raise
+            continue
+        if response.status != 200:
+            raise http.client.HTTPException(f"HTTP {response.status} {response.reason}")
+        if response.getheader("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body
 
 
 def fetch_sequence_from_ucsc(chrom: str, start: int, end: int, genome: str = "hg38") -> Optional[str]:
@@ -95,17 +148,16 @@ def fetch_sequence_from_ucsc(chrom: str, start: int, end: int, genome: str = "hg
     Returns:
         DNA sequence as string, or None if request fails
     """
-    url = f"{UCSC_API}?genome={genome};chrom={chrom};start={start};end={end}"
+    path = f"{UCSC_API}?genome={genome};chrom={chrom};start={start};end={end}"
     
     try:
-        with urllib.request.urlopen(url, timeout=10) as response:
-            data = json.loads(response.read().decode())
-            if 'dna' in data:
-                return data['dna'].upper()
-            else:
-                print(f"  ⚠️  No sequence data in response for {chrom}:{start}-{end}")
-                return None
-    except urllib.error.URLError as e:
+        data = json.loads(ucsc_get(path).decode())
+        if 'dna' in data:
+            return data['dna'].upper()
+        else:
+            print(f"  ⚠️  No sequence data in response for {chrom}:{start}-{end}")
+            return None
+    except (http.client.HTTPException, OSError) as e:
         print(f"  ❌ Error fetching {chrom}:{start}-{end}: {e}")
         return None
     except json.JSONDecodeError as e:
@@ -113,6 +165,27 @@ def fetch_sequence_from_ucsc(chrom: str, start: int, end: int, genome: str = "hg
         return None
 
 
+@functools.lru_cache(maxsize=None)
+def open_twobit(genome: str = "hg38"):
+    """Open the local 2bit file for a genome once per process, or None if unavailable."""
+    path = TWOBIT_DIR / f"{genome}.2bit"
+    if py2bit is None or not path.exists():
+        return None
+    return py2bit.open(str(path))
+
+
+def fetch_sequence(chrom: str, start: int, end: int, genome: str = "hg38") -> Optional[str]:
+    """Slice a region from the local 2bit file, falling back to the UCSC REST API."""
+    twobit = open_twobit(genome)
+    if twobit is None:
+        return fetch_sequence_from_ucsc(chrom, start, end, genome)
+    try:
+        return twobit.sequence(chrom, start, end).upper()
+    except (RuntimeError, ValueError) as e:
+        print(f"  ❌ Error reading {chrom}:{start}-{end} from {genome}.2bit: {e}")
+        return None
+
+
 def process_bed_file(bed_path: Path, merge_strategy: str = "first", feature_filter: str = "enhancer") -> List[Tuple[str, str]]:
     """
     Process a BED file and fetch sequences for all regions.
@@ -132,22 +205,15 @@ def process_bed_file(bed_path: Path, merge_strategy: str = "first", feature_filt
     """
     print(f"\nProcessing {bed_path.name}...")
     
-    regions = []
-    filtered_regions = []
-    with open(bed_path, 'r') as f:
-        for line in f:
-            if line.startswith('#') or not line.strip():
-                continue
-            
-            parsed = parse_bed_line(line)
-            if parsed:
-                regions.append(parsed)
-                # Filter by feature type
-                chrom, start, end, name = parsed
-                if feature_filter is None or feature_filter.lower() in name.lower():
-                    filtered_regions.append(parsed)
+    regions = read_bed(bed_path)
+    # Filter by feature type
+    if feature_filter is None:
+        filtered_regions = regions
+    else:
+        names = regions["name"].str.lower()
+        filtered_regions = regions[names.str.contains(feature_filter.lower(), regex=False)]
     
-    if not regions:
+    if regions.empty:
         print(f"  ⚠️  No valid regions found in {bed_path.name}")
         return []
     
@@ -164,12 +230,13 @@ def process_bed_file(bed_path: Path, merge_strategy: str = "first", feature_filt
             # No exact matches for "enhancer", try broader match
             print(f"  ⚠️  No regions with '{feature_filter}' label found")
             print(f"  Using 'transcriptional_cis_regulatory_region' as fallback (excluding silencers)")
-            for parsed in regions:
-                chrom, start, end, name = parsed
-                # Accept transcriptional regulatory regions but NOT silencers
-                if "transcriptional_cis_regulatory_region" in name.lower() or ("regulatory" in name.lower() and "silencer" not in name.lower()):
-                    filtered_regions.append(parsed)
-            if filtered_regions:
+            # Accept transcriptional regulatory regions but NOT silencers
+            names = regions["name"].str.lower()
+            filtered_regions = regions[
+                names.str.contains("transcriptional_cis_regulatory_region", regex=False)
+                | (names.str.contains("regulatory", regex=False) & ~names.str.contains("silencer", regex=False))
+            ]
+            if not filtered_regions.empty:
                 print(f"  Found {len(filtered_regions)} regulatory region(s)")
                 regions = filtered_regions
             else:
@@ -178,22 +245,20 @@ def process_bed_file(bed_path: Path, merge_strategy: str = "first", feature_filt
         else:
             regions = filtered_regions
     
-    if not regions:
+    if regions.empty:
         print(f"  ⚠️  No valid regions after filtering")
         return []
     
-    # Convert RefSeq to UCSC if needed
-    processed_regions = []
-    for chrom, start, end, name in regions:
-        if chrom.startswith("NC_"):
-            ucsc_chrom = refseq_to_ucsc_chrom(chrom)
-            if ucsc_chrom:
-                print(f"  Converting {chrom} → {ucsc_chrom}")
-                chrom = ucsc_chrom
-            else:
-                print(f"  ⚠️  Unknown RefSeq accession: {chrom}")
-                continue
-        processed_regions.append((chrom, start, end, name))
+    # Convert RefSeq to UCSC if needed, reporting each accession once
+    refseq = regions["chrom"].str.startswith("NC_")
+    ucsc_chrom = regions["chrom"].map(REFSEQ_TO_UCSC)
+    for (chrom, converted), count in regions[refseq].groupby([regions["chrom"], ucsc_chrom.fillna("")], sort=False).size().items():
+        if converted:
+            print(f"  Converting {chrom} → {converted} ({count} region(s))")
+        else:
+            print(f"  ⚠️  Unknown RefSeq accession: {chrom} ({count} region(s))")
+    regions = regions.assign(chrom=regions["chrom"].where(~refseq, ucsc_chrom))[~refseq | ucsc_chrom.notna()]
+    processed_regions = list(regions.itertuples(index=False, name=None))
     
     if not processed_regions:
         print(f"  ⚠️  No valid regions after conversion")
@@ -210,9 +275,10 @@ def process_bed_file(bed_path: Path, merge_strategy: str = "first", feature_filt
     
     # Fetch sequences
     sequences = []
+    local = open_twobit() is not None
     for chrom, start, end, name in processed_regions:
         print(f"  Fetching {chrom}:{start}-{end} ({end - start} bp)...")
-        seq = fetch_sequence_from_ucsc(chrom, start, end)
+        seq = fetch_sequence(chrom, start, end)
         
         if seq:
             sequences.append((name, seq))
@@ -220,12 +286,20 @@ def process_bed_file(bed_path: Path, merge_strategy: str = "first", feature_filt
         else:
             print(f"    ✗ Failed to retrieve sequence")
         
-        # Rate limiting - be nice to UCSC servers
-        time.sleep(0.5)
+        if not local:
+            # Rate limiting - be nice to UCSC servers
+            time.sleep(UCSC_REQUEST_DELAY)
     
     return sequences
 
 
+def wrap_sequence(seq: str, width: int = 60) -> str:
+    """Sequence as `width`-character lines, each ending in a newline."""
+    if not seq:
+        return ""
+    return "\n".join([seq[i:i + width] for i in range(0, len(seq), width)]) + "\n"
+
+
 def write_fasta(sequences: List[Tuple[str, str]], output_path: Path, base_name: str) -> None:
     """
     Write sequences to FASTA format.
@@ -239,20 +313,16 @@ def write_fasta(sequences: List[Tuple[str, str]], output_path: Path, base_name:
         print(f"  ⚠️  No sequences to write")
         return
     
+    if len(sequences) == 1:
+        # Single sequence
+        records = [(base_name, sequences[0][1])]
+    else:
+        # Multiple sequences
+        records = [(f"{base_name}_region{idx} {name}", seq) for idx, (name, seq) in enumerate(sequences, 1)]
+    
+    # One write per file instead of one per 60-character line
     with open(output_path, 'w') as f:
-        if len(sequences) == 1:
-            # Single sequence
-            name, seq = sequences[0]
-            f.write(f">{base_name}\n")
-            # Write sequence in 60-character lines
-            for i in range(0, len(seq), 60):
-                f.write(seq[i:i+60] + '\n')
-        else:
-            # Multiple sequences
-            for idx, (name, seq) in enumerate(sequences, 1):
-                f.write(f">{base_name}_region{idx} {name}\n")
-                for i in range(0, len(seq), 60):
-                    f.write(seq[i:i+60] + '\n')
+        f.write("".join(f">{header}\n{wrap_sequence(seq)}" for header, seq in records))
     
     print(f"  ✓ Wrote {output_path.name} ({sum(len(s[1]) for s in sequences)} bp total)")
 